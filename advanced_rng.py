@@ -3,28 +3,179 @@ import time
 import os
 import hashlib
 import json
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
+import numpy as np
+from combination_list import SYMBOLS
+from outcome import SpinOutcome
+
+# Number of uniform draws produced per AES-CTR cipher invocation
+DRBG_BUFFER_SIZE = 8192
+# Number of draws after which the crypto generator rekeys from os.urandom
+DEFAULT_RESEED_INTERVAL = 10_000_000
+
+# Counter-based / jumpable NumPy bit generators usable as independent, spawnable streams
+STREAM_MODES = {
+    'pcg64': np.random.PCG64,
+    'philox': np.random.Philox,
+}
+
+class KeystreamDRBG:
+    """
+    A deterministic random bit generator built on an AES-256-CTR keystream.
+
+    The keystream is produced in bulk into a reusable buffer and converted to
+    uniform floats in [0, 1) using the top 53 bits of each 64-bit word, so a
+    single cipher invocation serves thousands of draws.
+
+    Draw n of a key is always keystream bytes 8n..8n+8, whatever the
+    buffering, so `seek` can jump straight to any position: (key, position)
+    reproduces a stream exactly as long as it is never rekeyed automatically.
+    """
+
+    def __init__(self, key=None, buffer_size=DRBG_BUFFER_SIZE, reseed_interval=DEFAULT_RESEED_INTERVAL):
+        """
+        Initialize the DRBG.
+
+        :param key: 32-byte AES key; a fresh key is taken from os.urandom if omitted
+        :param buffer_size: Number of draws generated per cipher invocation
+        :param reseed_interval: Draws between automatic rekeys, or None to never rekey
+        """
+        self.buffer_size = buffer_size
+        self.reseed_interval = reseed_interval
+        self._zeros = bytes(buffer_size * 8)
+        # update_into needs block_size - 1 bytes of headroom
+        self._raw = bytearray(buffer_size * 8 + 15)
+        self._words = np.frombuffer(self._raw, dtype='<u8', count=buffer_size)
+        self._buffer = np.empty(buffer_size, dtype=np.float64)
+        self.reseed(key)
+
+    def reseed(self, key=None, position=0):
+        """
+        Rekey the keystream and discard any buffered draws.
+
+        :param key: 32-byte AES key; a fresh key is taken from os.urandom if omitted
+        :param position: Number of draws of the new key to skip
+        """
+        self.key = key if key is not None else os.urandom(32)
+        self.seek(position)
+
+    def seek(self, position):
+        """Continue the current key's stream from draw number `position`."""
+        # Imported here so 'standard' mode (e.g. simulation workers) never loads cryptography
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        from cryptography.hazmat.backends import default_backend
+        # Two draws per 16-byte AES block; the counter starts at the block holding the draw
+        block, skip = divmod(position, 2)
+        counter = (block % (1 << 128)).to_bytes(16, 'big')
+        cipher = Cipher(algorithms.AES(self.key), modes.CTR(counter), backend=default_backend())
+        self._encryptor = cipher.encryptor()
+        self._index = self.buffer_size
+        self.draws_since_reseed = position - skip
+        if skip:
+            self.random()
+
+    @property
+    def position(self):
+        """Draws taken from the current key so far."""
+        return self.draws_since_reseed
+
+    def _refill(self):
+        """Encrypt one buffer of zeros and convert the keystream to floats."""
+        if self.reseed_interval is not None and self.draws_since_reseed >= self.reseed_interval:
+            self.reseed()
+        self._encryptor.update_into(self._zeros, self._raw)
+        np.multiply(self._words >> np.uint64(11), 2.0 ** -53, out=self._buffer)
+        self._index = 0
+
+    def random(self):
+        """Return the next uniform float in [0, 1)."""
+        if self._index >= self.buffer_size:
+            self._refill()
+        value = self._buffer[self._index]
+        self._index += 1
+        self.draws_since_reseed += 1
+        return float(value)
+
+    def random_batch(self, shape):
+        """
+        Return an array of uniform floats in [0, 1).
+
+        Draws are taken from the same stream as `random`, so mixing scalar and
+        batch calls never skips or repeats keystream.
+
+        :param shape: Output shape
+        :return: A float64 array of the requested shape
+        """
+        out = np.empty(shape, dtype=np.float64)
+        flat = out.reshape(-1)
+        filled = 0
+        while filled < flat.size:
+            if self._index >= self.buffer_size:
+                self._refill()
+            take = min(self.buffer_size - self._index, flat.size - filled)
+            flat[filled:filled + take] = self._buffer[self._index:self._index + take]
+            self._index += take
+            self.draws_since_reseed += take
+            filled += take
+        return out
 
 class SlotMachineRNG:
     """
-    A class that implements a random number generator for a slot machine,
-    using the Mersenne Twister algorithm with enhanced seeding.
+    A class that implements a random number generator for a slot machine.
+
+    In 'crypto' mode (the default) draws come from an AES-CTR keystream DRBG.
+    In 'standard' mode they come from the Mersenne Twister algorithm with
+    enhanced seeding, which is faster but not cryptographically secure.
+    In the stream modes ('pcg64', 'philox') every draw, scalar or batch,
+    comes from one NumPy bit generator seeded by a SeedSequence: `spawn`
+    and `spawn_streams` derive statistically independent child streams for
+    parallel workers, and `jumped` gives a non-overlapping stream far ahead.
     """
 
-    def __init__(self):
+    def __init__(self, mode='crypto', reseed_interval=DEFAULT_RESEED_INTERVAL, seed=None):
         """
-        Initialize the SlotMachineRNG with a Random object and seed it.
+        Initialize the SlotMachineRNG and seed it.
+
+        :param mode: 'crypto' for the AES-CTR DRBG, 'standard' for Mersenne Twister,
+                     or one of STREAM_MODES
+        :param reseed_interval: Draws between automatic rekeys in 'crypto' mode, or
+                                None for a stream that stays replayable (see from_seed)
+        :param seed: Optional seed, as accepted by reseed
         """
+        if mode not in ('crypto', 'standard') and mode not in STREAM_MODES:
+            raise ValueError(f"Unknown RNG mode: {mode}")
+        self.mode = mode
         self.generator = random.Random()
-        self.reseed()
+        self.drbg = KeystreamDRBG(reseed_interval=reseed_interval) if mode == 'crypto' else None
+        self.seed_sequence = None
+        self._cached_tables = None
+        self.reseed(seed)
 
-    def reseed(self):
+    def reseed(self, seed=None):
         """
         Reseed the random number generator using multiple sources of entropy.
         This method combines current time, process ID, and random bytes
         to create a unique and unpredictable seed.
+
+        :param seed: Optional explicit seed for reproducible runs; an integer in
+                     'standard' mode, a 32-byte key in 'crypto' mode, or an integer
+                     or np.random.SeedSequence in the stream modes
         """
+        if self.drbg is not None:
+            # The keystream is rekeyed straight from the operating system
+            self.drbg.reseed(seed)
+            return
+
+        if self.mode in STREAM_MODES:
+            # A SeedSequence without a seed takes its entropy from the operating system
+            self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+            self.batch_generator = np.random.Generator(STREAM_MODES[self.mode](self.seed_sequence))
+            return
+
+        if seed is not None:
+            self.generator.seed(seed)
+            self.batch_generator = np.random.default_rng(seed)
+            return
+
         # Get current time in nanoseconds
         current_time = time.time_ns()
         # Get the current process ID
@@ -39,80 +190,262 @@ class SlotMachineRNG:
         
         # Seed the random number generator
         self.generator.seed(seed)
+        # Seed the vectorized generator used for batch spins from the same material
+        self.batch_generator = np.random.default_rng(seed)
 
-    def _generate_encryption_key(self):
-        """Generate a new encryption key for each spin."""
-        return os.urandom(32)  # 256-bit key for AES
-
-    def _encrypt_number(self, number, key):
-        """Encrypt a float number using AES."""
-        backend = default_backend()
-        iv = os.urandom(16)
-        cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=backend)
-        encryptor = cipher.encryptor()
-        encrypted = encryptor.update(str(number).encode()) + encryptor.finalize()
-        return iv + encrypted
-
-    def _decrypt_number(self, encrypted, key):
-        """Decrypt a float number using AES."""
-        backend = default_backend()
-        iv = encrypted[:16]
-        ciphertext = encrypted[16:]
-        cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=backend)
-        decryptor = cipher.decryptor()
-        decrypted = decryptor.update(ciphertext) + decryptor.finalize()
-        return float(decrypted.decode())
-
-    def generate_spin(self, reel_config):
+    @classmethod
+    def from_seed(cls, seed, position=0):
+        """
+        A replayable 'crypto' stream: the same seed and position always give
+        the same draws, so every spin can be regenerated from them.
+
+        :param seed: 32-byte AES key, e.g. a game session's rng_seed
+        :param position: Draw number to start from
+        """
+        rng = cls(mode='crypto', reseed_interval=None)
+        rng.seek(position, seed)
+        return rng
+
+    def seek(self, position, seed=None):
+        """
+        Move a 'crypto' stream to draw number `position`, optionally switching to `seed`.
+        """
+        if self.drbg is None:
+            raise ValueError("Only 'crypto' mode streams can seek")
+        if seed is not None:
+            self.drbg.reseed(seed, position)
+        else:
+            self.drbg.seek(position)
+
+    @property
+    def position(self):
+        """Draws taken from the current 'crypto' key, None in the other modes."""
+        return self.drbg.position if self.drbg is not None else None
+
+    def spawn(self, n):
+        """
+        Derive `n` independent child streams of a stream-mode generator.
+
+        Children depend only on this generator's seed and how many children
+        were spawned before, never on draws already taken, so the same seed
+        always yields the same children.
+        """
+        if self.seed_sequence is None:
+            raise ValueError(f"Only stream modes ({', '.join(STREAM_MODES)}) can spawn")
+        return [SlotMachineRNG(self.mode, seed=child) for child in self.seed_sequence.spawn(n)]
+
+    def jumped(self, jumps=1):
+        """
+        A copy of a stream-mode generator advanced by `jumps` jump lengths
+        (2**127 draws for PCG64, 2**128 for Philox); this generator is unchanged.
+        """
+        if self.seed_sequence is None:
+            raise ValueError(f"Only stream modes ({', '.join(STREAM_MODES)}) can jump")
+        rng = SlotMachineRNG(self.mode, seed=self.seed_sequence)
+        rng.batch_generator = np.random.Generator(self.batch_generator.bit_generator.jumped(jumps))
+        return rng
+
+    def random(self):
+        """Return a single uniform float in [0, 1) from the active source."""
+        if self.drbg is not None:
+            return self.drbg.random()
+        if self.seed_sequence is not None:
+            return self.batch_generator.random()
+        return self.generator.random()
+
+    def random_batch(self, shape):
+        """Return an array of uniform floats in [0, 1) from the active source."""
+        if self.drbg is not None:
+            return self.drbg.random_batch(shape)
+        return self.batch_generator.random(shape)
+
+    def generate_spin(self, reel_config, tables=None):
         """
         Generate a complete spin result for all reels.
         
         :param reel_config: A dictionary containing the configuration for each reel
+        :param tables: Optional precomputed result of build_reel_tables(reel_config)
         :return: A list of lists, each inner list representing the symbols on one reel
         """
-        result = []
-        encryption_key = self._generate_encryption_key()
-        for reel in reel_config.values():
-            symbols = list(reel.keys())
-            weights = list(reel.values())
-            reel_result = self._generate_reel_spin(symbols, weights, encryption_key)
-            result.append(reel_result)
+        return decode_spin(self.generate_spins(reel_config, 1, tables)[0])
+
+    def generate_outcome(self, reel_config, tables=None):
+        """
+        Generate one integer-coded spin.
+
+        :param reel_config: A dictionary containing the configuration for each reel
+        :param tables: Optional precomputed result of build_reel_tables(reel_config)
+        :return: A SpinOutcome
+        """
+        return SpinOutcome(self.generate_spins(reel_config, 1, tables)[0])
+
+    def generate_spins(self, reel_config, n, tables=None):
+        """
+        Generate many spin results at once.
+
+        Symbols are integer-coded by their position in `SYMBOLS`, so the result can
+        be fed straight into table lookups without converting strings.
+
+        :param reel_config: A dictionary containing the configuration for each reel
+        :param n: Number of spins to generate
+        :param tables: Optional precomputed result of build_reel_tables(reel_config);
+                       otherwise the tables of the last reel_config passed in are reused
+        :return: A uint8 array of shape (n, reels, 3) indexed as [spin][reel][row]
+        """
+        if tables is None:
+            tables = self._tables_for(reel_config)
+        draws = self.random_batch((len(tables), n, 3))
+        result = np.empty((n, len(tables), 3), dtype=np.uint8)
+        for i, sampler in enumerate(tables):
+            result[:, i, :] = sampler.from_uniform(draws[i])
         return result
 
-    def _generate_reel_spin(self, symbols, weights, encryption_key):
+    def _tables_for(self, reel_config):
+        # Rebuilt only when called with a different configuration object
+        if self._cached_tables is None or self._cached_tables[0] is not reel_config:
+            self._cached_tables = (reel_config, build_reel_tables(reel_config))
+        return self._cached_tables[1]
+
+def spawn_streams(seed, n, mode='pcg64'):
+    """
+    Deterministically derive `n` independent generators from one parent seed,
+    e.g. one per worker process. Streams share no state, so workers draw in
+    parallel without coordination, and the same seed reproduces the run.
+
+    :param seed: Integer, np.random.SeedSequence, or None for fresh OS entropy
+    :param mode: One of STREAM_MODES
+    :return: List of SlotMachineRNG
+    """
+    if mode not in STREAM_MODES:
+        raise ValueError(f"Unknown stream mode: {mode}")
+    return SlotMachineRNG(mode, seed=seed).spawn(n)
+
+class WeightedSampler:
+    """
+    Constant-time draws from a fixed discrete distribution (Vose's alias method).
+
+    Building the tables is O(n); every draw then costs one uniform number,
+    one multiplication and one comparison, however many outcomes there are.
+    Build a sampler once per distribution (reel, prize table, ...) and keep
+    it until the weights change.
+    """
+
+    def __init__(self, values, weights):
         """
-        Generate a spin result for a single reel.
-        
-        :param symbols: List of symbols on the reel
-        :param weights: Corresponding weights (probabilities) for each symbol
-        :param encryption_key: Encryption key for the spin
-        :return: A list of 3 symbols representing the visible part of the reel
-        """
-        total_weight = sum(weights)
-        reel_result = []
-        for _ in range(3):  # Generate 3 symbols per reel
-            number = self.generator.uniform(0, total_weight)
-            encrypted_number = self._encrypt_number(number, encryption_key)
-            decrypted_number = self._decrypt_number(encrypted_number, encryption_key)
-            symbol = self._map_number_to_symbol(decrypted_number, symbols, weights)
-            reel_result.append(symbol)
-        return reel_result
-
-    def _map_number_to_symbol(self, number, symbols, weights):
-        """
-        Map a random number to a symbol based on the weights.
-        
-        :param number: Random number generated
-        :param symbols: List of symbols
-        :param weights: Corresponding weights for each symbol
-        :return: The selected symbol
-        """
-        cumulative_weight = 0
-        for symbol, weight in zip(symbols, weights):
-            cumulative_weight += weight
-            if number <= cumulative_weight:
-                return symbol
-        return symbols[-1]  # Fallback to last symbol (should never happen)
+        :param values: The outcomes; draws return these objects
+        :param weights: Non-negative relative weights, one per value
+        :raises ValueError: If the lengths differ, a weight is negative or all are zero
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(values) != len(weights) or len(weights) == 0:
+            raise ValueError("Need one weight per value, and at least one value")
+        if (weights < 0).any() or not weights.sum() > 0:
+            raise ValueError("Weights must be non-negative and not all zero")
+
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+        prob = np.ones(n)
+        alias = np.arange(n, dtype=np.intp)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s], alias[s] = scaled[s], l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left is 1.0 up to rounding, so keeps its own column
+
+        self.values = list(values)
+        self.weights = weights
+        self.value_array = np.array(values)
+        self.prob = prob
+        self.alias = alias
+        for array in (self.weights, self.value_array, self.prob, self.alias):
+            array.flags.writeable = False
+        # Plain lists make scalar draws cheaper than numpy indexing
+        self._prob = prob.tolist()
+        self._alias = alias.tolist()
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """Sampler over a {value: weight} dictionary, such as one reel of the configuration."""
+        return cls(list(mapping.keys()), list(mapping.values()))
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Sampler over (value, weight) pairs, such as BONUS_PRIZES."""
+        return cls([value for value, _ in pairs], [weight for _, weight in pairs])
+
+    def __len__(self):
+        return len(self.values)
+
+    def probabilities(self):
+        """The normalized probability of each value."""
+        return self.weights / self.weights.sum()
+
+    def index_from_uniform(self, u):
+        """Index of the value selected by one uniform number in [0, 1)."""
+        scaled = u * len(self._prob)
+        column = min(int(scaled), len(self._prob) - 1)
+        return column if scaled - column < self._prob[column] else self._alias[column]
+
+    def indices_from_uniform(self, u):
+        """Vectorized index_from_uniform over an array of uniform numbers."""
+        scaled = np.asarray(u) * len(self.prob)
+        columns = np.minimum(scaled.astype(np.intp), len(self.prob) - 1)
+        return np.where(scaled - columns < self.prob[columns], columns, self.alias[columns])
+
+    def from_uniform(self, u):
+        """Values selected by an array of uniform numbers, as an array of the same shape."""
+        return self.value_array[self.indices_from_uniform(u)]
+
+    def sample(self, rng):
+        """
+        Draw one value.
+
+        :param rng: A SlotMachineRNG (or anything with a `random()` method)
+        """
+        return self.values[self.index_from_uniform(rng.random())]
+
+    def sample_batch(self, rng, shape):
+        """
+        Draw an array of values.
+
+        :param rng: A SlotMachineRNG (or anything with a `random_batch(shape)` method)
+        :param shape: Shape of the result
+        """
+        return self.from_uniform(rng.random_batch(shape))
+
+def build_reel_tables(reel_config):
+    """
+    Precompute the per-reel samplers used by spin generation.
+
+    :param reel_config: A dictionary containing the configuration for each reel
+    :return: A list of WeightedSampler over symbol codes, one per reel
+    """
+    return [
+        WeightedSampler(np.array([SYMBOLS.index(symbol) for symbol in reel], dtype=np.uint8), list(reel.values()))
+        for reel in reel_config.values()
+    ]
+
+def encode_spin(result):
+    """
+    Convert a spin from `SlotMachineRNG.generate_spin` to symbol codes.
+
+    :param result: A list of lists of symbol names
+    :return: A uint8 array of shape (reels, 3)
+    """
+    return np.array([[SYMBOLS.index(symbol) for symbol in reel] for reel in result], dtype=np.uint8)
+
+def decode_spin(codes):
+    """
+    Convert an integer-coded spin back to the nested list of symbol names
+    returned by `SlotMachineRNG.generate_spin`.
+
+    :param codes: An array of shape (reels, 3) of symbol codes
+    :return: A list of lists of symbol names
+    """
+    return [[SYMBOLS[code] for code in reel] for reel in np.asarray(codes).tolist()]
 
 def test_distribution(rng, reel_config, num_spins=10000):
     """
@@ -153,3 +486,9 @@ if __name__ == "__main__":
     print("\nSample Spin Result:")
     for i, reel in enumerate(spin_result, 1):
         print(f"Reel {i}: {reel}")
+
+    # Example of generating a batch of integer-coded spins
+    batch = rng.generate_spins(reel_config, 100000)
+    print("\nSample Batch Spin Result:")
+    for i, reel in enumerate(decode_spin(batch[0]), 1):
+        print(f"Reel {i}: {reel}")
@@ -0,0 +1,173 @@
+import asyncio
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from database import SessionLocal
+from data_access import get_player, update_password_hash
+from security import verify_password, hash_password, needs_rehash, DUMMY_PASSWORD_HASH
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_TTL = 15 * 60
+
+AuthToken = namedtuple('AuthToken', ['token', 'player_id', 'expires_at'])
+
+class AuthServiceBusy(RuntimeError):
+    """Raised when the hashing pool already has `max_pending` jobs."""
+
+class AuthService:
+    """
+    Password authentication off the request path.
+
+    Hash verification (and upgrading hashes that need_rehash) runs on a
+    process pool of `max_workers`, with at most `max_pending` jobs queued
+    or running: beyond that, callers wait up to `queue_timeout` seconds and
+    then get AuthServiceBusy, so a login burst cannot pile up unbounded work.
+    A successful login returns a random token cached for `token_ttl`
+    seconds; requests carrying it are authorized without re-verifying.
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_workers=None, max_pending=64, queue_timeout=5.0,
+                 token_ttl=DEFAULT_TOKEN_TTL, max_tokens=100000):
+        self.session_factory = session_factory
+        self.max_workers = max_workers or os.cpu_count()
+        self.queue_timeout = queue_timeout
+        self.token_ttl = token_ttl
+        self.max_tokens = max_tokens
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Tokens in expiry order, since every token gets the same TTL
+        self._tokens = OrderedDict()
+        self._tokens_lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def submit(self, fn, *args, block=True):
+        """
+        Run fn(*args) on the hashing pool.
+
+        :param block: Wait up to `queue_timeout` for a free slot; otherwise fail at once
+        :raises AuthServiceBusy: If no slot frees up
+        :return: A concurrent.futures.Future
+        """
+        acquired = self._slots.acquire(timeout=self.queue_timeout) if block else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise AuthServiceBusy("Too many authentication requests in progress")
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _load_credentials(self, username):
+        db = self.session_factory()
+        try:
+            player = get_player(db, username)
+            return (player.id, player.password_hash) if player else (None, None)
+        finally:
+            db.close()
+
+    def _store_upgraded_hash(self, player_id, old_hash, new_hash):
+        db = self.session_factory()
+        try:
+            if update_password_hash(db, player_id, old_hash, new_hash):
+                logger.info(f"Upgraded password hash for player {player_id}")
+        finally:
+            db.close()
+
+    def authenticate(self, username, password):
+        """
+        Verify a username and password.
+
+        :raises AuthServiceBusy: If the hashing pool stays saturated
+        :return: An AuthToken, or None if the credentials are wrong
+        """
+        player_id, stored_hash = self._load_credentials(username)
+        # Unknown usernames are verified too, so response times do not reveal which players exist
+        verified = self.submit(verify_password, password, stored_hash or DUMMY_PASSWORD_HASH).result()
+        if player_id is None or not verified:
+            return None
+        if needs_rehash(stored_hash):
+            self._store_upgraded_hash(player_id, stored_hash, self.submit(hash_password, password).result())
+        return self.issue_token(player_id)
+
+    async def authenticate_async(self, username, password, run_db=None):
+        """
+        authenticate() for asyncio callers: never blocks the event loop, and
+        sheds load with AuthServiceBusy instead of waiting for a slot.
+
+        :param run_db: Optional coroutine function run_db(fn, *args) running
+                       fn(session, *args) on an async session; by default the
+                       synchronous session factory runs on a thread
+        """
+        if run_db is not None:
+            player = await run_db(get_player, username)
+            player_id, stored_hash = (player.id, player.password_hash) if player else (None, None)
+        else:
+            player_id, stored_hash = await asyncio.to_thread(self._load_credentials, username)
+        verified = await asyncio.wrap_future(
+            self.submit(verify_password, password, stored_hash or DUMMY_PASSWORD_HASH, block=False))
+        if player_id is None or not verified:
+            return None
+        if needs_rehash(stored_hash):
+            try:
+                new_hash = await asyncio.wrap_future(self.submit(hash_password, password, block=False))
+            except AuthServiceBusy:
+                new_hash = None  # Upgrade on a later login
+            if new_hash is not None:
+                if run_db is not None:
+                    await run_db(update_password_hash, player_id, stored_hash, new_hash)
+                else:
+                    await asyncio.to_thread(self._store_upgraded_hash, player_id, stored_hash, new_hash)
+        return self.issue_token(player_id)
+
+    def issue_token(self, player_id):
+        """Create a session token for an authenticated player."""
+        token = AuthToken(secrets.token_urlsafe(32), player_id, time.monotonic() + self.token_ttl)
+        with self._tokens_lock:
+            self._purge_expired()
+            while len(self._tokens) >= self.max_tokens:
+                self._tokens.popitem(last=False)
+            self._tokens[token.token] = token
+        return token
+
+    def validate_token(self, token):
+        """
+        :return: The player id the token was issued to, or None if unknown or expired
+        """
+        entry = self._tokens.get(token)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self.revoke_token(token)
+            return None
+        return entry.player_id
+
+    def revoke_token(self, token):
+        with self._tokens_lock:
+            self._tokens.pop(token, None)
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        while self._tokens:
+            token, entry = next(iter(self._tokens.items()))
+            if entry.expires_at > now:
+                break
+            del self._tokens[token]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,276 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from types import SimpleNamespace
+from startup_benchmark import git_revision
+
+RESULTS_FILE = os.path.join('benchmarks', 'results.json')
+
+# A benchmark fails when its best time per operation grows by more than this fraction
+DEFAULT_THRESHOLD = 0.25
+
+# Row counts calculate_stats is measured at
+STATS_SIZES = (10_000, 1_000_000)
+
+# setup() returns the callable to time; `number` calls are timed per repeat
+Benchmark = namedtuple('Benchmark', ['name', 'setup', 'number'])
+
+BENCHMARKS = []
+
+def benchmark(name, number):
+    def register(setup):
+        BENCHMARKS.append(Benchmark(name, setup, number))
+        return setup
+    return register
+
+def use_memory_database():
+    """
+    Point database.SessionLocal (and get_engine) at a fresh in-memory SQLite
+    database with all tables created, so the persistence benchmarks need no
+    server and never touch DATABASE_URL.
+    """
+    import database
+    import db_models
+    from sqlalchemy import create_engine
+    url = "sqlite://"
+    engine = create_engine(url, **database.engine_options(url))
+    db_models.Base.metadata.create_all(engine)
+    database._engine = engine
+    database.SessionLocal.configure(bind=engine)
+    return engine
+
+@lru_cache(maxsize=None)
+def _snapshot():
+    from config_manager import build_config_snapshot
+    with open('slot_config.json') as f:
+        config = json.load(f)
+    return build_config_snapshot(config['reels'], config['symbol_payouts'])
+
+@lru_cache(maxsize=None)
+def _model():
+    import reelAlgo
+    return reelAlgo.selected_model(_snapshot())
+
+@lru_cache(maxsize=None)
+def _player():
+    """A player and game session in the in-memory database, with funds for every benchmark."""
+    from database import SessionLocal
+    from data_access import create_player, create_game_session
+    db = SessionLocal()
+    try:
+        player = create_player(db, "benchmark", "benchmark@example.com", "benchmark", initial_balance=1e12)
+        player_id = player.id
+        return player_id, create_game_session(db, player_id, player.balance).id
+    finally:
+        db.close()
+
+@benchmark("rng.generate_spin", number=2000)
+def bench_generate_spin():
+    from advanced_rng import SlotMachineRNG
+    rng, snapshot = SlotMachineRNG(), _snapshot()
+    return lambda: rng.generate_spin(snapshot.reels, snapshot.reel_tables)
+
+@benchmark("rng.generate_outcome", number=2000)
+def bench_generate_outcome():
+    from advanced_rng import SlotMachineRNG
+    rng, snapshot = SlotMachineRNG(), _snapshot()
+    return lambda: rng.generate_outcome(snapshot.reels, snapshot.reel_tables)
+
+@benchmark("rng.generate_spins[100k]", number=1)
+def bench_generate_spins():
+    from advanced_rng import SlotMachineRNG
+    rng, snapshot = SlotMachineRNG(), _snapshot()
+    return lambda: rng.generate_spins(snapshot.reels, 100_000, snapshot.reel_tables)
+
+@benchmark("rng.generate_spins[100k,pcg64]", number=1)
+def bench_generate_spins_stream():
+    from advanced_rng import spawn_streams
+    rng, snapshot = spawn_streams(0, 1)[0], _snapshot()
+    return lambda: rng.generate_spins(snapshot.reels, 100_000, snapshot.reel_tables)
+
+@benchmark("game.check_win", number=2000)
+def bench_check_win():
+    spin_reels, check_win, _ = _model()
+    outcome = spin_reels()
+    return lambda: check_win(outcome)
+
+@benchmark("game.check_jackpot_win", number=5000)
+def bench_check_jackpot_win():
+    from jackpot_manager import check_jackpot_win
+    outcome = _model()[0]()
+    return lambda: check_jackpot_win(outcome)
+
+@benchmark("game.play_bonus_game", number=5000)
+def bench_play_bonus_game():
+    return _model()[2]
+
+@benchmark("db.place_bet+add_winnings", number=200)
+def bench_wallet():
+    import wallet_manager
+    # The wallet functions only use the player's id and balance
+    player = SimpleNamespace(id=_player()[0], balance=None)
+    def place_and_win():
+        wallet_manager.place_bet(player, 1.0)
+        wallet_manager.add_winnings(player, 0.5)
+    return place_and_win
+
+@benchmark("db.add_to_jackpot", number=500)
+def bench_add_to_jackpot():
+    from database import SessionLocal
+    from jackpot_manager import add_to_jackpot, initialize_jackpot
+    initialize_jackpot()
+    def contribute():
+        db = SessionLocal()
+        try:
+            add_to_jackpot(db, 0.01)
+            db.commit()
+        finally:
+            db.close()
+    return contribute
+
+@benchmark("db.record_game_result", number=500)
+def bench_record_game_result():
+    from database import SessionLocal
+    from data_access import record_game_result
+    _, session_id = _player()
+    outcome = _model()[0]()
+    def record():
+        db = SessionLocal()
+        try:
+            record_game_result(db, session_id, 1, 1.0, outcome, 0.0)
+        finally:
+            db.close()
+    return record
+
+@benchmark("db.spin_service.spin", number=200)
+def bench_spin_service():
+    import wallet_manager
+    from spin_service import SpinService
+    player_id, session_id = _player()
+    service = SpinService(*_model(), wallet_cache=wallet_manager.wallet_cache)
+    return lambda: service.spin(player_id, session_id, 1, 1.0)
+
+def _stats_benchmark(rows):
+    def setup():
+        import numpy as np
+        from diagnostics_tool import calculate_stats
+        # calculate_stats only reads bet_amount and winnings from each log
+        Row = namedtuple('Row', ['bet_amount', 'winnings'])
+        winnings = np.random.default_rng(0).exponential(1.0, rows).tolist()
+        logs = [Row(1.0, w) for w in winnings]
+        return lambda: calculate_stats(logs)
+    return setup
+
+for _rows in STATS_SIZES:
+    BENCHMARKS.append(Benchmark(f"diagnostics.calculate_stats[{_rows:,}]", _stats_benchmark(_rows), 1))
+
+def measure(fn, number, repeat):
+    """
+    Time `number` calls of fn, `repeat` times, after one warm-up call.
+
+    :return: Seconds per call of each repeat
+    """
+    with contextlib.redirect_stdout(io.StringIO()):  # The game functions print as they play
+        fn()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            timings.append((time.perf_counter() - start) / number)
+    return timings
+
+def run_benchmarks(selected=None, repeat=5):
+    """
+    Run the registered benchmarks whose name contains one of `selected`.
+
+    :return: Report dictionary as written to RESULTS_FILE
+    """
+    use_memory_database()
+    results = {}
+    for bench in BENCHMARKS:
+        if selected and not any(pattern in bench.name for pattern in selected):
+            continue
+        timings = measure(bench.setup(), bench.number, repeat)
+        results[bench.name] = {
+            "number": bench.number,
+            "repeat": repeat,
+            "best_us": min(timings) * 1e6,
+            "median_us": statistics.median(timings) * 1e6,
+        }
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Find benchmarks slower than in `baseline` by more than `threshold`.
+
+    Best times are compared, as they are the least sensitive to other load
+    on the machine.
+
+    :return: List of (name, baseline microseconds, current microseconds, ratio)
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = result["best_us"] / before["best_us"]
+        if ratio > 1 + threshold:
+            regressions.append((name, before["best_us"], result["best_us"], ratio))
+    return regressions
+
+def print_report(report, baseline=None):
+    print(f"Benchmarks ({report['revision'] or 'unknown revision'}, Python {report['python']})")
+    for name, result in report["results"].items():
+        line = f"  {name:<40} {result['best_us']:12.2f} us best {result['median_us']:12.2f} us median"
+        before = baseline["results"].get(name) if baseline else None
+        if before is not None:
+            line += f"  ({result['best_us'] / before['best_us'] - 1:+.1%} vs baseline)"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the spin, evaluation, RNG and persistence hot paths.")
+    parser.add_argument("--filter", nargs="+", help="Only run benchmarks whose name contains one of these")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repeats per benchmark")
+    parser.add_argument("--output", default=RESULTS_FILE, help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown before a benchmark counts as a regression (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report = run_benchmarks(args.filter, args.repeat)
+    print_report(report, baseline)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.2f} us -> {after:.2f} us ({ratio - 1:+.1%})")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+# Canonical symbol order; a symbol's position in this list is its integer code
+SYMBOLS = ['CHER', 'ONIO', 'CLOC', 'STAR', 'DIAMN', 'WILD', 'BONUS', 'SCAT', 'JACKP']
+
 # Define winning combinations and their corresponding points
 
 combinations = [
@@ -32,4 +35,27 @@ combinations = [
     {'symbols': ['CHER', 'ONIO', 'CLOC', 'STAR', 'DIAMN'], 'points': 150, 'payout': 3},
     {'symbols': ['DIAMN', 'DIAMN', '*', '*', '*'], 'points': 25, 'payout': 0.625},
     {'symbols': ['CHER', 'CHER', '*', '*', '*'], 'points': 15, 'payout': 0.375},
-]
\ No newline at end of file
+]
+
+HOUSE_EDGE = 0.05  # 5% house edge
+
+# Event name that play_slot_machine looks for in check_win's triggered events
+# before starting the pick-a-box bonus game; must match a combination's 'trigger'
+BONUS_GAME_EVENT = "bonus_game"
+
+# Pick-a-box bonus prizes as (prize, weight)
+BONUS_PRIZES = [
+    (0, 30),     # 30% chance of winning nothing
+    (10, 25),    # 25% chance of winning 10
+    (20, 20),    # 20% chance of winning 20
+    (50, 15),    # 15% chance of winning 50
+    (100, 7),    # 7% chance of winning 100
+    (200, 2),    # 2% chance of winning 200
+    (500, 1)     # 1% chance of winning 500
+]
+
+# Progressive jackpot rules
+JACKPOT_SYMBOL = 'JACKP'
+JACKPOT_REQUIRED_COUNT = 3  # JACKP symbols anywhere on the grid
+JACKPOT_CONTRIBUTION = 0.01  # Share of each losing bet added to the pool
+JACKPOT_RESET_VALUE = 1000.0
@@ -1,12 +1,27 @@
 import json
 import os
-from sqlalchemy.orm import Session
-from db_models import ReelConfiguration, SymbolPayout
-from database import SessionLocal
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from lazy_imports import lazy_import
+from combination_list import combinations
+from advanced_rng import build_reel_tables
+from payline_evaluator import compile_combinations
 import logging
 
+# Loaded on first database access; building snapshots from files needs no SQLAlchemy
+database = lazy_import('database')
+db_models = lazy_import('db_models')
+
 CONFIG_FILE = 'slot_config.json'
 
+# Seconds a cached snapshot is trusted before the configuration tables are
+# re-read and compared by checksum, so edits made by another process (the
+# diagnostics dashboard) reach running games without a restart
+CONFIG_CHECK_SECONDS = float(os.getenv("CONFIG_CHECK_SECONDS", "5"))
+
 # Default configuration
 DEFAULT_CONFIG = {
     'reels': {
@@ -29,7 +44,6 @@ DEFAULT_CONFIG = {
     }
 }
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def load_config():
@@ -50,46 +64,159 @@ def save_config(config):
     with open(CONFIG_FILE, 'w') as f:
         json.dump(config, f, indent=4)
 
+# Immutable, precompiled view of one configuration version
+ConfigSnapshot = namedtuple('ConfigSnapshot', [
+    'version',         # In-process version stamp, bumped on every update or invalidation
+    'checksum',        # SHA-256 of the reels and payouts, stable across processes
+    'reels',           # Read-only {reel: {symbol: weight}}
+    'symbol_payouts',  # Read-only {symbol: payout}
+    'reel_tables',     # Per-reel WeightedSampler over symbol codes
+    'payline_table',   # PaylineTable compiled from combinations and symbol_payouts
+])
+
+_config_lock = threading.Lock()
+_config_version = 0
+_config_snapshot = None
+_config_checked_at = 0.0
+
+def config_checksum(reels, symbol_payouts):
+    """Hash a configuration; symbol order within a reel is significant to spins."""
+    payload = json.dumps([reels, symbol_payouts], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def build_config_snapshot(reels, symbol_payouts, version=0):
+    """
+    Precompile a configuration into an immutable snapshot.
+
+    :param reels: A dictionary containing the configuration for each reel
+    :param symbol_payouts: Dictionary mapping a symbol to its payout
+    :param version: Version stamp to record in the snapshot
+    :return: A ConfigSnapshot
+    """
+    reels = {reel: dict(symbols) for reel, symbols in reels.items()}
+    symbol_payouts = dict(symbol_payouts)
+    reel_tables = build_reel_tables(reels)
+    payline_table = compile_combinations(combinations, symbol_payouts)
+    for array in (payline_table.combo_index, payline_table.points, payline_table.payout, payline_table.trigger):
+        array.flags.writeable = False
+    return ConfigSnapshot(
+        version=version,
+        checksum=config_checksum(reels, symbol_payouts),
+        reels=MappingProxyType({reel: MappingProxyType(symbols) for reel, symbols in reels.items()}),
+        symbol_payouts=MappingProxyType(symbol_payouts),
+        reel_tables=tuple(reel_tables),
+        payline_table=payline_table,
+    )
+
+def get_config_snapshot():
+    """
+    Return the cached configuration snapshot, loading it from the database
+    on first use or after an invalidation.
+
+    Once CONFIG_CHECK_SECONDS have passed, the next call re-reads the
+    configuration rows: the same snapshot object is returned while the
+    checksum is unchanged, otherwise a new one with a bumped version.
+    Callers holding a model can compare snapshots with `is` to rebuild it.
+    While one thread re-checks, others keep getting the cached snapshot.
+    """
+    snapshot = _config_snapshot
+    if snapshot is not None:
+        if time.monotonic() - _config_checked_at < CONFIG_CHECK_SECONDS:
+            return snapshot
+        if not _config_lock.acquire(blocking=False):
+            return snapshot
+    else:
+        _config_lock.acquire()
+    try:
+        return _reload_config_snapshot()
+    finally:
+        _config_lock.release()
+
+def _reload_config_snapshot():
+    # Called with _config_lock held
+    global _config_snapshot, _config_version, _config_checked_at
+    if _config_snapshot is not None and time.monotonic() - _config_checked_at < CONFIG_CHECK_SECONDS:
+        return _config_snapshot
+    db = database.SessionLocal()
+    try:
+        reels = _load_reel_probabilities(db)
+        symbol_payouts = _load_symbol_payouts(db)
+    finally:
+        db.close()
+    _config_checked_at = time.monotonic()
+    if _config_snapshot is not None and _config_snapshot.checksum == config_checksum(reels, symbol_payouts):
+        return _config_snapshot
+    if _config_snapshot is not None:
+        # Changed by another process since it was loaded
+        _config_version += 1
+    _config_snapshot = build_config_snapshot(reels, symbol_payouts, _config_version)
+    logger.debug(f"Loaded config snapshot version {_config_version} ({_config_snapshot.checksum[:12]})")
+    return _config_snapshot
+
+def invalidate_config_cache():
+    """
+    Drop the cached snapshot and bump the version so the next read reloads
+    from the database. Call this after writing configuration rows directly.
+
+    :return: The new version stamp
+    """
+    global _config_snapshot, _config_version
+    with _config_lock:
+        _config_version += 1
+        _config_snapshot = None
+        return _config_version
+
+def refresh_config_cache():
+    """Invalidate the cache and immediately load a fresh snapshot."""
+    invalidate_config_cache()
+    return get_config_snapshot()
+
+def get_config_version():
+    return _config_version
+
 def update_probabilities(new_probabilities):
-    db = SessionLocal()
+    db = database.SessionLocal()
     try:
         for reel, symbols in new_probabilities.items():
             reel_number = int(reel[4:])  # Extract number from 'Reel1', 'Reel2', etc.
             for symbol, probability in symbols.items():
-                config = db.query(ReelConfiguration).filter(
-                    ReelConfiguration.reel_number == reel_number,
-                    ReelConfiguration.symbol == symbol
+                config = db.query(db_models.ReelConfiguration).filter(
+                    db_models.ReelConfiguration.reel_number == reel_number,
+                    db_models.ReelConfiguration.symbol == symbol
                 ).first()
                 if config:
                     config.probability = probability
                 else:
-                    new_config = ReelConfiguration(reel_number=reel_number, symbol=symbol, probability=probability)
+                    new_config = db_models.ReelConfiguration(
+                        reel_number=reel_number, symbol=symbol, probability=probability)
                     db.add(new_config)
         db.commit()
     finally:
         db.close()
+    invalidate_config_cache()
+
+def _load_reel_probabilities(db):
+    reels = {f'Reel{reel}': {} for reel in range(1, 6)}  # Assuming 5 reels
+    ReelConfiguration = db_models.ReelConfiguration
+    rows = db.query(ReelConfiguration).order_by(ReelConfiguration.reel_number, ReelConfiguration.id).all()
+    for config in rows:
+        reels.setdefault(f'Reel{config.reel_number}', {})[config.symbol] = float(config.probability)
+    return reels
+
+def _load_symbol_payouts(db):
+    payouts = db.query(db_models.SymbolPayout).order_by(db_models.SymbolPayout.id).all()
+    return {payout.symbol: payout.payout for payout in payouts}
 
 def get_reel_probabilities():
-    db = SessionLocal()
-    try:
-        reels = {}
-        for reel in range(1, 6):  # Assuming 5 reels
-            reel_config = db.query(ReelConfiguration).filter(ReelConfiguration.reel_number == reel).all()
-            reels[f'Reel{reel}'] = {config.symbol: float(config.probability) for config in reel_config}
-        return reels
-    finally:
-        db.close()
+    snapshot = get_config_snapshot()
+    return {reel: dict(symbols) for reel, symbols in snapshot.reels.items()}
 
 def get_symbol_payouts():
-    db = SessionLocal()
-    try:
-        payouts = db.query(SymbolPayout).all()
-        return {payout.symbol: payout.payout for payout in payouts}
-    finally:
-        db.close()
+    return dict(get_config_snapshot().symbol_payouts)
 
 def update_symbol_payouts(new_payouts):
-    db = SessionLocal()
+    SymbolPayout = db_models.SymbolPayout
+    db = database.SessionLocal()
     try:
         for symbol, payout in new_payouts.items():
             symbol_payout = db.query(SymbolPayout).filter(SymbolPayout.symbol == symbol).first()
@@ -101,5 +228,8 @@ def update_symbol_payouts(new_payouts):
         db.commit()
     finally:
         db.close()
+    invalidate_config_cache()
 
-__all__ = ['get_reel_probabilities', 'update_probabilities', 'get_symbol_payouts', 'update_symbol_payouts']
+__all__ = ['get_reel_probabilities', 'update_probabilities', 'get_symbol_payouts', 'update_symbol_payouts',
+           'get_config_snapshot', 'build_config_snapshot', 'invalidate_config_cache', 'refresh_config_cache',
+           'get_config_version']
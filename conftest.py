@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import create_engine
+import database
+import db_models
+from data_access import create_player, create_game_session
+
+@pytest.fixture
+def engine(monkeypatch):
+    """A fresh in-memory SQLite database that database.SessionLocal and get_engine are bound to."""
+    url = "sqlite://"
+    engine = create_engine(url, **database.engine_options(url))
+    db_models.Base.metadata.create_all(engine)
+    previous_bind = database.SessionLocal.kw.get("bind")
+    monkeypatch.setattr(database, "_engine", engine)
+    database.SessionLocal.configure(bind=engine)
+    yield engine
+    database.SessionLocal.configure(bind=previous_bind)
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def player(db):
+    # A precomputed hash keeps bcrypt out of the tests
+    return create_player(db, "player", "player@example.com", None, initial_balance=100.0, password_hash="x")
+
+@pytest.fixture
+def game_session(db, player):
+    return create_game_session(db, player.id, player.balance, rng_seed=bytes(range(32)))
@@ -1,10 +1,19 @@
+import hashlib
+import json
+import math
+import os
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from db_models import Player, GameSession, GameResult, Transaction
+from db_models import Player, GameSession, GameResult, Transaction, StoredConfig
+from outcome import SpinOutcome
 from datetime import datetime
 from security import get_password_hash, verify_password  # Add this import
 
-def create_player(db: Session, username: str, email: str, password: str, initial_balance: float = 0.0):
-    hashed_password = get_password_hash(password)
+def create_player(db: Session, username: str, email: str, password: str, initial_balance: float = 0.0,
+                  password_hash: str = None):
+    # Callers that must not block (e.g. the async server) hash the password beforehand
+    hashed_password = password_hash or get_password_hash(password)
     player = Player(
         username=username,
         email=email,
@@ -38,8 +47,11 @@ def update_player_balance(db: Session, player_id: int, new_balance: float):
         return player
     return None
 
-def create_game_session(db: Session, player_id: int, initial_balance: float):
-    session = GameSession(player_id=player_id, initial_balance=initial_balance)
+def create_game_session(db: Session, player_id: int, initial_balance: float, rng_seed: bytes = None):
+    # Every session gets its own replayable RNG stream; only the commitment is public until it ends
+    rng_seed = rng_seed if rng_seed is not None else os.urandom(32)
+    session = GameSession(player_id=player_id, initial_balance=initial_balance, rng_seed=rng_seed.hex(),
+                          seed_commitment=hashlib.sha256(rng_seed).hexdigest())
     db.add(session)
     db.commit()
     db.refresh(session)
@@ -54,19 +66,28 @@ def end_game_session(db: Session, session_id: int, final_balance: float):
         db.refresh(session)
     return session
 
-def record_game_result(db: Session, session_id: int, spin_number: int, bet_amount: float, outcome: str, winnings: float):
+def record_game_result(db: Session, session_id: int, spin_number: int, bet_amount: float, outcome, winnings: float):
+    # A SpinOutcome is stored in its packed form; strings go to the legacy column
+    packed = isinstance(outcome, SpinOutcome)
     result = GameResult(
         session_id=session_id,
         spin_number=spin_number,
         bet_amount=bet_amount,
-        outcome=outcome,
+        outcome=None if packed else outcome,
+        outcome_code=outcome.packed if packed else None,
         winnings=winnings
     )
     db.add(result)
     db.commit()
-    db.refresh(result)
     return result
 
+def record_game_results(db: Session, rows):
+    """Insert many GameResult rows (dictionaries of column values) with one executemany."""
+    if rows:
+        db.execute(insert(GameResult), rows)
+        db.commit()
+    return len(rows)
+
 def record_transaction(db: Session, player_id: int, amount: float, transaction_type: str):
     transaction = Transaction(player_id=player_id, amount=amount, type=transaction_type)
     db.add(transaction)
@@ -82,6 +103,56 @@ def authenticate_player(db: Session, username: str, password: str):
         return False
     return player
 
+def apply_balance_change(db: Session, player_id: int, amount: float, transaction_type: str):
+    """
+    Credit (positive amount) or debit (negative amount) a player and record
+    the transaction in one commit, with the player row locked.
+
+    :raises ValueError: If the amount is zero or not finite, the player does not
+                        exist or a debit exceeds the balance
+    :return: The new balance
+    """
+    if not (math.isfinite(amount) and amount != 0):
+        raise ValueError("Amount must be a non-zero number.")
+    player = db.query(Player).filter(Player.id == player_id).with_for_update().one_or_none()
+    if player is None:
+        raise ValueError(f"Player {player_id} not found")
+    if player.balance + amount < 0:
+        raise ValueError("Insufficient funds in game balance.")
+    player.balance += amount
+    balance = player.balance
+    db.add(Transaction(player_id=player_id, amount=amount, type=transaction_type))
+    db.commit()
+    return balance
+
+def update_password_hash(db: Session, player_id: int, old_hash: str, new_hash: str) -> bool:
+    """
+    Replace a player's password hash, unless it changed since `old_hash` was read.
+
+    :return: True if the hash was replaced
+    """
+    updated = db.query(Player).filter(Player.id == player_id, Player.password_hash == old_hash).update(
+        {Player.password_hash: new_hash}, synchronize_session=False)
+    db.commit()
+    return updated == 1
+
+def get_wallet_state(db: Session, player_id: int):
+    """
+    :return: (balance, version) of a player, or None if the player does not exist
+    """
+    return db.query(Player.balance, Player.version).filter(Player.id == player_id).one_or_none()
+
+def compare_and_swap_balance(db: Session, player_id: int, expected_version: int, new_balance: float):
+    """
+    Set a player's balance, unless the row changed since `expected_version` was read.
+
+    :return: The new version, or None on a version conflict
+    """
+    updated = db.query(Player).filter(Player.id == player_id, Player.version == expected_version).update(
+        {Player.balance: new_balance, Player.version: expected_version + 1}, synchronize_session=False)
+    db.commit()
+    return expected_version + 1 if updated == 1 else None
+
 def update_player_balance_in_db(db: Session, player):
     db_player = db.query(Player).filter(Player.id == player.id).first()
     if db_player:
@@ -102,4 +173,30 @@ def get_token_conversion_rate(db: Session, player_id: int) -> float:
         return player.token_conversion_rate
     return 1.0  # Default conversion rate if player not found or rate not set
 
+def get_or_create_config_snapshot(db: Session, snapshot) -> int:
+    """
+    Store a ConfigSnapshot's reels and payouts once per checksum.
+
+    :return: The config_snapshots id game results refer to
+    """
+    stored = db.query(StoredConfig.id).filter(StoredConfig.checksum == snapshot.checksum).first()
+    if stored is not None:
+        return stored.id
+    config = StoredConfig(
+        checksum=snapshot.checksum,
+        reels=json.dumps({reel: dict(symbols) for reel, symbols in snapshot.reels.items()}),
+        symbol_payouts=json.dumps(dict(snapshot.symbol_payouts)),
+    )
+    db.add(config)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another process stored the same configuration first
+        db.rollback()
+        return db.query(StoredConfig.id).filter(StoredConfig.checksum == snapshot.checksum).one().id
+    return config.id
+
+def get_stored_config(db: Session, config_id: int):
+    return db.query(StoredConfig).filter(StoredConfig.id == config_id).first()
+
 # Add more data access functions as needed
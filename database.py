@@ -1,7 +1,11 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, StaticPool
 import os
+import threading
+import time
+import weakref
 from dotenv import load_dotenv
 import logging
 from sqlalchemy.exc import SQLAlchemyError
@@ -12,17 +16,188 @@ load_dotenv()
 # Use environment variable for database URL
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
 metadata = MetaData()
-metadata.reflect(bind=engine)  # This line reflects the current database structure
 
 Base = declarative_base(metadata=metadata)
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_engine = None
+_engine_lock = threading.Lock()
+
+# Engines (sync, or the sync side of async ones) whose pools get_pool_stats reports
+_instrumented_engines = weakref.WeakSet()
+
+# A checkout taking longer than this waited for a connection; faster ones were served at once
+WAIT_THRESHOLD_SECONDS = 0.001
+
+# Pool counters, updated from pool events and the instrumented pools
+_pool_stats = {
+    "connects": 0,
+    "checkouts": 0,
+    "checkins": 0,
+    "waits": 0,
+    "wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+    "timeouts": 0,
+}
+_stats_lock = threading.Lock()
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+def pool_settings():
+    """
+    Connection pool settings from the environment:
+
+        DB_POOL_SIZE            Connections kept open (default 5)
+        DB_MAX_OVERFLOW         Extra connections allowed under load (default 10)
+        DB_POOL_TIMEOUT         Seconds to wait for a free connection (default 30)
+        DB_POOL_RECYCLE         Seconds before a connection is replaced, -1 for never (default 1800)
+        DB_POOL_PRE_PING        Test connections on checkout (default true)
+        DB_STATEMENT_TIMEOUT_MS PostgreSQL statement_timeout, 0 for none (default 0)
+    """
+    return {
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "statement_timeout_ms": _env_int("DB_STATEMENT_TIMEOUT_MS", 0),
+    }
+
+def engine_options(url, settings=None):
+    """Keyword arguments for create_engine (or create_async_engine) for `url`."""
+    settings = settings or pool_settings()
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(("sqlite:", "aiosqlite:"))):
+        # One shared connection, otherwise every checkout sees a new empty database
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+
+    options = {
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "pool_timeout": settings["pool_timeout"],
+        "pool_recycle": settings["pool_recycle"],
+        "pool_pre_ping": settings["pool_pre_ping"],
+    }
+    if settings["statement_timeout_ms"] and url.startswith("postgresql"):
+        timeout = f"-c statement_timeout={settings['statement_timeout_ms']}"
+        if "+asyncpg" in url:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(settings["statement_timeout_ms"])}}
+        else:
+            options["connect_args"] = {"options": timeout}
+    return options
+
+class _WaitTimingPool:
+    """
+    Records checkouts that had to wait for a connection.
+
+    _do_get is the hook SQLAlchemy pool subclasses implement; the public
+    checkout event only fires once a connection has been handed out, too
+    late to time the wait. Checkouts served within WAIT_THRESHOLD_SECONDS
+    are not counted, so "waits" measures contention, not traffic.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except SQLAlchemyError:
+            with _stats_lock:
+                _pool_stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            if waited >= WAIT_THRESHOLD_SECONDS:
+                with _stats_lock:
+                    _pool_stats["waits"] += 1
+                    _pool_stats["wait_seconds"] += waited
+                    _pool_stats["max_wait_seconds"] = max(_pool_stats["max_wait_seconds"], waited)
+
+class InstrumentedQueuePool(_WaitTimingPool, QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+class InstrumentedAsyncQueuePool(_WaitTimingPool, AsyncAdaptedQueuePool):
+    """The asyncio QueuePool, e.g. for the game server, with the same wait accounting."""
+
+def _count(name):
+    def listener(*args):
+        with _stats_lock:
+            _pool_stats[name] += 1
+    return listener
+
+def instrument_engine(engine):
+    """Count connects, checkouts and checkins of a sync or async engine and report its pool in get_pool_stats."""
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "connect", _count("connects"))
+    event.listen(engine, "checkout", _count("checkouts"))
+    event.listen(engine, "checkin", _count("checkins"))
+    _instrumented_engines.add(engine)
+    return engine
+
+def get_engine():
+    """
+    The shared engine, created on first use.
+
+    Nothing connects to the database at import time. Schema reflection into
+    `metadata` only happens when DB_REFLECT is set.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not DATABASE_URL:
+                    raise RuntimeError("DATABASE_URL is not set")
+                options = engine_options(DATABASE_URL)
+                options.setdefault("poolclass", InstrumentedQueuePool)
+                engine = create_engine(DATABASE_URL, **options)
+                instrument_engine(engine)
+                if _env_bool("DB_REFLECT", False):
+                    metadata.reflect(bind=engine)  # This line reflects the current database structure
+                _engine = engine
+    return _engine
+
+def get_pool_stats():
+    """
+    Pool counters plus the current size, checked-out and overflow connections,
+    summed over the shared engine and every instrumented (e.g. async) engine.
+    """
+    with _stats_lock:
+        stats = dict(_pool_stats)
+    stats["average_wait_seconds"] = stats["wait_seconds"] / stats["waits"] if stats["waits"] else 0.0
+    engines = set(_instrumented_engines)
+    if _engine is not None:
+        engines.add(_engine)
+    pools = [engine.pool for engine in engines if isinstance(engine.pool, QueuePool)]
+    if pools:
+        stats.update(size=sum(pool.size() for pool in pools),
+                     checked_out=sum(pool.checkedout() for pool in pools),
+                     overflow=sum(max(pool.overflow(), 0) for pool in pools))
+    return stats
+
+class _LazySessionMaker(sessionmaker):
+    """A sessionmaker that binds to the engine on the first session it creates."""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+SessionLocal = _LazySessionMaker(autocommit=False, autoflush=False)
+
+def __getattr__(name):
+    # `from database import engine` keeps working, but creates the engine only when asked for
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def get_db():
     db = SessionLocal()
     try:
@@ -31,11 +206,13 @@ def get_db():
         db.close()
 
 def create_tables():
+    from db_models import Base as ModelBase
     try:
-        Base.metadata.create_all(bind=engine)
+        ModelBase.metadata.create_all(bind=get_engine())
         logger.info("Tables created successfully.")
     except SQLAlchemyError as e:
         logger.error(f"An error occurred while creating tables: {e}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     create_tables()
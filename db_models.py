@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Float, DateTime, ForeignKey, Boolean
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
+from outcome import SpinOutcome
 
 Base = declarative_base()
 
@@ -18,10 +19,14 @@ class Player(Base):
     total_spins = Column(Integer)
     total_winnings = Column(Float)
     token_conversion_rate = Column(Float, default=1.0)
+    # Bumped by every write to the row; WalletCache updates compare against it
+    version = Column(Integer, nullable=False, default=0, server_default="0")
     
     sessions = relationship("GameSession", back_populates="player")
     transactions = relationship("Transaction", back_populates="player")
 
+    __mapper_args__ = {"version_id_col": version}
+
 class GameSession(Base):
     __tablename__ = "game_sessions"
     id = Column(Integer, primary_key=True, index=True)
@@ -30,6 +35,10 @@ class GameSession(Base):
     end_time = Column(DateTime)
     initial_balance = Column(Float)
     final_balance = Column(Float)
+    # Spins draw from one AES-CTR stream keyed by rng_seed (hex). The SHA-256
+    # commitment is shown when the session starts, the seed when it ends
+    rng_seed = Column(String(64))
+    seed_commitment = Column(String(64))
     
     player = relationship("Player", back_populates="sessions")
     game_results = relationship("GameResult", back_populates="session")
@@ -40,7 +49,8 @@ class GameResult(Base):
     session_id = Column(Integer, ForeignKey("game_sessions.id"))
     spin_number = Column(Integer)
     bet_amount = Column(Float)
-    outcome = Column(String)
+    outcome = Column(String)  # Legacy str() of the symbol grid; new rows use outcome_code
+    outcome_code = Column(BigInteger, index=True)  # SpinOutcome.packed
     winnings = Column(Float)
     timestamp = Column(DateTime, default=datetime.utcnow)
     points_won = Column(Integer, default=0)
@@ -49,9 +59,31 @@ class GameResult(Base):
     bonus_win = Column(Float, default=0.0)
     balance_after = Column(Float)
     current_jackpot = Column(Float)
+    # Session stream position at the start of the spin and the configuration
+    # it was played under: enough to regenerate the spin (see replay.py)
+    rng_offset = Column(BigInteger)
+    config_id = Column(Integer, ForeignKey("config_snapshots.id"))
     
     session = relationship("GameSession", back_populates="game_results")
 
+    @property
+    def spin_outcome(self):
+        """The outcome as a SpinOutcome, from the packed code or the legacy string."""
+        if self.outcome_code is not None:
+            return SpinOutcome.from_packed(self.outcome_code)
+        if self.outcome:
+            return SpinOutcome.from_string(self.outcome)
+        return None
+
+class StoredConfig(Base):
+    """A reel and payout configuration as played, stored once per checksum."""
+    __tablename__ = "config_snapshots"
+    id = Column(Integer, primary_key=True, index=True)
+    checksum = Column(String(64), unique=True, nullable=False)
+    reels = Column(Text, nullable=False)  # JSON, symbol order preserved
+    symbol_payouts = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Transaction(Base):
     __tablename__ = "transactions"
     id = Column(Integer, primary_key=True, index=True)
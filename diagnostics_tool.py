@@ -3,18 +3,64 @@ import dearpygui.dearpygui as dpg
 import threading
 import time
 import os
-from config_manager import get_reel_probabilities, update_probabilities, get_symbol_payouts, update_symbol_payouts
+from config_manager import get_reel_probabilities, update_probabilities, get_symbol_payouts, update_symbol_payouts, invalidate_config_cache
 from database import SessionLocal
 from db_models import GameResult, ReelConfiguration
+from stats_engine import StatsEngine
+from reporting import downsample_series
+from metrics import fetch_snapshot, SPIN_STAGES, DEFAULT_METRICS_PORT
 from sqlalchemy import func, exc as SQLAlchemy
 import logging
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 last_modified_time = 0
 update_needed = threading.Event()
 
+PLOT_WIDTH = 380
+
+# Chart tag and the snapshot series drawn in it
+CHART_SERIES = [
+    ("average_win_chart", ['cumulative_avg_wins']),
+    ("balance_chart", ['balance_after']),
+    ("points_won_chart", ['points_won']),
+    ("winnings_breakdown_chart", ['regular_winnings', 'jackpot_win', 'bonus_win']),
+    ("jackpot_progression_chart", ['current_jackpot']),
+    ("win_frequency_chart", ['win_flags']),
+    ("rtp_over_time_chart", ['rtp_over_time']),
+    ("bonus_trigger_chart", ['bonus_flags']),
+]
+
+# Snapshot endpoint of the running game (reelAlgo with METRICS_PORT set, or game_server)
+METRICS_URL = os.getenv("METRICS_URL", f"http://127.0.0.1:{DEFAULT_METRICS_PORT}/metrics.json")
+METRICS_POLL_SECONDS = 2.0
+
+def poll_metrics(latest, stop):
+    """Fetch the game's metrics snapshot into latest[0] until `stop` is set; None while unreachable."""
+    while not stop.is_set():
+        latest[0] = fetch_snapshot(METRICS_URL)
+        stop.wait(METRICS_POLL_SECONDS)
+
+def update_latency(snapshot):
+    """Chart the p95 of each spin stage and list p50/p95/p99 beside it."""
+    if snapshot is None:
+        dpg.set_value("stage_latency_table", f"No metrics from {METRICS_URL}")
+        return
+    stages = snapshot["histograms"].get("spin_stage_seconds", {})
+    names = [stage for stage in SPIN_STAGES if stage in stages]
+    dpg.set_value("stage_latency_chart", [list(range(len(names))), [stages[name]["p95"] * 1000 for name in names]])
+    dpg.set_axis_ticks("stage_latency_chart_x", tuple((name, i) for i, name in enumerate(names)))
+    dpg.fit_axis_data("stage_latency_chart_y")
+    lines = [f"{'stage':<12}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)"]
+    for name in names:
+        entry = stages[name]
+        lines.append(f"{name:<12}{entry['p50'] * 1000:9.2f}{entry['p95'] * 1000:9.2f}{entry['p99'] * 1000:9.2f}")
+    pool = snapshot.get("db_pool") or {}
+    if pool:
+        lines.append(f"DB pool: {pool.get('checked_out', 0)} checked out, "
+                     f"max wait {pool.get('max_wait_seconds', 0) * 1000:.1f} ms, {pool.get('timeouts', 0)} timeouts")
+    dpg.set_value("stage_latency_table", "\n".join(lines))
+
 def load_logs():
     db = SessionLocal()
     try:
@@ -44,70 +90,21 @@ def calculate_stats(logs):
         "cumulative_avg_wins": cumulative_avg_wins
     }
 
-def update_stats():
+def update_stats(stats):
+    """Push a StatsEngine snapshot into the dashboard widgets."""
     dpg.set_value("status", "Updating...")
-    logs = load_logs()
-    stats = calculate_stats(logs)
     
     dpg.set_value("total_spins", f"Total Spins: {stats['total_spins']}")
     dpg.set_value("total_winnings", f"Total Winnings: ${stats['total_winnings']:.2f}")
     dpg.set_value("average_win", f"Average Win: ${stats['average_win']:.2f}")
     dpg.set_value("rtp", f"Return to Player: {stats['rtp']:.2f}%")
     
-    if logs:
-        spins = list(range(1, len(logs) + 1))
-        
-        # Average Win per Spin
-        avg_wins = stats['cumulative_avg_wins']
-        dpg.set_value("average_win_chart", [spins, avg_wins])
-        dpg.fit_axis_data("average_win_chart_x")
-        dpg.fit_axis_data("average_win_chart_y")
-        
-        # Balance Over Time
-        balances = [log.balance_after if log.balance_after is not None else 0 for log in logs]
-        dpg.set_value("balance_chart", [spins, balances])
-        dpg.fit_axis_data("balance_chart_x")
-        dpg.fit_axis_data("balance_chart_y")
-        
-        # Points Won Over Time
-        points_won = [log.points_won if log.points_won is not None else 0 for log in logs]
-        dpg.set_value("points_won_chart", [spins, points_won])
-        dpg.fit_axis_data("points_won_chart_x")
-        dpg.fit_axis_data("points_won_chart_y")
-        
-        # Winnings Breakdown
-        regular_winnings = [log.regular_winnings if log.regular_winnings is not None else 0 for log in logs]
-        jackpot_wins = [log.jackpot_win if log.jackpot_win is not None else 0 for log in logs]
-        bonus_wins = [log.bonus_win if log.bonus_win is not None else 0 for log in logs]
-        dpg.set_value("winnings_breakdown_chart", [spins, regular_winnings, jackpot_wins, bonus_wins])
-        dpg.fit_axis_data("winnings_breakdown_chart_x")
-        dpg.fit_axis_data("winnings_breakdown_chart_y")
-        
-        # Jackpot Progression
-        jackpot_values = [log.current_jackpot if log.current_jackpot is not None else 0 for log in logs]
-        dpg.set_value("jackpot_progression_chart", [spins, jackpot_values])
-        dpg.fit_axis_data("jackpot_progression_chart_x")
-        dpg.fit_axis_data("jackpot_progression_chart_y")
-        
-        # Win Frequency
-        win_frequency = [1 if log.winnings and log.winnings > 0 else 0 for log in logs]
-        dpg.set_value("win_frequency_chart", [spins, win_frequency])
-        dpg.fit_axis_data("win_frequency_chart_x")
-        dpg.fit_axis_data("win_frequency_chart_y")
-        
-        # RTP Over Time
-        cumulative_winnings = [sum(log.winnings if log.winnings is not None else 0 for log in logs[:i+1]) for i in range(len(logs))]
-        cumulative_bets = [sum(log.bet_amount if log.bet_amount is not None else 0 for log in logs[:i+1]) for i in range(len(logs))]
-        rtp_over_time = [w / b * 100 if b > 0 else 0 for w, b in zip(cumulative_winnings, cumulative_bets)]
-        dpg.set_value("rtp_over_time_chart", [spins, rtp_over_time])
-        dpg.fit_axis_data("rtp_over_time_chart_x")
-        dpg.fit_axis_data("rtp_over_time_chart_y")
-        
-        # Bonus Trigger Frequency
-        bonus_triggers = [1 if log.bonus_win and log.bonus_win > 0 else 0 for log in logs]
-        dpg.set_value("bonus_trigger_chart", [spins, bonus_triggers])
-        dpg.fit_axis_data("bonus_trigger_chart_x")
-        dpg.fit_axis_data("bonus_trigger_chart_y")
+    if stats['total_spins']:
+        # Each chart gets about one point per pixel, whatever the history length
+        for tag, names in CHART_SERIES:
+            dpg.set_value(tag, downsample_series(stats, names, PLOT_WIDTH))
+            dpg.fit_axis_data(f"{tag}_x")
+            dpg.fit_axis_data(f"{tag}_y")
     
     dpg.set_value("status", "Up to date")
 
@@ -153,6 +150,7 @@ def save_probabilities(new_probabilities):
                     new_config = ReelConfiguration(reel_number=reel_number, symbol=symbol, probability=probability)
                     db.add(new_config)
         db.commit()
+        invalidate_config_cache()
         logger.info("Probabilities saved successfully")
         
         # Verify save
@@ -282,6 +280,11 @@ def main():
                 create_plot("RTP Over Time", "Spins", "RTP (%)", "rtp_over_time_chart")
                 create_plot("Bonus Trigger Frequency", "Spins", "Bonus Triggered", "bonus_trigger_chart", series_type="stem")
         
+        dpg.add_text("Spin Latency", color=(255, 255, 0))
+        with dpg.group(horizontal=True):
+            create_plot("p95 per Stage", "Stage", "p95 (ms)", "stage_latency_chart", series_type="bar")
+            dpg.add_text("", tag="stage_latency_table")
+        
         dpg.add_button(label="Probabilities", callback=toggle_probabilities_window)
         dpg.add_button(label="Adjust Symbol Payouts", callback=create_symbol_payout_window)
 
@@ -289,13 +292,29 @@ def main():
     dpg.setup_dearpygui()
     dpg.show_viewport()
     
+    # Statistics are folded in incrementally on a background thread; frames
+    # only touch the widgets when a new snapshot has been published
+    stats_engine = StatsEngine().start()
+    latest_metrics, stop_metrics = [None], threading.Event()
+    threading.Thread(target=poll_metrics, args=(latest_metrics, stop_metrics), daemon=True).start()
+    shown_version = None
+    shown_metrics = False
     while dpg.is_dearpygui_running():
-        update_stats()
+        stats = stats_engine.snapshot()
+        if stats['version'] != shown_version:
+            update_stats(stats)
+            shown_version = stats['version']
+        metrics_snapshot = latest_metrics[0]
+        if metrics_snapshot is not shown_metrics:
+            update_latency(metrics_snapshot)
+            shown_metrics = metrics_snapshot
         dpg.render_dearpygui_frame()
 
+    stop_metrics.set()
+    stats_engine.stop()
     dpg.destroy_context()
 
-def create_plot(label, x_label, y_label, tag, height=200, width=380, series_type="line"):
+def create_plot(label, x_label, y_label, tag, height=200, width=PLOT_WIDTH, series_type="line"):
     with dpg.plot(label=label, height=height, width=width):
         dpg.add_plot_legend()
         x_axis = dpg.add_plot_axis(dpg.mvXAxis, label=x_label, tag=f"{tag}_x")
@@ -309,4 +328,5 @@ def create_plot(label, x_label, y_label, tag, height=200, width=380, series_type
             dpg.add_stem_series([], [], label=label, parent=y_axis, tag=tag)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
     main()
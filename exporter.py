@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from db_models import GameResult, GameSession, Transaction
+from outcome import SpinOutcome
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = 'exports'
+CHUNK_SIZE = 100000
+FORMATS = ['npy', 'parquet', 'arrow']
+
+# Exported tables: model and (column, NumPy dtype) pairs. Strings are stored
+# fixed-width so every column can be memory-mapped. Outcomes are exported as
+# the packed outcome_code only (see LEGACY_COLUMNS).
+EXPORT_TABLES = {
+    'game_results': (GameResult, [
+        ('id', '<i8'), ('session_id', '<i8'), ('spin_number', '<i8'), ('bet_amount', '<f8'),
+        ('outcome_code', '<i8'), ('winnings', '<f8'), ('timestamp', '<M8[us]'),
+        ('points_won', '<i8'),
+        ('regular_winnings', '<f8'), ('jackpot_win', '<f8'), ('bonus_win', '<f8'),
+        ('balance_after', '<f8'), ('current_jackpot', '<f8'),
+    ]),
+    'game_sessions': (GameSession, [
+        ('id', '<i8'), ('player_id', '<i8'), ('start_time', '<M8[us]'), ('end_time', '<M8[us]'),
+        ('initial_balance', '<f8'), ('final_balance', '<f8'),
+    ]),
+    'transactions': (Transaction, [
+        ('id', '<i8'), ('player_id', '<i8'), ('amount', '<f8'), ('type', 'S16'), ('timestamp', '<M8[us]'),
+    ]),
+}
+
+# Exported columns filled from a legacy column when NULL: {table: {column: (source column, conversion)}}
+LEGACY_COLUMNS = {
+    'game_results': {'outcome_code': ('outcome', lambda text: SpinOutcome.from_string(text).packed)},
+}
+
+# Stand-in for NULL in integer columns; floats use NaN and datetimes NaT
+INT_NULL = -1
+
+# Fixed .npy header size, so the shape can be rewritten in place on append
+NPY_HEADER_SIZE = 128
+
+def _manifest_path(directory):
+    return os.path.join(directory, 'manifest.json')
+
+def load_manifest(directory):
+    """Export state of one table: format, rows, last exported id and columns."""
+    path = _manifest_path(directory)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _save_manifest(directory, manifest):
+    path = _manifest_path(directory)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def _to_array(values, dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'i':
+        return np.array([INT_NULL if v is None else v for v in values], dtype=dtype)
+    if dtype.kind == 'f':
+        return np.array([np.nan if v is None else v for v in values], dtype=dtype)
+    if dtype.kind == 'M':
+        return np.array(['NaT' if v is None else v for v in values], dtype=dtype)
+    encoded = [b'' if v is None else str(v).encode('utf-8') for v in values]
+    longest = max(map(len, encoded), default=0)
+    if longest > dtype.itemsize:
+        # NumPy would silently cut the value to the column width
+        raise ValueError(f"Value of {longest} bytes does not fit a {dtype.itemsize}-byte column")
+    return np.array(encoded, dtype=dtype)
+
+def _npy_header(dtype, rows):
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False,
+                   'shape': (rows,)})
+    magic = b'\x93NUMPY\x01\x00'
+    length = NPY_HEADER_SIZE - len(magic) - 2
+    return magic + length.to_bytes(2, 'little') + header.encode('latin1').ljust(length - 1) + b'\n'
+
+class NpyColumnStore:
+    """
+    One appendable .npy file per column.
+
+    Rows are appended to the end of each file and the header's shape is
+    rewritten in place, so the files are always valid for
+    np.load(..., mmap_mode='r'). The manifest is written last; rows past
+    the manifest's count (from an interrupted export) are truncated on open.
+    """
+
+    def __init__(self, directory, columns, rows):
+        self.directory = directory
+        self.columns = columns
+        self.rows = rows
+        for name, dtype in columns:
+            path = self._path(name)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(_npy_header(dtype, 0))
+            with open(path, 'r+b') as f:
+                f.truncate(NPY_HEADER_SIZE + rows * np.dtype(dtype).itemsize)
+                f.seek(0)
+                f.write(_npy_header(dtype, rows))
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def append(self, arrays):
+        count = len(arrays[self.columns[0][0]])
+        for name, dtype in self.columns:
+            with open(self._path(name), 'r+b') as f:
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+                f.seek(0)
+                f.write(_npy_header(dtype, self.rows + count))
+        self.rows += count
+
+    def close(self):
+        pass
+
+class ArrowPartStore:
+    """
+    Parquet or Arrow IPC output. Columnar files cannot be appended to, so
+    each export run writes a new part file with one row group per chunk;
+    pyarrow.dataset reads the parts as one table.
+    """
+
+    def __init__(self, directory, columns, fmt, first_row):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(f"The {fmt} export format requires pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.fmt = fmt
+        self.columns = columns
+        self.schema = pa.schema([(name, self._arrow_type(dtype)) for name, dtype in columns])
+        self.path = os.path.join(directory, f"part-{first_row:012d}.{fmt}")
+        self.tmp_path = self.path + '.tmp'
+        self.writer = None
+
+    def _arrow_type(self, dtype):
+        dtype = np.dtype(dtype)
+        if dtype.kind == 'S':
+            return self.pa.string()
+        if dtype.kind == 'M':
+            return self.pa.timestamp('us')
+        return self.pa.from_numpy_dtype(dtype)
+
+    def append(self, arrays):
+        pa = self.pa
+        if self.writer is None:
+            if self.fmt == 'parquet':
+                import pyarrow.parquet as pq
+                self.writer = pq.ParquetWriter(self.tmp_path, self.schema)
+            else:
+                self.writer = pa.ipc.new_file(self.tmp_path, self.schema)
+        batch = []
+        for (name, dtype), field in zip(self.columns, self.schema):
+            values = arrays[name]
+            if np.dtype(dtype).kind == 'S':
+                values = np.char.decode(values, 'utf-8')
+            batch.append(pa.array(values, type=field.type))
+        table = pa.Table.from_arrays(batch, schema=self.schema)
+        if self.fmt == 'parquet':
+            self.writer.write_table(table)
+        else:
+            self.writer.write(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.tmp_path, self.path)
+
+def export_table(db: Session, table, out_dir=EXPORT_DIR, fmt='npy', chunk_size=CHUNK_SIZE):
+    """
+    Append rows of one table added since the last export.
+
+    Rows are streamed with a server-side cursor in `chunk_size` partitions
+    and written column by column, so memory use does not depend on the
+    size of the table. Exports are incremental by id; rows updated after
+    they were exported (e.g. a session's end_time) are not re-exported.
+
+    :param table: A key of EXPORT_TABLES
+    :param fmt: 'npy', 'parquet' or 'arrow'
+    :return: Number of rows exported
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    model, columns = EXPORT_TABLES[table]
+    directory = os.path.join(out_dir, table)
+    os.makedirs(directory, exist_ok=True)
+
+    manifest = load_manifest(directory) or {
+        'table': table, 'format': fmt, 'rows': 0, 'last_id': 0,
+        'columns': [[name, np.dtype(dtype).str] for name, dtype in columns],
+    }
+    if manifest['format'] != fmt:
+        raise ValueError(f"{directory} holds a {manifest['format']} export, not {fmt}")
+    # The column set is fixed when an export directory is created
+    columns = [(name, dtype) for name, dtype in manifest['columns']]
+
+    if fmt == 'npy':
+        store = NpyColumnStore(directory, columns, manifest['rows'])
+    else:
+        store = ArrowPartStore(directory, columns, fmt, manifest['rows'])
+
+    legacy = [(columns.index((name, dtype)), source, convert)
+              for (name, dtype) in columns
+              for column, (source, convert) in LEGACY_COLUMNS.get(table, {}).items() if column == name]
+    query = (
+        select(*[getattr(model, name) for name, _ in columns], *[getattr(model, source) for _, source, _ in legacy])
+        .where(model.id > manifest['last_id'])
+        .order_by(model.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    exported = 0
+    try:
+        for rows in db.execute(query).partitions():
+            values = list(zip(*rows))
+            for extra, (index, _, convert) in enumerate(legacy, start=len(columns)):
+                values[index] = [convert(old) if value is None and old else value
+                                 for value, old in zip(values[index], values[extra])]
+            arrays = {name: _to_array(values[i], dtype) for i, (name, dtype) in enumerate(columns)}
+            store.append(arrays)
+            exported += len(rows)
+            manifest['rows'] += len(rows)
+            manifest['last_id'] = int(arrays['id'][-1])
+            if fmt == 'npy':
+                _save_manifest(directory, manifest)
+    finally:
+        store.close()
+    if exported and fmt != 'npy':
+        _save_manifest(directory, manifest)
+    logger.info(f"Exported {exported} {table} rows to {directory}")
+    return exported
+
+def export_history(db: Session, out_dir=EXPORT_DIR, fmt='npy', tables=None, chunk_size=CHUNK_SIZE):
+    """Incrementally export every table in `tables` (default: all)."""
+    return {table: export_table(db, table, out_dir, fmt, chunk_size) for table in (tables or EXPORT_TABLES)}
+
+def open_export(table, out_dir=EXPORT_DIR):
+    """
+    Open an exported table without touching the database.
+
+    :return: For npy exports, a dictionary of read-only memory-mapped
+             column arrays; otherwise a pyarrow.dataset.Dataset
+    """
+    directory = os.path.join(out_dir, table)
+    manifest = load_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No export found in {directory}")
+    if manifest['format'] == 'npy':
+        return {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')[:manifest['rows']]
+            for name, _ in manifest['columns']
+        }
+    import pyarrow.dataset as ds
+    return ds.dataset(directory, format='parquet' if manifest['format'] == 'parquet' else 'ipc',
+                      exclude_invalid_files=True)
+
+def decode_outcome(value):
+    """Turn an exported outcome_code back into the nested symbol list; None for a missing outcome."""
+    value = int(value)
+    return None if value == INT_NULL else SpinOutcome.from_packed(value).to_symbols()
+
+def main():
+    from database import SessionLocal
+    from simulate import positive_int
+
+    parser = argparse.ArgumentParser(description="Export game history to columnar files.")
+    parser.add_argument("--out", default=EXPORT_DIR, help="Output directory")
+    parser.add_argument("--format", choices=FORMATS, default='npy', help="Output format")
+    parser.add_argument("--tables", nargs="+", choices=list(EXPORT_TABLES), help="Tables to export")
+    parser.add_argument("--chunk", type=positive_int, default=CHUNK_SIZE, help="Rows per chunk")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        counts = export_history(db, args.out, args.format, args.tables, args.chunk)
+    finally:
+        db.close()
+    for table, count in counts.items():
+        print(f"{table}: {count} new rows")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,498 @@
+import argparse
+import asyncio
+import hmac
+import math
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from aiohttp import web, WSMsgType
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db_models import GameSession, GameResult
+from database import engine_options, instrument_engine, InstrumentedAsyncQueuePool
+from data_access import (create_player, get_player, create_game_session, end_game_session, apply_balance_change,
+                         get_or_create_config_snapshot)
+from config_manager import get_config_snapshot, build_config_snapshot, CONFIG_CHECK_SECONDS
+from security import get_password_hash
+from auth_service import AuthService, AuthServiceBusy
+from spin_service import SpinService, settle_spin
+from jackpot_manager import JackpotContributionBuffer, get_jackpot_value
+from combination_list import JACKPOT_RESET_VALUE
+from outcome import SpinOutcome
+from metrics import REGISTRY, spin_stage_seconds, spins_total, spin_errors_total
+from profiler import PROFILER, handle_admin_request
+from reelAlgo import selected_model
+from advanced_rng import SlotMachineRNG
+from replay import next_rng_offset, seed_commitment
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+# Starting balance of players created on their first session, as in reelAlgo
+INITIAL_BALANCE = 1000
+
+# Per game session state: spins of one session are settled one at a time, each
+# continuing the session's seeded stream at rng_offset[0]
+SessionState = namedtuple('SessionState', ['player_id', 'lock', 'spin_counter', 'rng_seed', 'rng_offset'])
+
+def positive_amount(value, name="Amount"):
+    """Parse a bet or transfer amount from a request; NaN, infinities and non-positive values are rejected."""
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number.") from None
+    if not (math.isfinite(amount) and amount > 0):
+        raise ValueError(f"{name} must be positive.")
+    return amount
+
+def async_database_url(url):
+    """Map a synchronous DATABASE_URL to the matching async driver (asyncpg or aiosqlite)."""
+    for prefix in ('postgresql+psycopg2://', 'postgresql://', 'postgres://'):
+        if url.startswith(prefix):
+            return 'postgresql+asyncpg://' + url[len(prefix):]
+    if url.startswith('sqlite://'):
+        return 'sqlite+aiosqlite://' + url[len('sqlite://'):]
+    return url
+
+# Spin worker processes: each builds the model once from the config snapshot
+_worker_service = None
+
+def _init_spin_worker(reels, symbol_payouts):
+    global _worker_service
+    rng = SlotMachineRNG(reseed_interval=None)
+    spin_reels, check_win, play_bonus_game = selected_model(build_config_snapshot(reels, symbol_payouts), rng=rng)
+    _worker_service = SpinService(spin_reels, check_win, play_bonus_game, rng=rng)
+
+def _evaluate_spin(bet_amount, rng_seed, rng_offset, service=None):
+    """
+    Evaluate a session's next spin from its stream position.
+
+    :return: (SpinEvaluation with the packed outcome, position of the following spin)
+    """
+    service = service or _worker_service
+    # Only the server process samples; in the spin workers the profiler is never running
+    with PROFILER.spin_scope():
+        evaluation = service.evaluate_at(bet_amount, rng_seed, rng_offset)
+    # Ship the packed outcome rather than the grid object
+    return evaluation._replace(outcome=evaluation.outcome.packed), service.rng.position
+
+class GameServer:
+    """
+    Asyncio game service for many concurrent players.
+
+    Database work goes through async SQLAlchemy, with the existing
+    data_access and spin_service functions run via AsyncSession.run_sync.
+    Drawing and evaluating spins is CPU-bound, so it runs on a process
+    pool and never blocks the event loop. Jackpot contributions are
+    batched in a JackpotContributionBuffer, flushed on a timer.
+    """
+
+    def __init__(self, database_url=None, spin_workers=None, auth=None, require_auth=True):
+        """
+        :param database_url: Defaults to ASYNC_DATABASE_URL, or DATABASE_URL mapped to its async driver
+        :param spin_workers: Spin evaluation processes; 0 evaluates on the event loop (for testing)
+        :param auth: AuthService used by the login action; created if require_auth is set
+        :param require_auth: Only serve requests carrying a login token, for the token's own player.
+                             False lets any caller spin, deposit and withdraw for any player_id;
+                             only for local testing
+        """
+        self.auth = auth or (AuthService() if require_auth else None)
+        self.require_auth = require_auth
+        database_url = database_url or os.getenv("ASYNC_DATABASE_URL") or async_database_url(os.getenv("DATABASE_URL"))
+        options = engine_options(database_url)
+        options.setdefault("poolclass", InstrumentedAsyncQueuePool)
+        self.engine = create_async_engine(database_url, **options)
+        # Pool checkouts and waits show up in /metrics alongside the spin stages
+        instrument_engine(self.engine)
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.spin_workers = os.cpu_count() if spin_workers is None else spin_workers
+        self.executor = None
+        self.local_service = None
+        self._local_lock = threading.Lock()
+        self.config_id = None
+        self.snapshot = None
+        self._config_watcher = None
+        # Flushed by _flush_jackpot through run_db, never from inside a spin
+        self.jackpot_buffer = JackpotContributionBuffer(auto_flush=False)
+        self._jackpot_flusher = None
+        self._sessions = {}
+
+    async def start(self, app=None):
+        await self._use_snapshot(await asyncio.to_thread(get_config_snapshot))
+        self._config_watcher = asyncio.create_task(self._watch_config())
+        value = await self.run_db(get_jackpot_value)
+        self.jackpot_buffer.reset_value(value if value is not None else JACKPOT_RESET_VALUE)
+        self._jackpot_flusher = asyncio.create_task(self._flush_jackpot())
+        logger.info(f"Game server started with {self.spin_workers} spin workers")
+
+    async def _use_snapshot(self, snapshot):
+        """Serve spins from `snapshot`; spins already evaluating finish on the previous model."""
+        # Stored once per checksum, so every result can name the configuration it was played under
+        config_id = await self.run_db(get_or_create_config_snapshot, snapshot)
+        old_executor = self.executor
+        if self.spin_workers:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.spin_workers, initializer=_init_spin_worker,
+                initargs=(snapshot.reels, snapshot.symbol_payouts)
+            )
+        # Also used with workers, while the profiler runs (see evaluate)
+        rng = SlotMachineRNG(reseed_interval=None)
+        self.local_service = SpinService(*selected_model(snapshot, rng=rng), rng=rng)
+        self.snapshot, self.config_id = snapshot, config_id
+        # Profiles taken from now on are tagged with the configuration being served
+        PROFILER.tags.update(config_version=snapshot.version, config_checksum=snapshot.checksum)
+        if old_executor is not None:
+            await asyncio.to_thread(old_executor.shutdown)
+
+    async def _watch_config(self):
+        # Configuration edits from other processes (the diagnostics dashboard) apply without a restart
+        while True:
+            await asyncio.sleep(CONFIG_CHECK_SECONDS)
+            try:
+                snapshot = await asyncio.to_thread(get_config_snapshot)
+                if snapshot.checksum != self.snapshot.checksum:
+                    await self._use_snapshot(snapshot)
+                    logger.info(f"Configuration changed, now serving {snapshot.checksum[:12]}")
+            except Exception as e:
+                logger.error(f"Could not check the configuration: {e}")
+
+    async def _flush_jackpot(self):
+        while True:
+            await asyncio.sleep(self.jackpot_buffer.flush_interval)
+            try:
+                await self.run_db(self.jackpot_buffer.flush)
+            except Exception:
+                pass  # Already logged; the contributions stay pending for the next flush
+
+    async def close(self, app=None):
+        if self._config_watcher is not None:
+            self._config_watcher.cancel()
+            self._config_watcher = None
+        if self._jackpot_flusher is not None:
+            self._jackpot_flusher.cancel()
+            self._jackpot_flusher = None
+            try:
+                await self.run_db(self.jackpot_buffer.flush)
+            except Exception:
+                logger.error(f"Jackpot contributions of {self.jackpot_buffer.drain():.2f} were not written")
+        if self.auth is not None:
+            self.auth.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        await self.engine.dispose()
+
+    async def run_db(self, fn, *args):
+        """Run a synchronous data access function, fn(session, *args), on an async session."""
+        async with self.sessionmaker() as session:
+            try:
+                return await session.run_sync(fn, *args)
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def evaluate(self, bet_amount, rng_seed, rng_offset):
+        """
+        :return: (SpinEvaluation, stream position of the session's following spin,
+                 config_snapshots id of the configuration it was played under)
+        """
+        # Read together, before any await, so the id always matches the model used
+        config_id = self.config_id
+        if self.executor is None:
+            return (*_evaluate_spin(bet_amount, rng_seed, rng_offset, self.local_service), config_id)
+        if PROFILER.active:
+            # The sampler cannot see the worker processes, so while it runs spins are
+            # evaluated in this process, off the event loop and one at a time
+            service = self.local_service
+            return (*await asyncio.to_thread(self._evaluate_locally, service, bet_amount, rng_seed, rng_offset),
+                    config_id)
+        evaluation, next_offset = await asyncio.get_running_loop().run_in_executor(
+            self.executor, _evaluate_spin, bet_amount, rng_seed, rng_offset)
+        return evaluation, next_offset, config_id
+
+    def _evaluate_locally(self, service, bet_amount, rng_seed, rng_offset):
+        with self._local_lock:
+            return _evaluate_spin(bet_amount, rng_seed, rng_offset, service)
+
+    async def _session_state(self, session_id):
+        state = self._sessions.get(session_id)
+        if state is None:
+            def load(db):
+                game_session = db.get(GameSession, session_id)
+                if game_session is None or game_session.end_time is not None:
+                    raise LookupError(f"No active game session {session_id}")
+                last_spin = db.execute(
+                    select(func.max(GameResult.spin_number)).where(GameResult.session_id == session_id)
+                ).scalar()
+                if game_session.rng_seed is None:
+                    # Started before seeded replay: the rest of the session gets a fresh stream
+                    seed = os.urandom(32)
+                    game_session.rng_seed, game_session.seed_commitment = seed.hex(), seed_commitment(seed)
+                    db.commit()
+                # Continue the stream where the last stored spin stopped
+                rng_offset = next_rng_offset(db, session_id)
+                return game_session.player_id, last_spin or 0, bytes.fromhex(game_session.rng_seed), rng_offset
+            player_id, last_spin, rng_seed, rng_offset = await self.run_db(load)
+            state = self._sessions.setdefault(
+                session_id, SessionState(player_id, asyncio.Lock(), [last_spin], rng_seed, [rng_offset]))
+        return state
+
+    def _authorize(self, owner_id, auth_player_id):
+        if self.require_auth and owner_id != auth_player_id:
+            raise PermissionError("Not authorized for this player")
+
+    async def login(self, username, password):
+        if self.auth is None:
+            raise ValueError("Login is not enabled on this server")
+        token = await self.auth.authenticate_async(username, password, self.run_db)
+        if token is None:
+            raise PermissionError("Invalid username or password")
+        return {"token": token.token, "player_id": token.player_id, "expires_in": self.auth.token_ttl}
+
+    async def start_session(self, username, auth_player_id=None):
+        # With authentication the session is always for the logged-in player
+        player = await self.run_db(get_player, auth_player_id if self.require_auth else username)
+        if player is None and self.require_auth:
+            raise LookupError(f"Player {auth_player_id} not found")
+        if player is None:
+            # The password KDF is CPU-bound; keep it off the event loop
+            password_hash = await asyncio.to_thread(get_password_hash, "")
+            player = await self.run_db(
+                lambda db: create_player(db, username, f"{username}@example.com", "",
+                                         initial_balance=INITIAL_BALANCE, password_hash=password_hash)
+            )
+        game_session = await self.run_db(create_game_session, player.id, player.balance)
+        self._sessions[game_session.id] = SessionState(
+            player.id, asyncio.Lock(), [0], bytes.fromhex(game_session.rng_seed), [0])
+        # The seed itself is revealed by end_session; the commitment proves it was fixed up front
+        return {"session_id": game_session.id, "player_id": player.id, "balance": player.balance,
+                "seed_commitment": game_session.seed_commitment}
+
+    async def spin(self, session_id, bet_amount, auth_player_id=None):
+        bet_amount = positive_amount(bet_amount, "Bet amount")
+        state = await self._session_state(session_id)
+        self._authorize(state.player_id, auth_player_id)
+        async with state.lock:
+            # Stages run in the worker processes are not recorded; 'total'
+            # covers evaluation there plus the settle stages recorded here
+            with spin_stage_seconds.time('total'):
+                evaluation, next_offset, config_id = await self.evaluate(bet_amount, state.rng_seed,
+                                                                         state.rng_offset[0])
+                outcome = SpinOutcome.from_packed(evaluation.outcome)
+                spin_number = state.spin_counter[0] + 1
+                try:
+                    balance, jackpot_win, current_jackpot, _ = await self.run_db(
+                        lambda db: settle_spin(
+                            db, state.player_id, session_id, spin_number, bet_amount, outcome,
+                            evaluation.points, evaluation.regular_winnings, evaluation.bonus_win,
+                            evaluation.jackpot_hit, jackpot_buffer=self.jackpot_buffer,
+                            rng_offset=evaluation.rng_offset, config_id=config_id
+                        )
+                    )
+                except Exception as e:
+                    spin_errors_total.inc(label_value=type(e).__name__)
+                    raise
+            state.spin_counter[0] = spin_number
+            # A spin that was not settled is drawn again from the same position
+            state.rng_offset[0] = next_offset
+            spins_total.inc()
+        return {
+            "session_id": session_id,
+            "spin_number": spin_number,
+            "bet_amount": bet_amount,
+            "outcome": outcome.to_symbols(),
+            "points": evaluation.points,
+            "winning_paylines": evaluation.winning_paylines,
+            "regular_winnings": evaluation.regular_winnings,
+            "bonus_win": evaluation.bonus_win,
+            "jackpot_win": jackpot_win,
+            "winnings": evaluation.regular_winnings + evaluation.bonus_win + jackpot_win,
+            "balance": balance,
+            "current_jackpot": current_jackpot,
+        }
+
+    async def end_session(self, session_id, auth_player_id=None):
+        state = await self._session_state(session_id)
+        self._authorize(state.player_id, auth_player_id)
+        async with state.lock:
+            player = await self.run_db(get_player, state.player_id)
+            await self.run_db(end_game_session, session_id, player.balance)
+            self._sessions.pop(session_id, None)
+        # With the seed, every spin of the session can be checked (see replay.py)
+        return {"session_id": session_id, "final_balance": player.balance, "rng_seed": state.rng_seed.hex()}
+
+    async def balance(self, player_id):
+        player = await self.run_db(get_player, player_id)
+        if player is None:
+            raise LookupError(f"Player {player_id} not found")
+        return {"player_id": player_id, "balance": player.balance}
+
+    async def deposit(self, player_id, amount):
+        amount = positive_amount(amount)
+        balance = await self.run_db(apply_balance_change, player_id, amount, "deposit")
+        return {"player_id": player_id, "balance": balance}
+
+    async def withdraw(self, player_id, amount):
+        amount = positive_amount(amount)
+        balance = await self.run_db(apply_balance_change, player_id, -amount, "withdrawal")
+        return {"player_id": player_id, "balance": balance}
+
+    async def dispatch(self, message, token=None):
+        """
+        Run one action given as a dictionary, as sent over the WebSocket.
+
+        :param token: Login token, if not given in the message itself
+        :raises PermissionError: If authentication is required and missing or wrong
+        """
+        action = message.get("action")
+        if action == "login":
+            return await self.login(message["username"], message["password"])
+
+        token = message.get("token") or token
+        auth_player_id = self.auth.validate_token(token) if self.auth is not None and token else None
+        if self.require_auth and auth_player_id is None:
+            raise PermissionError("Authentication required")
+
+        if action == "start_session":
+            return await self.start_session(message.get("username"), auth_player_id)
+        if action == "spin":
+            return await self.spin(int(message["session_id"]), message["bet_amount"], auth_player_id)
+        if action == "end_session":
+            return await self.end_session(int(message["session_id"]), auth_player_id)
+        if action in ("balance", "deposit", "withdraw"):
+            player_id = int(message["player_id"])
+            self._authorize(player_id, auth_player_id)
+            if action == "balance":
+                return await self.balance(player_id)
+            if action == "deposit":
+                return await self.deposit(player_id, message["amount"])
+            return await self.withdraw(player_id, message["amount"])
+        raise ValueError(f"Unknown action: {action}")
+
+def _error_response(e):
+    if isinstance(e, PermissionError):
+        return web.json_response({"error": str(e)}, status=401)
+    if isinstance(e, AuthServiceBusy):
+        return web.json_response({"error": str(e)}, status=503)
+    if isinstance(e, LookupError):
+        return web.json_response({"error": str(e)}, status=404)
+    return web.json_response({"error": str(e)}, status=400)
+
+def create_app(server=None, admin_token=None):
+    """
+    Build the aiohttp application.
+
+    HTTP endpoints (JSON bodies and responses):
+        POST /login                          {"username", "password"} -> {"token", ...}
+        POST /sessions                       {"username"}
+        POST /sessions/{session_id}/spin     {"bet_amount"}
+        POST /sessions/{session_id}/end
+        GET  /players/{player_id}/balance
+        POST /players/{player_id}/deposit    {"amount"}
+        POST /players/{player_id}/withdraw   {"amount"}
+        GET  /metrics, /metrics.json         Spin latency and counters (see metrics.py)
+        POST /profile/{start,stop,status}    Sampling profiler (see profiler.py); only with
+                                             admin_token, sent as "X-Admin-Token". While it
+                                             runs, spins are evaluated in the server process
+                                             so the sampler can see them
+    GET /ws opens a WebSocket taking the same actions as JSON messages,
+    e.g. {"action": "spin", "session_id": 1, "bet_amount": 5}; an optional
+    "request_id" is echoed back in the reply.
+
+    With require_auth (the default), HTTP requests send "Authorization:
+    Bearer <token>" and WebSocket messages a "token" field; players can
+    only act on their own sessions and balance.
+    """
+    server = server or GameServer()
+    app = web.Application()
+    app['server'] = server
+    app.on_startup.append(server.start)
+    app.on_cleanup.append(server.close)
+
+    def handler(action, *path_args, body_args=()):
+        async def handle(request):
+            message = {"action": action}
+            message.update({name: request.match_info[name] for name in path_args})
+            if body_args:
+                try:
+                    body = await request.json()
+                    message.update({name: body[name] for name in body_args})
+                except (ValueError, KeyError) as e:
+                    return web.json_response({"error": f"Invalid request body: {e}"}, status=400)
+            authorization = request.headers.get('Authorization', '')
+            token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else None
+            try:
+                return web.json_response(await server.dispatch(message, token))
+            except (ValueError, LookupError, PermissionError, AuthServiceBusy) as e:
+                return _error_response(e)
+        return handle
+
+    async def websocket(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            message = None
+            try:
+                message = msg.json()
+                reply = await server.dispatch(message)
+            except (ValueError, LookupError, KeyError, PermissionError, AuthServiceBusy) as e:
+                reply = {"error": str(e)}
+            if isinstance(message, dict) and "request_id" in message:
+                reply["request_id"] = message["request_id"]
+            await ws.send_json(reply)
+        return ws
+
+    async def metrics(request):
+        return web.Response(text=REGISTRY.render_prometheus(), content_type='text/plain')
+
+    async def metrics_json(request):
+        return web.json_response(REGISTRY.snapshot())
+
+    async def profile(request):
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+            return web.json_response({"error": "Forbidden"}, status=403)
+        try:
+            # Stopping waits for the dump, so keep it off the event loop
+            reply = await asyncio.to_thread(handle_admin_request, request.match_info['action'], dict(request.query))
+        except ValueError as e:
+            return _error_response(e)
+        return web.json_response(reply)
+
+    app.add_routes([
+        web.post('/login', handler("login", body_args=("username", "password"))),
+        web.post('/sessions', handler("start_session", body_args=("username",))),
+        web.post('/sessions/{session_id}/spin', handler("spin", "session_id", body_args=("bet_amount",))),
+        web.post('/sessions/{session_id}/end', handler("end_session", "session_id")),
+        web.get('/players/{player_id}/balance', handler("balance", "player_id")),
+        web.post('/players/{player_id}/deposit', handler("deposit", "player_id", body_args=("amount",))),
+        web.post('/players/{player_id}/withdraw', handler("withdraw", "player_id", body_args=("amount",))),
+        web.get('/ws', websocket),
+        web.get('/metrics', metrics),
+        web.get('/metrics.json', metrics_json),
+    ])
+    if admin_token:
+        app.add_routes([web.post('/profile/{action}', profile)])
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the async slot machine game server.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=None, help="Spin evaluation processes (default: CPU count)")
+    parser.add_argument("--no-auth", action="store_true",
+                        help="Serve without login tokens, letting anyone act for any player (local testing only)")
+    parser.add_argument("--admin-token", default=os.getenv("ADMIN_TOKEN"),
+                        help="Enables the /profile admin endpoints for requests sending it (default: ADMIN_TOKEN)")
+    args = parser.parse_args()
+
+    server = GameServer(spin_workers=args.workers, require_auth=not args.no_auth)
+    web.run_app(create_app(server, args.admin_token), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -1,12 +1,16 @@
+import threading
+import time
+from sqlalchemy import update, select, func
 from sqlalchemy.orm import Session
 from db_models import Jackpot
+from outcome import SpinOutcome
+from combination_list import JACKPOT_SYMBOL, JACKPOT_REQUIRED_COUNT, JACKPOT_CONTRIBUTION, JACKPOT_RESET_VALUE
 from database import SessionLocal
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def initialize_jackpot(initial_value=1000.0):
+def initialize_jackpot(initial_value=JACKPOT_RESET_VALUE):
     db = SessionLocal()
     try:
         jackpot = db.query(Jackpot).first()
@@ -59,20 +63,58 @@ def save_jackpot(value):
     finally:
         db.close()
 
+def get_jackpot_value(db: Session):
+    """:return: The current pool value, or None if no jackpot row exists"""
+    return db.query(Jackpot.value).order_by(Jackpot.id).limit(1).scalar()
+
+def add_to_jackpot(db: Session, amount):
+    """
+    Atomically add `amount` to the jackpot pool with a single
+    UPDATE ... RETURNING, so concurrent contributors never lose updates.
+    Does not commit.
+
+    :return: The new pool value, or None if no jackpot row exists
+    """
+    first_id = select(func.min(Jackpot.id)).scalar_subquery()
+    stmt = (
+        update(Jackpot)
+        .where(Jackpot.id == first_id)
+        .values(value=Jackpot.value + amount)
+        .returning(Jackpot.value)
+    )
+    return db.execute(stmt).scalar_one_or_none()
+
+def claim_jackpot(db: Session, reset_value=JACKPOT_RESET_VALUE, extra=0.0):
+    """
+    Claim the whole pool for a winner and reset it, holding the row lock so
+    no contribution can land between the read and the reset. Does not commit.
+
+    :param extra: Contributions not yet written to the row (e.g. drained from
+                  a JackpotContributionBuffer) that belong to this winner
+    :return: The amount won
+    """
+    jackpot = db.query(Jackpot).order_by(Jackpot.id).with_for_update().first()
+    if jackpot is None:
+        jackpot = Jackpot(value=reset_value)
+        db.add(jackpot)
+    won = jackpot.value + extra
+    jackpot.value = reset_value
+    db.flush()
+    return won
+
 def increment_jackpot(bet_amount):
-    logger.debug(f"Attempting to increment jackpot by {bet_amount * 0.01}")
+    logger.debug("Attempting to increment jackpot by %s", bet_amount * JACKPOT_CONTRIBUTION)
     db = SessionLocal()
     try:
-        jackpot = db.query(Jackpot).first()
-        if jackpot:
-            jackpot.value += bet_amount * 0.01  # Increment by 1% of bet
-            db.commit()
-            logger.debug(f"Jackpot incremented to: {jackpot.value}")
-            return jackpot.value
-        else:
+        value = add_to_jackpot(db, bet_amount * JACKPOT_CONTRIBUTION)  # Increment by 1% of bet
+        if value is None:
+            db.rollback()
             logger.warning("No jackpot found, initializing...")
             initialize_jackpot()
             return increment_jackpot(bet_amount)
+        db.commit()
+        logger.debug("Jackpot incremented to: %s", value)
+        return value
     except Exception as e:
         logger.error(f"Error incrementing jackpot: {e}")
         db.rollback()
@@ -80,21 +122,145 @@ def increment_jackpot(bet_amount):
     finally:
         db.close()
 
+class JackpotContributionBuffer:
+    """
+    Accumulates jackpot contributions in process and writes them to the
+    jackpot row in one atomic increment every `flush_bets` bets or
+    `flush_interval_ms` milliseconds, whichever comes first.
+
+    Contributions still pending when the process dies are lost from the
+    pool (never from player balances), so keep the thresholds small.
+
+    With auto_flush=False, add() never touches the database and the owner
+    calls flush(db) itself, e.g. the game server on its async sessions.
+    """
+
+    def __init__(self, flush_bets=100, flush_interval_ms=250, session_factory=SessionLocal, auto_flush=True):
+        self.flush_bets = flush_bets
+        self.auto_flush = auto_flush
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._pending = 0.0
+        self._pending_bets = 0
+        self._last_flush = time.monotonic()
+        self._last_value = None
+        self._timer = None
+        self._stopped = threading.Event()
+
+    def add(self, amount):
+        """
+        Queue a contribution, flushing if a threshold has been reached.
+
+        Called after a spin has settled, so a failed flush is logged and the
+        amount kept for the next one rather than raised.
+
+        :return: Best estimate of the current pool value
+        """
+        with self._lock:
+            self._pending += amount
+            self._pending_bets += 1
+            due = self.auto_flush and (self._pending_bets >= self.flush_bets or
+                                       time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            try:
+                self.flush()
+            except Exception:
+                pass  # Already logged; pending amount was restored
+        return self.current_value()
+
+    def drain(self):
+        """Take all pending contributions, e.g. to pay them out with a jackpot claim."""
+        with self._lock:
+            pending, self._pending, self._pending_bets = self._pending, 0.0, 0
+            return pending
+
+    def restore(self, amount):
+        """Put back contributions taken by drain() when the claim was rolled back."""
+        with self._lock:
+            self._pending += amount
+
+    def flush(self, db: Session = None):
+        """
+        Write pending contributions with one atomic increment and commit.
+
+        :param db: Session to write with; a new one from session_factory by default
+        :raises: The database error, after putting the contributions back
+        """
+        pending = self.drain()
+        with self._lock:
+            self._last_flush = time.monotonic()
+        if not pending:
+            return self._last_value
+        own_session = db is None
+        try:
+            if own_session:
+                db = self.session_factory()
+            value = add_to_jackpot(db, pending)
+            if value is None:
+                db.add(Jackpot(value=JACKPOT_RESET_VALUE + pending))
+                value = JACKPOT_RESET_VALUE + pending
+            db.commit()
+            self._last_value = value
+            return value
+        except Exception as e:
+            logger.error(f"Error flushing jackpot contributions: {e}")
+            if db is not None:
+                db.rollback()
+            self.restore(pending)
+            raise
+        finally:
+            if own_session and db is not None:
+                db.close()
+
+    def reset_value(self, value):
+        """Record the pool value after a claim so estimates stay accurate."""
+        self._last_value = value
+
+    def current_value(self):
+        """Last value read from the database plus contributions not yet written."""
+        if self._last_value is None:
+            self._last_value = load_jackpot()
+        with self._lock:
+            return self._last_value + self._pending
+
+    def start(self):
+        """Flush on a background timer so quiet periods still reach the database."""
+        def run():
+            while not self._stopped.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception:
+                    pass  # Already logged; pending amount was restored
+        self._stopped.clear()
+        self._timer = threading.Thread(target=run, name="jackpot-flush", daemon=True)
+        self._timer.start()
+
+    def stop(self):
+        """Stop the timer and write whatever is still pending."""
+        self._stopped.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        self.flush()
+
 def reset_jackpot():
     logger.debug("Attempting to reset jackpot")
-    save_jackpot(1000)  # Reset to initial amount
-    return 1000
+    save_jackpot(JACKPOT_RESET_VALUE)  # Reset to initial amount
+    return JACKPOT_RESET_VALUE
 
-def check_jackpot_win(outcome, jackpot_symbol='JACKP', required_count=3):
-    logger.debug(f"Checking for jackpot win with outcome: {outcome}")
-    
-    # Flatten the outcome list if it's nested
-    flat_outcome = [symbol for reel in outcome for symbol in reel] if isinstance(outcome[0], list) else outcome
+def check_jackpot_win(outcome, jackpot_symbol=JACKPOT_SYMBOL, required_count=JACKPOT_REQUIRED_COUNT):
+    logger.debug("Checking for jackpot win with outcome: %s", outcome)
     
-    # Count the number of jackpot symbols
-    jackpot_count = flat_outcome.count(jackpot_symbol)
+    if isinstance(outcome, SpinOutcome):
+        # Symbol counts are computed once per spin
+        jackpot_count = outcome.count(jackpot_symbol)
+    else:
+        # Flatten the outcome list if it's nested
+        flat_outcome = [symbol for reel in outcome for symbol in reel] if isinstance(outcome[0], list) else outcome
+        jackpot_count = flat_outcome.count(jackpot_symbol)
     
     is_jackpot_win = jackpot_count >= required_count
-    logger.debug(f"Jackpot win: {is_jackpot_win}")
+    logger.debug("Jackpot win: %s", is_jackpot_win)
     
     return is_jackpot_win
\ No newline at end of file
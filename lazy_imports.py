@@ -0,0 +1,22 @@
+import importlib.util
+import sys
+
+def lazy_import(name):
+    """
+    Return module `name`, deferring its execution until an attribute is first used.
+
+    Use `module.attribute` at call sites: `from module import attribute`
+    would load it straight away. If the module is already loaded it is
+    returned as is.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,269 @@
+import bisect
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency buckets: 50 us up to 10 s
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Stages of one spin, in pipeline order
+# 'wallet' is the locked balance read and check; the debit and credit are
+# written with the result row, so they are part of 'persistence'
+SPIN_STAGES = ('rng', 'evaluation', 'bonus', 'wallet', 'jackpot', 'persistence', 'total')
+
+DEFAULT_METRICS_PORT = 9100
+
+class Histogram:
+    """
+    Fixed-bucket histogram, optionally split by one label.
+
+    Observing is a bisect and two additions under a lock; quantiles are
+    interpolated within buckets when a snapshot is taken, as Prometheus'
+    histogram_quantile does.
+    """
+
+    def __init__(self, name, help, label=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # Per-bucket counts (last one is +Inf), count and sum
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def time(self, label_value=None):
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self, label_value)
+
+    def _copy(self):
+        with self._lock:
+            return {label: (list(counts), count, total) for label, (counts, count, total) in self._series.items()}
+
+    def _quantile(self, counts, count, q):
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return 0.0
+
+    def snapshot(self):
+        """:return: {label value: {"count", "sum", "p50", "p95", "p99"}}"""
+        result = {}
+        for label, (counts, count, total) in self._copy().items():
+            entry = {"count": count, "sum": total}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}"] = self._quantile(counts, count, q) if count else 0.0
+            result[label] = entry
+        return result
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label, (counts, count, total) in sorted(self._copy().items(), key=lambda item: str(item[0])):
+            prefix = f'{self.label}="{label}",' if self.label and label is not None else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            labels = f'{{{prefix[:-1]}}}' if prefix else ''
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class _Timer:
+    __slots__ = ('histogram', 'label_value', 'start')
+
+    def __init__(self, histogram, label_value):
+        self.histogram = histogram
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, self.label_value)
+
+class Counter:
+    """Monotonic counter, optionally split by one label."""
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, label_value=None):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label, value in sorted(self.snapshot().items(), key=lambda item: str(item[0])):
+            labels = f'{{{self.label}="{label}"}}' if self.label and label is not None else ''
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name, help, label=None, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, label, buckets))
+
+    def counter(self, name, help, label=None):
+        return self._register(Counter(name, help, label))
+
+    def snapshot(self):
+        """
+        All metrics as plain data, for the diagnostics tool or JSON.
+
+        :return: {"histograms": {...}, "counters": {...}, "db_pool": {...}}; label
+                 values are the keys below each metric ("" when unlabelled)
+        """
+        histograms, counters = {}, {}
+        for metric in list(self._metrics.values()):
+            values = {("" if label is None else label): value for label, value in metric.snapshot().items()}
+            (histograms if isinstance(metric, Histogram) else counters)[metric.name] = values
+        return {"timestamp": time.time(), "histograms": histograms, "counters": counters, "db_pool": _pool_stats()}
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for key, value in _pool_stats().items():
+            lines.append(f"# TYPE db_pool_{key} gauge")
+            lines.append(f"db_pool_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+def _pool_stats():
+    # Only report on engines something else created; never connect just for metrics
+    database = sys.modules.get('database')
+    if database is None or (database._engine is None and not database._instrumented_engines):
+        return {}
+    return database.get_pool_stats()
+
+REGISTRY = MetricsRegistry()
+
+spin_stage_seconds = REGISTRY.histogram(
+    "spin_stage_seconds", "Time spent in each stage of a spin", label="stage")
+spins_total = REGISTRY.counter("spins_total", "Spins settled")
+spin_errors_total = REGISTRY.counter("spin_errors_total", "Spins that failed, by exception type", label="error")
+bonus_games_total = REGISTRY.counter("bonus_games_total", "Bonus games played")
+jackpot_hits_total = REGISTRY.counter("jackpot_hits_total", "Jackpots won")
+wallet_conflicts_total = REGISTRY.counter("wallet_conflicts_total", "Wallet compare-and-swap conflicts")
+result_rows_dead_lettered_total = REGISTRY.counter(
+    "result_rows_dead_lettered_total", "Game result rows the result writer could not insert")
+
+def stage_timer(stage):
+    """`with stage_timer('rng'): ...` records the block under spin_stage_seconds{stage="rng"}."""
+    return spin_stage_seconds.time(stage)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+    admin_token = None
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = self.registry.render_prometheus(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(self.registry.snapshot()), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        # Admin endpoints: POST /profile/start?seconds=30&every=100, /profile/stop, /profile/status
+        path, _, query = self.path.partition('?')
+        if not path.startswith('/profile/') or not self.admin_token:
+            self.send_error(404)
+            return
+        if not hmac.compare_digest(self.headers.get('X-Admin-Token', ''), self.admin_token):
+            self.send_error(403)
+            return
+        from profiler import handle_admin_request
+        try:
+            reply = handle_admin_request(path[len('/profile/'):], dict(urllib.parse.parse_qsl(query)))
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        data = json.dumps(reply).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+def start_metrics_server(port=None, host='127.0.0.1', registry=REGISTRY, admin_token=None):
+    """
+    Serve /metrics (Prometheus text) and /metrics.json (snapshot) on a daemon
+    thread, plus the POST /profile/* profiler controls (see profiler.py).
+
+    :param port: Defaults to METRICS_PORT or 9100
+    :param admin_token: Enables the /profile endpoints for requests sending it as
+                        "X-Admin-Token"; defaults to ADMIN_TOKEN, without one they are off
+    :return: The ThreadingHTTPServer; call shutdown() to stop it
+    """
+    port = int(port if port is not None else os.getenv("METRICS_PORT", DEFAULT_METRICS_PORT))
+    admin_token = admin_token or os.getenv("ADMIN_TOKEN") or None
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry, 'admin_token': admin_token})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Metrics available on http://%s:%d/metrics", host, server.server_port)
+    return server
+
+def fetch_snapshot(url, timeout=1.0):
+    """Read a /metrics.json snapshot from another process; None if it cannot be reached."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return json.load(response)
+    except (OSError, ValueError):
+        return None
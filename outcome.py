@@ -0,0 +1,110 @@
+import ast
+import numpy as np
+from combination_list import SYMBOLS
+
+# Bits per cell in the packed form; 4 bits hold up to 16 symbols
+PACK_BITS = 4
+PACK_MASK = (1 << PACK_BITS) - 1
+# A signed 64-bit column holds at most 15 cells: exactly the 5 x 3 grid
+MAX_PACKED_CELLS = 63 // PACK_BITS
+REELS = 5
+ROWS = 3
+
+SYMBOL_CODES = {symbol: code for code, symbol in enumerate(SYMBOLS)}
+
+class SpinOutcome:
+    """
+    A spin result as a uint8 grid of symbol codes, indexed [reel][row].
+
+    The grid packs losslessly into one integer (4 bits per cell, reel-major)
+    for the indexed `GameResult.outcome_code` column. Symbol counts are
+    computed once and shared by the scatter, bonus and jackpot checks.
+    str() gives the legacy nested-list form, e.g. for display.
+    """
+
+    __slots__ = ('codes', '_counts', '_packed')
+
+    def __init__(self, codes):
+        """
+        :param codes: An array of shape (reels, rows) of symbol codes
+        """
+        self.codes = np.asarray(codes, dtype=np.uint8)
+        if self.codes.size > MAX_PACKED_CELLS:
+            raise ValueError(f"An outcome can hold at most {MAX_PACKED_CELLS} cells")
+        self._counts = None
+        self._packed = None
+
+    @classmethod
+    def from_symbols(cls, symbols):
+        """Build an outcome from nested lists of symbol names."""
+        return cls([[SYMBOL_CODES[symbol] for symbol in reel] for reel in symbols])
+
+    @classmethod
+    def from_packed(cls, value, reels=REELS, rows=ROWS):
+        """Unpack an integer produced by `packed`."""
+        cells = [(value >> (PACK_BITS * i)) & PACK_MASK for i in range(reels * rows)]
+        return cls(np.array(cells, dtype=np.uint8).reshape(reels, rows))
+
+    @classmethod
+    def from_string(cls, text):
+        """Parse the legacy str(outcome) form stored in `GameResult.outcome`."""
+        return cls.from_symbols(ast.literal_eval(text))
+
+    @property
+    def packed(self):
+        """The grid as one integer, cell i = reel * rows + row in bits 4i..4i+3."""
+        if self._packed is None:
+            value = 0
+            for i, code in enumerate(self.codes.ravel().tolist()):
+                value |= code << (PACK_BITS * i)
+            self._packed = value
+        return self._packed
+
+    @property
+    def counts(self):
+        """Occurrences of each symbol code in the grid."""
+        if self._counts is None:
+            self._counts = np.bincount(self.codes.ravel(), minlength=len(SYMBOLS))
+        return self._counts
+
+    def count(self, symbol):
+        """Occurrences of one symbol name in the grid."""
+        return int(self.counts[SYMBOL_CODES[symbol]])
+
+    def to_symbols(self):
+        """The nested lists of symbol names returned by SlotMachineRNG.generate_spin."""
+        return [[SYMBOLS[code] for code in reel] for reel in self.codes.tolist()]
+
+    def __iter__(self):
+        return iter(self.to_symbols())
+
+    def __eq__(self, other):
+        if not isinstance(other, SpinOutcome):
+            return NotImplemented
+        return self.codes.shape == other.codes.shape and self.packed == other.packed
+
+    def __hash__(self):
+        return hash((self.codes.shape, self.packed))
+
+    def __str__(self):
+        return str(self.to_symbols())
+
+    def __repr__(self):
+        return f"SpinOutcome({self.to_symbols()!r})"
+
+def pack_outcomes(codes):
+    """
+    Pack a batch of grids at once.
+
+    :param codes: A uint8 array of shape (n, reels, rows)
+    :return: An int64 array of n packed outcomes
+    """
+    flat = np.asarray(codes, dtype=np.int64).reshape(len(codes), -1)
+    shifts = PACK_BITS * np.arange(flat.shape[1], dtype=np.int64)
+    return (flat << shifts).sum(axis=1)
+
+def unpack_outcomes(values, reels=REELS, rows=ROWS):
+    """Inverse of pack_outcomes: int64 array -> uint8 array of shape (n, reels, rows)."""
+    values = np.asarray(values, dtype=np.int64)
+    shifts = PACK_BITS * np.arange(reels * rows, dtype=np.int64)
+    return ((values[:, None] >> shifts) & PACK_MASK).astype(np.uint8).reshape(len(values), reels, rows)
@@ -0,0 +1,159 @@
+import numpy as np
+from collections import namedtuple
+from combination_list import SYMBOLS
+
+# Paylines as (reel, row) positions, in the order check_win reports them
+PAYLINES = [
+    [(0,0), (1,0), (2,0), (3,0), (4,0)],  # Horizontal top
+    [(0,1), (1,1), (2,1), (3,1), (4,1)],  # Horizontal middle
+    [(0,2), (1,2), (2,2), (3,2), (4,2)],  # Horizontal bottom
+    [(0,0), (1,1), (2,2), (3,1), (4,0)],  # V-shape
+    [(0,2), (1,1), (2,0), (3,1), (4,2)],  # Inverted V-shape
+    [(0,0), (1,2), (2,1), (3,2), (4,0)],  # W-shape
+    [(0,2), (1,0), (2,1), (3,0), (4,2)]   # M-shape
+]
+
+PAYLINE_NAMES = [
+    "Horizontal top", "Horizontal middle", "Horizontal bottom",
+    "V-shape", "Inverted V-shape", "W-shape", "M-shape"
+]
+
+ROWS = 3
+LINE_LENGTH = 5
+NUM_LINE_OUTCOMES = len(SYMBOLS) ** LINE_LENGTH  # 9^5 = 59,049
+
+# Offsets of each payline cell in a flattened (reel, row) grid
+LINE_CELLS = np.array([[reel * ROWS + row for reel, row in line] for line in PAYLINES], dtype=np.intp)
+LINE_CELL_LISTS = LINE_CELLS.tolist()
+# Place values turning a line of symbol codes into its base-9 table index
+LINE_POWERS = len(SYMBOLS) ** np.arange(LINE_LENGTH - 1, -1, -1, dtype=np.int64)
+
+PaylineTable = namedtuple('PaylineTable', [
+    'combo_index',    # int16[59049]: first matching combination per line outcome, -1 for none
+    'points',         # int64[59049]: points awarded per line outcome
+    'payout',         # float64[59049]: symbol payout used for max_payout per line outcome
+    'trigger',        # int8[59049]: index into `triggers`, -1 for none
+    'triggers',       # list of trigger names
+    'combo_points',   # per-combination points as Python numbers
+    'combo_payouts',  # per-combination symbol payouts as Python numbers
+    'combo_triggers', # per-combination trigger name or None
+    'combo_list',     # combo_index as a Python list for scalar lookups
+])
+
+def line_outcome_digits():
+    """
+    Enumerate every possible payline outcome.
+
+    :return: An int array of shape (59049, 5) whose row i holds the symbol codes of outcome i
+    """
+    index = np.arange(NUM_LINE_OUTCOMES, dtype=np.int64)
+    return (index[:, None] // LINE_POWERS) % len(SYMBOLS)
+
+def compile_combinations(combinations, symbol_payouts):
+    """
+    Compile the winning combinations into dense lookup tables indexed by the
+    integer-encoded symbol line.
+
+    Wildcards ('*') match any symbol, and the first combination in list order
+    wins, exactly as in the original per-spin scan.
+
+    :param combinations: List of combination dictionaries from combination_list
+    :param symbol_payouts: Dictionary mapping a symbol to its payout
+    :return: A PaylineTable
+    """
+    digits = line_outcome_digits()
+    combo_index = np.full(NUM_LINE_OUTCOMES, -1, dtype=np.int16)
+    unmatched = np.ones(NUM_LINE_OUTCOMES, dtype=bool)
+
+    for c, combo in enumerate(combinations):
+        matches = unmatched.copy()
+        for position, symbol in enumerate(combo['symbols']):
+            if symbol == '*':
+                continue
+            if symbol not in SYMBOLS:
+                # A symbol that never appears on the reels can never match
+                matches[:] = False
+                break
+            matches &= digits[:, position] == SYMBOLS.index(symbol)
+        combo_index[matches] = c
+        unmatched &= ~matches
+
+    combo_points = [combo['points'] for combo in combinations]
+    combo_payouts = [symbol_payouts.get(combo['symbols'][0], 0) for combo in combinations]
+    combo_triggers = [combo.get('trigger') for combo in combinations]
+    triggers = sorted({trigger for trigger in combo_triggers if trigger is not None})
+
+    # Append a zero entry so that combo_index == -1 looks up "no win"
+    points = np.append(np.array(combo_points, dtype=np.int64), 0)[combo_index]
+    payout = np.append(np.array(combo_payouts, dtype=np.float64), 0.0)[combo_index]
+    trigger_codes = [triggers.index(trigger) if trigger is not None else -1 for trigger in combo_triggers]
+    trigger = np.append(np.array(trigger_codes, dtype=np.int8), -1)[combo_index]
+
+    return PaylineTable(combo_index, points, payout, trigger, triggers,
+                        combo_points, combo_payouts, combo_triggers, combo_index.tolist())
+
+def trigger_code(table, event):
+    """
+    Index of `event` in table.triggers, the value line_triggers holds for it.
+
+    :raises ValueError: If no combination raises the event
+    """
+    if event not in table.triggers:
+        raise ValueError(f"No combination triggers event '{event}' (known: {', '.join(table.triggers)})")
+    return table.triggers.index(event)
+
+def encode_lines(spins):
+    """
+    Compute the table index of every payline.
+
+    :param spins: Symbol codes of shape (..., 5, 3)
+    :return: An int32 array of shape (..., 7)
+    """
+    spins = np.asarray(spins)
+    grid = spins.reshape(spins.shape[:-2] + (-1,))
+    lines = np.zeros(grid.shape[:-1] + (len(PAYLINES),), dtype=np.int32)
+    # Horner's rule over the line positions avoids a wide int64 matmul
+    for position in range(LINE_LENGTH):
+        lines *= len(SYMBOLS)
+        lines += grid[..., LINE_CELLS[:, position]]
+    return lines
+
+def evaluate_spin(table, codes):
+    """
+    Evaluate a single integer-coded spin.
+
+    :param table: A PaylineTable from compile_combinations
+    :param codes: Symbol codes of shape (5, 3)
+    :return: (total_points, max_payout, triggered_events, winning_paylines), as check_win
+    """
+    total_points = 0
+    max_payout = 0
+    triggered_events = []
+    winning_paylines = []
+    grid = np.asarray(codes).ravel().tolist()
+    for i, cells in enumerate(LINE_CELL_LISTS):
+        line = 0
+        for cell in cells:
+            line = line * len(SYMBOLS) + grid[cell]
+        c = table.combo_list[line]
+        if c < 0:
+            continue
+        total_points += table.combo_points[c]
+        max_payout = max(max_payout, table.combo_payouts[c])
+        winning_paylines.append(PAYLINE_NAMES[i])
+        if table.combo_triggers[c] is not None:
+            triggered_events.append(table.combo_triggers[c])
+    return total_points, max_payout, triggered_events, winning_paylines
+
+def evaluate_spins(table, spins):
+    """
+    Evaluate a batch of integer-coded spins with one fancy-indexing call per table.
+
+    :param table: A PaylineTable from compile_combinations
+    :param spins: Symbol codes of shape (n, 5, 3)
+    :return: (total_points[n], max_payout[n], line_combos[n, 7], line_triggers[n, 7])
+    """
+    lines = encode_lines(spins)
+    total_points = table.points[lines].sum(axis=-1)
+    max_payout = np.maximum(table.payout[lines].max(axis=-1), 0)
+    return total_points, max_payout, table.combo_index[lines], table.trigger[lines]
@@ -0,0 +1,296 @@
+import json
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Seconds between stack samples, and the range admin requests are clamped to
+DEFAULT_INTERVAL = 0.005
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+
+# A finished profile; `stacks` maps root-to-leaf tuples of frame names to sample counts
+ProfileResult = namedtuple('ProfileResult', [
+    'stacks', 'samples', 'interval', 'started_at', 'duration', 'mode', 'spins_seen', 'spins_profiled', 'tags'
+])
+
+class _NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SCOPE = _NullScope()
+
+class _SpinScope:
+    __slots__ = ('profiler', 'thread_id')
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.thread_id = threading.get_ident()
+
+    def __enter__(self):
+        self.profiler._active_threads.add(self.thread_id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._active_threads.discard(self.thread_id)
+        return False
+
+class SamplingProfiler:
+    """
+    Statistical profiler for a live process.
+
+    A background thread reads every thread's current frame with
+    sys._current_frames() each `interval` seconds, so the profiled code runs
+    unmodified: the cost is one stack walk per sample, paid by the sampler
+    thread. Two modes:
+
+    - window: sample all threads for `duration` seconds (or until stop())
+    - every_n: sample only threads inside the spin_scope() of every Nth spin
+
+    Stopping writes the profile to `output_dir` as collapsed stacks (for
+    flamegraph.pl / inferno), a speedscope file and a JSON sidecar with the
+    config version, checksum and spin counts, so runs can be diffed across
+    paytable or RNG changes.
+    """
+
+    def __init__(self, output_dir=PROFILE_DIR):
+        self.output_dir = output_dir
+        # Recorded with every profile; overrides the cached config_manager snapshot's version
+        self.tags = {}
+        self.last_files = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._active_threads = set()
+        self._every_n = 0
+        self._spins_seen = 0
+        self._spins_profiled = 0
+        self._names = {}
+
+    @property
+    def active(self):
+        return self._thread is not None
+
+    def start(self, duration=None, every_n=None, interval=DEFAULT_INTERVAL):
+        """
+        Start sampling; a no-op if already running.
+
+        :param duration: Stop and dump after this many seconds
+        :param every_n: Only profile every Nth spin (see spin_scope); all threads if omitted
+        :param interval: Seconds between samples
+        :return: True if sampling started
+        """
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._stop.clear()
+            self._active_threads.clear()
+            self._every_n = every_n or 0
+            self._spins_seen = 0
+            self._spins_profiled = 0
+            self._thread = threading.Thread(target=self._run, args=(duration, interval), name="sampling-profiler",
+                                            daemon=True)
+            self._thread.start()
+        logger.info("Profiling started (%s)", f"every {every_n} spins" if every_n else "all threads")
+        return True
+
+    def stop(self):
+        """
+        Stop sampling and wait for the dump.
+
+        :return: Paths of the files written, or None if the profiler was not running
+        """
+        thread = self._thread
+        if thread is None:
+            return None
+        self._stop.set()
+        thread.join()
+        return self.last_files
+
+    def toggle(self, duration=None, every_n=None, interval=DEFAULT_INTERVAL):
+        if self.active:
+            return self.stop()
+        self.start(duration, every_n, interval)
+        return None
+
+    def spin_scope(self):
+        """
+        Wrap one spin: `with PROFILER.spin_scope(): ...`. Costs one attribute
+        check while the profiler is off.
+        """
+        if self._thread is None:
+            return _NULL_SCOPE
+        self._spins_seen += 1
+        if self._every_n and self._spins_seen % self._every_n:
+            return _NULL_SCOPE
+        self._spins_profiled += 1
+        return _SpinScope(self)
+
+    def _frame_name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            qualname = getattr(code, 'co_qualname', code.co_name)
+            name = self._names[code] = f"{qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return name
+
+    def _run(self, duration, interval):
+        own_id = threading.get_ident()
+        started_at = datetime.now()
+        start = time.perf_counter()
+        deadline = start + duration if duration else None
+        stacks = Counter()
+        samples = 0
+        while not self._stop.wait(interval):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            frames = sys._current_frames()
+            thread_ids = list(self._active_threads) if self._every_n else list(frames)
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if thread_id == own_id or frame is None:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                stacks[(names.get(thread_id, str(thread_id)),) + tuple(reversed(codes))] += 1
+                samples += 1
+            del frames
+
+        result = ProfileResult(
+            stacks=Counter({
+                (f"thread:{key[0]}",) + tuple(self._frame_name(code) for code in key[1:]): count
+                for key, count in stacks.items()
+            }),
+            samples=samples,
+            interval=interval,
+            started_at=started_at.isoformat(),
+            duration=time.perf_counter() - start,
+            mode=f"every_n:{self._every_n}" if self._every_n else "window",
+            spins_seen=self._spins_seen,
+            spins_profiled=self._spins_profiled if self._every_n else self._spins_seen,
+            tags=dict(_config_tags(), **self.tags),
+        )
+        try:
+            self.last_files = dump_profile(result, self.output_dir)
+            logger.info("Profile written to %s", self.last_files['collapsed'])
+        except OSError as e:
+            logger.error("Could not write profile: %s", e)
+            self.last_files = None
+        finally:
+            self._active_threads.clear()
+            self._thread = None
+
+def _config_tags():
+    # Only describe a configuration that is already loaded; never query for it
+    config_manager = sys.modules.get('config_manager')
+    snapshot = getattr(config_manager, '_config_snapshot', None)
+    if snapshot is None:
+        return {}
+    return {"config_version": snapshot.version, "config_checksum": snapshot.checksum}
+
+def dump_profile(result, output_dir=PROFILE_DIR):
+    """
+    Write a ProfileResult as <name>.collapsed, <name>.speedscope.json and <name>.json.
+
+    :return: Dictionary of the three paths
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.fromisoformat(result.started_at).strftime('%Y%m%dT%H%M%S%f')[:-3]
+    checksum = result.tags.get("config_checksum")
+    name = f"spins-{stamp}" + (f"-cfg{result.tags.get('config_version')}-{checksum[:8]}" if checksum else "")
+    base = os.path.join(output_dir, name)
+    paths = {"collapsed": base + ".collapsed", "speedscope": base + ".speedscope.json", "metadata": base + ".json"}
+
+    with open(paths["collapsed"], 'w') as f:
+        for stack, count in result.stacks.most_common():
+            f.write(f"{';'.join(frame.replace(';', ':') for frame in stack)} {count}\n")
+
+    frames, frame_index, samples, weights = [], {}, [], []
+    for stack, count in result.stacks.items():
+        indices = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frames.append({"name": frame})
+            indices.append(frame_index[frame])
+        samples.append(indices)
+        weights.append(count * result.interval)
+    with open(paths["speedscope"], 'w') as f:
+        json.dump({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "seconds",
+                "startValue": 0, "endValue": sum(weights), "samples": samples, "weights": weights,
+            }],
+            "name": name,
+            "exporter": "profiler.py",
+        }, f)
+
+    metadata = result._asdict()
+    del metadata["stacks"]
+    metadata["distinct_stacks"] = len(result.stacks)
+    with open(paths["metadata"], 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return paths
+
+PROFILER = SamplingProfiler()
+
+def install_signal_handler(signum=getattr(signal, 'SIGUSR2', None), profiler=PROFILER):
+    """
+    Toggle the profiler with a signal (`kill -USR2 <pid>`), using PROFILE_SECONDS
+    and PROFILE_EVERY_N from the environment for each run. Main thread only.
+    """
+    if signum is None:
+        raise RuntimeError("Signal-based profiling is not available on this platform")
+
+    def handler(signo, frame):
+        duration = float(os.getenv("PROFILE_SECONDS", "0")) or None
+        every_n = int(os.getenv("PROFILE_EVERY_N", "0")) or None
+        # Stopping joins the sampler thread; do it off the signal handler
+        threading.Thread(target=profiler.toggle, args=(duration, every_n), daemon=True).start()
+
+    signal.signal(signum, handler)
+
+def handle_admin_request(action, params, profiler=PROFILER):
+    """
+    Shared handler of the /profile admin endpoints.
+
+    :param action: 'start', 'stop' or 'status'
+    :param params: Query parameters: seconds, every, interval (clamped to
+                   MIN_INTERVAL..MAX_INTERVAL so a request cannot busy-loop the sampler)
+    :raises ValueError: On an unknown action or bad parameter
+    :return: JSON-serializable reply
+    """
+    if action == "start":
+        duration = float(params["seconds"]) if params.get("seconds") else None
+        every_n = int(params["every"]) if params.get("every") else None
+        if (duration is not None and duration <= 0) or (every_n is not None and every_n < 1):
+            raise ValueError("seconds and every must be positive")
+        interval = float(params.get("interval") or DEFAULT_INTERVAL)
+        if math.isnan(interval):
+            raise ValueError("interval must be a number")
+        interval = min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
+        started = profiler.start(duration=duration, every_n=every_n, interval=interval)
+        return {"started": started, "active": profiler.active}
+    if action == "stop":
+        return {"active": False, "files": profiler.stop()}
+    if action == "status":
+        return {"active": profiler.active, "last_files": profiler.last_files}
+    raise ValueError(f"Unknown profiler action: {action}")
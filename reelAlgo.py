@@ -1,26 +1,30 @@
 import numpy as np
-import json
 from datetime import datetime
 from functools import lru_cache
-import random  # Add this import statement
-from combination_list import combinations
-from wallet_manager import place_bet, add_winnings, get_player_balance, deposit_to_player, withdraw_to_bank
-from jackpot_manager import increment_jackpot, check_jackpot_win, load_jackpot, reset_jackpot
-from config_manager import get_reel_probabilities, get_symbol_payouts
-from advanced_rng import SlotMachineRNG
-from data_access import (
-    create_player, get_player, update_player_balance,
-    create_game_session, end_game_session, record_game_result,
-    record_transaction, authenticate_player, get_token_conversion_rate, update_token_conversion_rate
-)
-from database import SessionLocal
+from combination_list import SYMBOLS, BONUS_PRIZES, BONUS_GAME_EVENT
+from spin_log import SpinLog
+from advanced_rng import SlotMachineRNG, WeightedSampler, encode_spin
+from outcome import SpinOutcome
+from payline_evaluator import evaluate_spin
+from lazy_imports import lazy_import
+from profiler import PROFILER
+
+# Database-backed modules load on first use, so importing reelAlgo just for
+# selected_model (simulations, spin workers) never pulls in SQLAlchemy
+database = lazy_import('database')
+data_access = lazy_import('data_access')
+wallet_manager = lazy_import('wallet_manager')
+spin_service = lazy_import('spin_service')
+config_manager = lazy_import('config_manager')
 import os
+import signal
 from dotenv import load_dotenv
+import logging
 
-# SYMBOLS LIST
-sym = ['CHER', 'ONIO', 'CLOC', 'STAR', 'DIAMN', 'WILD', 'BONUS', 'SCAT', 'JACKP']
+logger = logging.getLogger(__name__)
 
-HOUSE_EDGE = 0.05  # 5% house edge
+# SYMBOLS LIST
+sym = SYMBOLS
 
 # Load environment variables
 load_dotenv()
@@ -29,79 +33,57 @@ load_dotenv()
 DB_USERNAME = os.getenv("DB_USERNAME", "marcoojeda")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")  # Empty string if no password is set
 
-print("Script started")  # Debug print
-
 def create_user_if_not_exists(username):
-    db = SessionLocal()
+    db = database.SessionLocal()
     try:
-        player = get_player(db, username)
+        player = data_access.get_player(db, username)
         if not player:
             print(f"Creating new user: {username}")
-            player = create_player(db, username, f"{username}@example.com", "", initial_balance=1000)
+            player = data_access.create_player(db, username, f"{username}@example.com", "", initial_balance=1000)
             print(f"User {username} created successfully")
         return player
     finally:
         db.close()
 
-def selected_model():
-    # Load reel configuration and symbol payouts from config_manager
-    reels = get_reel_probabilities()
-    symbol_payouts = get_symbol_payouts()
+def selected_model(snapshot=None, rng=None):
+    """
+    :param snapshot: ConfigSnapshot to play; the cached config_manager snapshot by default
+    :param rng: SlotMachineRNG every draw comes from, e.g. a session's replayable
+                SlotMachineRNG.from_seed stream; a freshly seeded one by default
+    """
+    # Load the cached, precompiled reel configuration and symbol payouts from config_manager
+    snapshot = snapshot or config_manager.get_config_snapshot()
+    reels = snapshot.reels
+    symbol_payouts = snapshot.symbol_payouts
     
     # Define special symbols and trigger conditions
     BONUS_SYMBOL = "BONUS"
     BONUS_TRIGGER = 3  # Number of bonus symbols needed to trigger the bonus game
 
     # Create an instance of SlotMachineRNG
-    rng = SlotMachineRNG()
+    rng = rng if rng is not None else SlotMachineRNG()
+
+    # Prize table of the pick-a-box bonus game, built once per model
+    bonus_sampler = WeightedSampler.from_pairs(BONUS_PRIZES)
 
     def spin_reels():
         """
-        Generate a spin result using the advanced RNG.
+        Generate an integer-coded spin result (a SpinOutcome) using the advanced RNG.
         """
-        return rng.generate_spin(reels)
+        return rng.generate_outcome(reels, snapshot.reel_tables)
 
-    def check_bonus_trigger(symbols):
+    def check_bonus_trigger(outcome):
         """Check if the bonus round is triggered based on the number of BONUS symbols."""
-        bonus_count = sum(symbol == BONUS_SYMBOL for reel in symbols for symbol in reel)
-        print(f"Debug: BONUS symbols count: {bonus_count}")
+        bonus_count = outcome.count(BONUS_SYMBOL)
+        logger.debug(f"BONUS symbols count: {bonus_count}")
         return bonus_count >= BONUS_TRIGGER
 
     def play_bonus_game():
         """Simulates a more balanced pick-a-box bonus game."""
-        print("Bonus Round Triggered!")
-        
-        # Define prizes with their probabilities
-        prizes = [
-            (0, 30),     # 30% chance of winning nothing
-            (10, 25),    # 25% chance of winning 10
-            (20, 20),    # 20% chance of winning 20
-            (50, 15),    # 15% chance of winning 50
-            (100, 7),    # 7% chance of winning 100
-            (200, 2),    # 2% chance of winning 200
-            (500, 1)     # 1% chance of winning 500
-        ]
-        
-        # Calculate the total weight
-        total_weight = sum(weight for _, weight in prizes)
-        
-        # Generate a random number
-        r = random.randint(1, total_weight)
-        
-        # Select the prize based on the random number
-        current_weight = 0
-        for prize, weight in prizes:
-            current_weight += weight
-            if r <= current_weight:
-                if prize == 0:
-                    print("Sorry, no bonus win this time!")
-                else:
-                    print(f"Congratulations! You won a bonus of ${prize}!")
-                return prize
-
-        # This should never happen, but just in case
-        print("An error occurred in the bonus game.")
-        return 0
+        # Draw a prize from the prebuilt alias table
+        prize = bonus_sampler.sample(rng)
+        logger.debug(f"Bonus round prize: {prize}")
+        return prize
 
     @lru_cache(maxsize=None)
     def calculate_symbol_probability(symbol, reel_index):
@@ -114,75 +96,45 @@ def selected_model():
                          for i, symbol in enumerate(symbols)]
         return np.prod(probabilities)
 
+    # Winning combinations compiled into a lookup table once per config version
+    payline_table = snapshot.payline_table
+
     def check_win(result):
-        total_points = 0
-        max_payout = 0
-        triggered_events = []
-        winning_paylines = []
-        
-        # Define paylines (indices of symbols to check)
-        paylines = [
-            [(0,0), (1,0), (2,0), (3,0), (4,0)],  # Horizontal top
-            [(0,1), (1,1), (2,1), (3,1), (4,1)],  # Horizontal middle
-            [(0,2), (1,2), (2,2), (3,2), (4,2)],  # Horizontal bottom
-            [(0,0), (1,1), (2,2), (3,1), (4,0)],  # V-shape
-            [(0,2), (1,1), (2,0), (3,1), (4,2)],  # Inverted V-shape
-            [(0,0), (1,2), (2,1), (3,2), (4,0)],  # W-shape
-            [(0,2), (1,0), (2,1), (3,0), (4,2)]   # M-shape
-        ]
-
-        payline_names = [
-            "Horizontal top", "Horizontal middle", "Horizontal bottom",
-            "V-shape", "Inverted V-shape", "W-shape", "M-shape"
-        ]
-
-        # Iterate through each payline
-        for i, payline in enumerate(paylines):
-            # Extract the symbols for the current payline
-            line_result = [result[x][y] for x, y in payline]
-            
-            # Check each winning combination against the current payline
-            for combo in combinations:
-                matches = all(symbol == combo['symbols'][i] or combo['symbols'][i] == '*'
-                              for i, symbol in enumerate(line_result))
-                if matches:
-                    total_points += combo['points']
-                    max_payout = max(max_payout, symbol_payouts.get(combo['symbols'][0], 0))
-                    winning_paylines.append(payline_names[i])
-                    if 'trigger' in combo:
-                        triggered_events.append(combo['trigger'])
-                    break  # Stop checking after first match on this payline
+        """
+        Evaluate all paylines of a spin with one table lookup per payline.
 
+        Accepts a SpinOutcome from spin_reels, an integer-coded array from
+        SlotMachineRNG.generate_spins or nested lists of symbol names.
+        """
+        if isinstance(result, SpinOutcome):
+            codes = result.codes
+        else:
+            codes = result if isinstance(result, np.ndarray) else encode_spin(result)
         # Return the total points won, max payout, any triggered events, and the winning paylines
-        return total_points, max_payout, triggered_events, winning_paylines
-
-    def log_result(result, bet_amount, points, winnings, balance, jackpot_win=0, bonus_win=0, current_jackpot=0):
-        """Log the game result to a JSON file, including jackpot and bonus information."""
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "result": result,
-            "bet_amount": bet_amount,
-            "points_won": points,
-            "regular_winnings": winnings - jackpot_win - bonus_win - (bet_amount if winnings > 0 else 0),
-            "jackpot_win": jackpot_win,
-            "bonus_win": bonus_win,
-            "total_winnings": winnings,
-            "balance_after": balance,
-            "current_jackpot": current_jackpot
-        }
-
-        try:
-            with open('logs.json', 'r+') as f:
-                data = json.load(f)
-                data.append(log_entry)
-                f.seek(0)
-                json.dump(data, f, indent=4)
-        except FileNotFoundError:
-            with open('logs.json', 'w') as f:
-                json.dump([log_entry], f, indent=4)
+        return evaluate_spin(payline_table, codes)
 
     return spin_reels, check_win, play_bonus_game  # Return any functions needed for the main game loop
 
+# Append-only, rotating spin log of the game loop (see spin_log.iter_spin_log to read it back)
+spin_log = SpinLog()
+
+def log_result(result, bet_amount, session_id, spin_number):
+    """Append a settled spin (a SpinResult) to the spin log, including jackpot and bonus information."""
+    spin_log.write({
+        "timestamp": datetime.now().isoformat(),
+        "session_id": session_id,
+        "spin_number": spin_number,
+        "result": result.outcome.to_symbols(),
+        "bet_amount": bet_amount,
+        "points_won": result.points,
+        "regular_winnings": result.regular_winnings,
+        "jackpot_win": result.jackpot_win,
+        "bonus_win": result.bonus_win,
+        "total_winnings": result.winnings,
+        "balance_after": result.balance,
+        "current_jackpot": result.current_jackpot,
+    })
+
 # Database-related functions
 def start_game():
     print(f"Attempting to start game for user: {DB_USERNAME}")  # Debug print
@@ -191,34 +143,35 @@ def start_game():
         print(f"Failed to create or retrieve user {DB_USERNAME}")
         return None, None
     
-    db = SessionLocal()
+    db = database.SessionLocal()
     try:
-        session = create_game_session(db, player.id, player.balance)
+        session = data_access.create_game_session(db, player.id, player.balance)
         print(f"Game session created for {player.username}")  # Debug print
+        print(f"Seed commitment: {session.seed_commitment}")
         return player, session
     finally:
         db.close()
 
 def update_balance(player_id, amount):
-    db = SessionLocal()
+    db = database.SessionLocal()
     try:
-        updated_player = update_player_balance(db, player_id, amount)
+        updated_player = data_access.update_player_balance(db, player_id, amount)
         return updated_player
     finally:
         db.close()
 
 def end_game(session_id, final_balance):
-    db = SessionLocal()
+    db = database.SessionLocal()
     try:
-        ended_session = end_game_session(db, session_id, final_balance)
+        ended_session = data_access.end_game_session(db, session_id, final_balance)
         return ended_session
     finally:
         db.close()
 
 def record_spin(session_id, spin_number, bet_amount, outcome, winnings):
-    db = SessionLocal()
+    db = database.SessionLocal()
     try:
-        result = record_game_result(db, session_id, spin_number, bet_amount, outcome, winnings)
+        result = data_access.record_game_result(db, session_id, spin_number, bet_amount, outcome, winnings)
         return result
     finally:
         db.close()
@@ -230,8 +183,8 @@ def display_wallet(player):
 def exchange_menu(player):
     virtual_wallet = 10000  # Start with a large amount in the virtual wallet
     while True:
-        player.balance = get_player_balance(player)  # Update player balance from database
-        conversion_rate = get_token_conversion_rate(SessionLocal(), player.id)
+        player.balance = wallet_manager.get_player_balance(player)  # Cached; written through on every change
+        conversion_rate = data_access.get_token_conversion_rate(database.SessionLocal(), player.id)
         print(f"\nCurrent game balance: ${player.balance:.2f}")
         print(f"Virtual wallet balance: ${virtual_wallet:.2f}")
         print(f"Current token conversion rate: {conversion_rate}")
@@ -249,18 +202,14 @@ def exchange_menu(player):
                 print("Insufficient funds in virtual wallet.")
             else:
                 virtual_wallet -= amount
-                # Ensure we have the latest player object with ID
-                db = SessionLocal()
-                player = get_player(db, player.username)
-                db.close()
-                player = deposit_to_player(player, amount)
+                player = wallet_manager.deposit_to_player(player, amount)
                 print(f"Deposited ${amount:.2f} to game balance.")
         elif choice == '2':
             amount = float(input("Enter amount to withdraw to virtual wallet: $"))
             if amount > player.balance:
                 print("Insufficient funds in game balance.")
             else:
-                player = withdraw_to_bank(player, amount)
+                player = wallet_manager.withdraw_to_bank(player, amount)
                 virtual_wallet += amount
                 print(f"Withdrawn ${amount:.2f} to virtual wallet.")
         elif choice == '3':
@@ -269,7 +218,7 @@ def exchange_menu(player):
             print(f"Added ${amount:.2f} to virtual wallet.")
         elif choice == '4':
             rate = float(input("Enter new token conversion rate: "))
-            update_token_conversion_rate(SessionLocal(), player.id, rate)
+            data_access.update_token_conversion_rate(database.SessionLocal(), player.id, rate)
             print(f"Token conversion rate updated to {rate}")
         elif choice == '5':
             break
@@ -278,12 +227,39 @@ def exchange_menu(player):
 
     return player  # Return the updated player object
 
+# Replayable RNG stream of each game session, continued across visits to the slot machine
+_session_streams = {}
+
+def session_stream(session):
+    stream = _session_streams.get(session.id)
+    if stream is None:
+        stream = _session_streams[session.id] = SlotMachineRNG.from_seed(bytes.fromhex(session.rng_seed))
+    return stream
+
+def session_service(snapshot, stream):
+    """A SpinService playing `snapshot` on a session's stream."""
+    spin_reels, check_win, play_bonus_game = selected_model(snapshot, rng=stream)
+    db = database.SessionLocal()
+    try:
+        config_id = data_access.get_or_create_config_snapshot(db, snapshot)
+    finally:
+        db.close()
+    return spin_service.SpinService(spin_reels, check_win, play_bonus_game,
+                                    wallet_cache=wallet_manager.wallet_cache, rng=stream, config_id=config_id)
+
 def play_slot_machine(player, session):
-    spin_reels, check_win, play_bonus_game = selected_model()
+    stream = session_stream(session)
+    snapshot = service = None
     spin_number = 0
     while True:
+        # Cheap while cached; picks up configuration edits made by other processes
+        current = config_manager.get_config_snapshot()
+        if current is not snapshot:
+            snapshot, service = current, session_service(current, stream)
+            # Profiles taken while this model plays are tagged with its configuration
+            PROFILER.tags.update(config_version=snapshot.version, config_checksum=snapshot.checksum)
         spin_number += 1
-        player.balance = get_player_balance(player)  # Update player balance from database
+        player.balance = wallet_manager.get_player_balance(player)  # Cached; written through on every change
         print(f"\nCurrent balance: ${player.balance:.2f}")
         bet_amount = float(input("Enter your bet amount (or 0 to quit): $"))
         if bet_amount == 0:
@@ -293,32 +269,26 @@ def play_slot_machine(player, session):
             print("Insufficient funds. Please enter a lower bet amount.")
             continue
 
-        player = place_bet(player, bet_amount)
-
-        outcome = spin_reels()
-        points, max_payout, triggered_events, winning_paylines = check_win(outcome)
-        winnings = points * bet_amount
-
-        # Apply house edge
-        winnings *= (1 - HOUSE_EDGE)
-
-        if "BONUS" in triggered_events:
-            bonus_win = play_bonus_game()
-            winnings += bonus_win
+        try:
+            # Debit, jackpot, credit and result insert commit together
+            result = service.spin(player.id, session.id, spin_number, bet_amount)
+        except ValueError as e:
+            print(e)
+            continue
 
-        # Check for jackpot
-        jackpot_win = check_jackpot_win(outcome)
-        if jackpot_win:
-            jackpot_amount = load_jackpot()
-            winnings += jackpot_amount
-            reset_jackpot()
-            print(f"Congratulations! You won the jackpot of ${jackpot_amount:.2f}!")
+        outcome, winnings, winning_paylines = result.outcome, result.winnings, result.winning_paylines
+        player.balance = result.balance
+        log_result(result, bet_amount, session.id, spin_number)
+        if result.jackpot_win:
+            print(f"Congratulations! You won the jackpot of ${result.jackpot_win:.2f}!")
         else:
-            new_jackpot = increment_jackpot(bet_amount)
-            print(f"Jackpot increased to ${new_jackpot:.2f}")
-
-        player = add_winnings(player, winnings)
-        record_spin(session.id, spin_number, bet_amount, str(outcome), winnings)
+            print(f"Jackpot increased to ${result.current_jackpot:.2f}")
+        if BONUS_GAME_EVENT in result.triggered_events:
+            print("Bonus Round Triggered!")
+            if result.bonus_win:
+                print(f"Congratulations! You won a bonus of ${result.bonus_win}!")
+            else:
+                print("Sorry, no bonus win this time!")
 
         print(f"Spin {spin_number}:")
         print(f"Bet: ${bet_amount:.2f}")
@@ -338,7 +308,7 @@ def main_menu():
         return
 
     while True:
-        player.balance = get_player_balance(player)  # Update player balance from database
+        player.balance = wallet_manager.get_player_balance(player)  # Cached; written through on every change
         print(f"\nCurrent balance: ${player.balance:.2f}")
         print("\nMain Menu:")
         print("1. Play Slot Machine")
@@ -356,9 +326,20 @@ def main_menu():
             print("Invalid choice. Please try again.")
 
     end_game(session.id, player.balance)
+    _session_streams.pop(session.id, None)
     print(f"Thanks for playing! Your final balance is ${player.balance:.2f}")
+    print(f"Session seed: {session.rng_seed} (verify your spins with `python replay.py verify --session {session.id}`)")
 
 if __name__ == "__main__":
-    print("Starting main menu")  # Debug print
+    logging.basicConfig(level=logging.INFO)
+    if os.getenv("METRICS_PORT"):
+        # Per-stage spin latency for Prometheus or the diagnostics tool
+        from metrics import start_metrics_server
+        start_metrics_server()
+    if hasattr(signal, 'SIGUSR2'):
+        # `kill -USR2 <pid>` starts or stops a sampling profile (see profiler.py)
+        from profiler import install_signal_handler
+        install_signal_handler()
+    logger.debug("Starting main menu")
     main_menu()
-    print("Script ended")  # Debug print
+    logger.debug("Script ended")
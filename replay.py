@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import Session
+from advanced_rng import SlotMachineRNG
+from config_manager import build_config_snapshot
+from db_models import GameSession, GameResult
+from data_access import get_stored_config
+from spin_service import SpinService
+from reelAlgo import selected_model
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sessions handed to a verification worker at a time
+SESSIONS_PER_TASK = 50
+
+# Stored result columns a replay must reproduce
+REPLAY_COLUMNS = (
+    GameResult.id, GameResult.session_id, GameResult.spin_number, GameResult.bet_amount, GameResult.outcome_code,
+    GameResult.points_won, GameResult.regular_winnings, GameResult.bonus_win, GameResult.jackpot_win,
+    GameResult.rng_offset, GameResult.config_id,
+)
+
+# One stored value that the replay did not reproduce
+Mismatch = namedtuple('Mismatch', ['result_id', 'session_id', 'spin_number', 'field', 'stored', 'replayed'])
+
+VerifyReport = namedtuple('VerifyReport', ['sessions', 'checked', 'skipped', 'mismatches'])
+
+def seed_commitment(seed):
+    """SHA-256 (hex) of a session seed, given as bytes or hex."""
+    return hashlib.sha256(_seed_bytes(seed)).hexdigest()
+
+def _seed_bytes(seed):
+    return bytes.fromhex(seed) if isinstance(seed, str) else seed
+
+class Replayer:
+    """
+    Regenerates spins played under one configuration.
+
+    The model is built once and its stream re-pointed for every spin, so a
+    replay costs the same as the original draw and evaluation.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.rng = SlotMachineRNG(reseed_interval=None)
+        self.service = SpinService(*selected_model(snapshot, rng=self.rng), rng=self.rng)
+
+    def replay(self, seed, rng_offset, bet_amount):
+        """
+        :param seed: The session's rng_seed, as bytes or hex
+        :param rng_offset: Stream position recorded with the spin
+        :return: (SpinEvaluation, stream position the session's next spin starts at)
+        """
+        evaluation = self.service.evaluate_at(bet_amount, _seed_bytes(seed), rng_offset)
+        return evaluation, self.rng.position
+
+class ReplayerCache:
+    """Replayer per config_snapshots id, loaded from the database on first use."""
+
+    def __init__(self):
+        self._replayers = {}
+
+    def get(self, db: Session, config_id):
+        replayer = self._replayers.get(config_id)
+        if replayer is None:
+            stored = get_stored_config(db, config_id)
+            if stored is None:
+                raise LookupError(f"Configuration {config_id} not found")
+            snapshot = build_config_snapshot(json.loads(stored.reels), json.loads(stored.symbol_payouts))
+            if snapshot.checksum != stored.checksum:
+                raise ValueError(f"Configuration {config_id} does not match its checksum")
+            replayer = self._replayers[config_id] = Replayer(snapshot)
+        return replayer
+
+def compare_spin(row, evaluation):
+    """
+    Compare a stored result row with its replay.
+
+    :return: List of (field, stored, replayed) that differ
+    """
+    differences = []
+    if row.outcome_code != evaluation.outcome.packed:
+        differences.append(('outcome_code', row.outcome_code, evaluation.outcome.packed))
+    if (row.points_won or 0) != evaluation.points:
+        differences.append(('points_won', row.points_won, evaluation.points))
+    if not math.isclose(row.regular_winnings or 0.0, evaluation.regular_winnings, abs_tol=1e-9):
+        differences.append(('regular_winnings', row.regular_winnings, evaluation.regular_winnings))
+    if not math.isclose(row.bonus_win or 0.0, evaluation.bonus_win, abs_tol=1e-9):
+        differences.append(('bonus_win', row.bonus_win, evaluation.bonus_win))
+    if bool(row.jackpot_win) != evaluation.jackpot_hit:
+        differences.append(('jackpot_hit', bool(row.jackpot_win), evaluation.jackpot_hit))
+    return differences
+
+def _result_rows(db: Session, session_id):
+    return (db.query(*REPLAY_COLUMNS)
+            .filter(GameResult.session_id == session_id)
+            .order_by(GameResult.spin_number, GameResult.id)
+            .yield_per(2000))
+
+def verify_session(db: Session, session_id, replayers=None):
+    """
+    Replay every spin of a session and compare it with game_results.
+
+    Besides the spin values, consecutive spins must continue the stream
+    where the previous one stopped, so removed or inserted rows are caught
+    too. Rows without an rng_offset (played before replay existed) are skipped.
+
+    :return: (checked, skipped, list of Mismatch)
+    """
+    replayers = replayers or ReplayerCache()
+    seed = db.query(GameSession.rng_seed).filter(GameSession.id == session_id).scalar()
+    checked = skipped = 0
+    mismatches = []
+    expected_offset = None
+    for row in _result_rows(db, session_id):
+        if seed is None or row.rng_offset is None or row.config_id is None:
+            skipped += 1
+            continue
+        if expected_offset is not None and row.rng_offset != expected_offset:
+            mismatches.append(Mismatch(row.id, session_id, row.spin_number, 'rng_offset',
+                                       row.rng_offset, expected_offset))
+        evaluation, expected_offset = replayers.get(db, row.config_id).replay(seed, row.rng_offset, row.bet_amount)
+        mismatches.extend(Mismatch(row.id, session_id, row.spin_number, field, stored, replayed)
+                          for field, stored, replayed in compare_spin(row, evaluation))
+        checked += 1
+    return checked, skipped, mismatches
+
+def next_rng_offset(db: Session, session_id):
+    """Stream position of a session's next spin: where its last replayable spin stopped."""
+    row = (db.query(GameResult.rng_offset, GameResult.bet_amount, GameResult.config_id, GameSession.rng_seed)
+           .join(GameSession, GameSession.id == GameResult.session_id)
+           .filter(GameResult.session_id == session_id, GameResult.rng_offset.isnot(None))
+           .order_by(GameResult.spin_number.desc(), GameResult.id.desc())
+           .first())
+    if row is None:
+        return 0
+    return ReplayerCache().get(db, row.config_id).replay(row.rng_seed, row.rng_offset, row.bet_amount)[1]
+
+def _init_verify_worker():
+    # Connections inherited from the parent process must not be shared
+    import database
+    if database._engine is not None:
+        database._engine.dispose(close=False)
+
+def _verify_sessions(session_ids):
+    from database import SessionLocal
+    replayers = ReplayerCache()
+    checked = skipped = 0
+    mismatches = []
+    db = SessionLocal()
+    try:
+        for session_id in session_ids:
+            session_checked, session_skipped, session_mismatches = verify_session(db, session_id, replayers)
+            checked += session_checked
+            skipped += session_skipped
+            mismatches.extend(session_mismatches)
+    finally:
+        db.close()
+    return checked, skipped, mismatches
+
+def verify_results(session_ids=None, workers=None, sessions_per_task=SESSIONS_PER_TASK):
+    """
+    Replay stored spins across a process pool and flag mismatches.
+
+    :param session_ids: Sessions to verify; every seeded session by default
+    :param workers: Worker processes (default: CPU count); 0 verifies in this process
+    :return: A VerifyReport
+    """
+    from database import SessionLocal
+    if session_ids is None:
+        db = SessionLocal()
+        try:
+            session_ids = [row.id for row in db.query(GameSession.id).filter(GameSession.rng_seed.isnot(None))
+                           .order_by(GameSession.id)]
+        finally:
+            db.close()
+    session_ids = list(session_ids)
+    tasks = [session_ids[i:i + sessions_per_task] for i in range(0, len(session_ids), sessions_per_task)]
+
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    if workers == 0 or len(tasks) <= 1:
+        results = [_verify_sessions(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_verify_worker) as executor:
+            results = list(executor.map(_verify_sessions, tasks))
+
+    checked = skipped = 0
+    mismatches = []
+    for task_checked, task_skipped, task_mismatches in results:
+        checked += task_checked
+        skipped += task_skipped
+        mismatches.extend(task_mismatches)
+    return VerifyReport(len(session_ids), checked, skipped, mismatches)
+
+def replay_result(db: Session, result_id):
+    """
+    Regenerate one stored spin.
+
+    :return: (stored row, SpinEvaluation)
+    """
+    row = db.query(*REPLAY_COLUMNS).filter(GameResult.id == result_id).first()
+    if row is None:
+        raise LookupError(f"Game result {result_id} not found")
+    if row.rng_offset is None or row.config_id is None:
+        raise ValueError(f"Game result {result_id} was recorded without replay data")
+    seed = db.query(GameSession.rng_seed).filter(GameSession.id == row.session_id).scalar()
+    return row, ReplayerCache().get(db, row.config_id).replay(seed, row.rng_offset, row.bet_amount)[0]
+
+def main():
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Regenerate stored spins from their session seed and verify them.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    verify = subparsers.add_parser("verify", help="Replay stored spins and report mismatches")
+    verify.add_argument("--session", type=int, nargs="+", help="Only verify these game sessions")
+    verify.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    spin = subparsers.add_parser("spin", help="Replay one stored spin")
+    spin.add_argument("result_id", type=int, help="game_results id")
+    args = parser.parse_args()
+
+    if args.command == "spin":
+        db = SessionLocal()
+        try:
+            row, evaluation = replay_result(db, args.result_id)
+        finally:
+            db.close()
+        print(f"Session {row.session_id}, spin {row.spin_number}, stream offset {row.rng_offset}")
+        print(f"Outcome: {evaluation.outcome}")
+        print(f"Points: {evaluation.points}, line win: ${evaluation.regular_winnings:.2f}, "
+              f"bonus: ${evaluation.bonus_win:.2f}, jackpot hit: {evaluation.jackpot_hit}")
+        differences = compare_spin(row, evaluation)
+        for field, stored, replayed in differences:
+            print(f"MISMATCH {field}: stored {stored}, replayed {replayed}")
+        print("Stored result matches the replay" if not differences else "Stored result does NOT match the replay")
+        sys.exit(1 if differences else 0)
+
+    report = verify_results(args.session, args.workers)
+    for mismatch in report.mismatches:
+        print(f"MISMATCH result {mismatch.result_id} (session {mismatch.session_id}, spin {mismatch.spin_number}) "
+              f"{mismatch.field}: stored {mismatch.stored}, replayed {mismatch.replayed}")
+    print(f"Sessions: {report.sessions:,}, spins verified: {report.checked:,}, "
+          f"skipped (no replay data): {report.skipped:,}, mismatches: {len(report.mismatches):,}")
+    sys.exit(1 if report.mismatches else 0)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,145 @@
+import numpy as np
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+from db_models import GameResult
+
+def count_results(db: Session, after_id=0):
+    """Number of GameResult rows and the highest id after `after_id`."""
+    count, max_id = db.execute(
+        select(func.count(GameResult.id), func.max(GameResult.id)).where(GameResult.id > after_id)
+    ).one()
+    return count, max_id or after_id
+
+def fetch_bucketed_series(db: Session, bucket_size, max_id=None):
+    """
+    Compute the dashboard series in SQL, one point per `bucket_size` spins.
+
+    Spins are numbered with a window function and grouped into fixed-size
+    buckets; cumulative winnings and bets are running sums over the buckets,
+    so only one row per bucket leaves the database. Peaks survive the
+    aggregation: points, jackpot wins and the jackpot pool use the bucket
+    maximum, flags use the bucket hit rate and amounts the bucket mean.
+
+    :param bucket_size: Spins per bucket
+    :param max_id: Only include rows with id <= max_id
+    :return: A dictionary of NumPy arrays keyed like StatsEngine series, plus totals
+    """
+    def value(column):
+        return func.coalesce(column, 0)
+
+    numbered = select(
+        GameResult.id,
+        func.row_number().over(order_by=GameResult.id).label('spin'),
+        value(GameResult.bet_amount).label('bet_amount'),
+        value(GameResult.winnings).label('winnings'),
+        value(GameResult.balance_after).label('balance_after'),
+        value(GameResult.points_won).label('points_won'),
+        value(GameResult.regular_winnings).label('regular_winnings'),
+        value(GameResult.jackpot_win).label('jackpot_win'),
+        value(GameResult.bonus_win).label('bonus_win'),
+        value(GameResult.current_jackpot).label('current_jackpot'),
+    )
+    if max_id is not None:
+        numbered = numbered.where(GameResult.id <= max_id)
+    numbered = numbered.subquery()
+
+    bucket = ((numbered.c.spin - 1) // bucket_size).label('bucket')
+    buckets = select(
+        bucket,
+        func.max(numbered.c.spin).label('spins'),
+        func.max(numbered.c.id).label('last_id'),
+        func.count().label('rows'),
+        func.sum(numbered.c.bet_amount).label('bets'),
+        func.sum(numbered.c.winnings).label('wins'),
+        func.avg(numbered.c.balance_after).label('balance_after'),
+        func.max(numbered.c.points_won).label('points_won'),
+        func.avg(numbered.c.regular_winnings).label('regular_winnings'),
+        func.max(numbered.c.jackpot_win).label('jackpot_win'),
+        func.avg(numbered.c.bonus_win).label('bonus_win'),
+        func.max(numbered.c.current_jackpot).label('current_jackpot'),
+        func.sum(case((numbered.c.winnings > 0, 1), else_=0)).label('win_count'),
+        func.sum(case((numbered.c.bonus_win > 0, 1), else_=0)).label('bonus_count'),
+    ).group_by(bucket).subquery()
+
+    query = select(
+        buckets,
+        func.sum(buckets.c.wins).over(order_by=buckets.c.bucket).label('cumulative_winnings'),
+        func.sum(buckets.c.bets).over(order_by=buckets.c.bucket).label('cumulative_bets'),
+    ).order_by(buckets.c.bucket)
+    rows = db.execute(query).mappings().all()
+
+    def column(name):
+        return np.array([float(row[name] or 0) for row in rows], dtype=np.float64)
+
+    spins = column('spins')
+    rows_per_bucket = np.maximum(column('rows'), 1)
+    cumulative_winnings = column('cumulative_winnings')
+    cumulative_bets = column('cumulative_bets')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rtp_over_time = np.where(cumulative_bets > 0, cumulative_winnings / cumulative_bets * 100, 0)
+    return {
+        "spins": spins,
+        "bet_amount": column('bets') / rows_per_bucket,
+        "winnings": column('wins') / rows_per_bucket,
+        "balance_after": column('balance_after'),
+        "points_won": column('points_won'),
+        "regular_winnings": column('regular_winnings'),
+        "jackpot_win": column('jackpot_win'),
+        "bonus_win": column('bonus_win'),
+        "current_jackpot": column('current_jackpot'),
+        "cumulative_avg_wins": cumulative_winnings / np.maximum(spins, 1),
+        "rtp_over_time": rtp_over_time,
+        "win_flags": column('win_count') / rows_per_bucket,
+        "bonus_flags": column('bonus_count') / rows_per_bucket,
+        "total_spins": int(spins[-1]) if len(spins) else 0,
+        "total_winnings": float(cumulative_winnings[-1]) if len(spins) else 0.0,
+        "total_bets": float(cumulative_bets[-1]) if len(spins) else 0.0,
+        "last_id": int(rows[-1]['last_id']) if rows else 0,
+    }
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of `threshold - 2`
+    buckets, the point forming the largest triangle with the previously
+    kept point and the next bucket's average, which preserves visual peaks
+    such as jackpot hits.
+
+    :return: Sorted indices of the points to keep
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    indices = np.empty(threshold, dtype=np.intp)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+def downsample_series(stats, names, width):
+    """
+    Downsample series that share the `spins` x axis to about `width` points.
+
+    The points to keep are picked with LTTB on the sum of the named series,
+    so series drawn together (like the winnings breakdown) stay aligned.
+
+    :param stats: A StatsEngine snapshot
+    :param names: Series to downsample
+    :param width: Target number of points, e.g. the plot's pixel width
+    :return: [x, y1, y2, ...] as lists, ready for dpg.set_value
+    """
+    x = stats['spins']
+    guide = stats[names[0]] if len(names) == 1 else np.sum([stats[name] for name in names], axis=0)
+    keep = lttb_indices(x, guide, width)
+    return [x[keep].tolist()] + [stats[name][keep].tolist() for name in names]
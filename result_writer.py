@@ -0,0 +1,211 @@
+import atexit
+import csv
+import io
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from database import SessionLocal
+from data_access import record_game_results
+from metrics import result_rows_dead_lettered_total
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Columns written by COPY, in order
+COPY_COLUMNS = [
+    'session_id', 'spin_number', 'bet_amount', 'outcome', 'outcome_code', 'winnings', 'timestamp', 'points_won',
+    'regular_winnings', 'jackpot_win', 'bonus_win', 'balance_after', 'current_jackpot', 'rng_offset', 'config_id'
+]
+
+# Rows that could not be written, one JSON object per line, for re-inserting with record_game_results
+DEAD_LETTER_PATH = os.path.join('logs', 'game_results.dead.jsonl')
+
+class GameResultWriter:
+    """
+    Write-behind buffer for GameResult rows.
+
+    Rows queued with write() are inserted in bulk by a background thread
+    whenever `batch_size` rows are waiting or `flush_interval_ms` has passed,
+    using executemany or, on PostgreSQL, COPY. The queue is bounded: when it
+    is full, write() blocks for up to `put_timeout` seconds and then raises
+    queue.Full, which pushes back on producers instead of growing without limit.
+
+    Durability is chosen per writer and can be overridden per row: 'sync'
+    rows are inserted before write() returns, 'async' rows are durable only
+    after the next flush. Pending rows are flushed on close() and at exit.
+
+    The writer is opt-in (SpinService(result_writer=...)); neither the game
+    server nor the CLI uses one. Either way the row is written in its own
+    transaction after settle_spin has committed the money, so it is not
+    atomic with it: a crash in between loses the row, not the balance change.
+
+    A batch that keeps failing is retried `max_retries` times, then written
+    row by row; rows that still fail are appended to `dead_letter_path`
+    instead of blocking the rows queued behind them.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size=500, flush_interval_ms=1000,
+                 max_queue=10000, put_timeout=5.0, durability='async', use_copy=None, max_retries=3,
+                 dead_letter_path=DEAD_LETTER_PATH):
+        """
+        :param use_copy: Force COPY on or off; by default it is used on PostgreSQL
+        :param max_retries: Attempts at writing a batch before its rows are written one by one
+        :param dead_letter_path: JSON Lines file receiving rows that cannot be written
+        """
+        if max_retries < 1:
+            raise ValueError("max_retries must be at least 1")
+        if durability not in ('sync', 'async'):
+            raise ValueError(f"Unknown durability: {durability}")
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.put_timeout = put_timeout
+        self.durability = durability
+        self.use_copy = use_copy
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flush_now = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._closed = False
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_dead_lettered = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="game-result-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def write(self, row, durability=None):
+        """
+        Record one result.
+
+        :param row: Dictionary of GameResult column values
+        :param durability: Override the writer's durability for this row
+        :raises queue.Full: If the queue stays full for `put_timeout` seconds
+        """
+        if self._closed:
+            raise RuntimeError("GameResultWriter is closed")
+        row = dict(row)
+        row.setdefault('timestamp', datetime.utcnow())
+        if (durability or self.durability) == 'sync':
+            self._write_rows([row])
+            return
+        if self._thread is None:
+            self.start()
+        self._queue.put(row, timeout=self.put_timeout)
+        if self._queue.qsize() >= self.batch_size:
+            self._flush_now.set()
+
+    def flush(self):
+        """Block until every row queued so far has been written."""
+        self._flush_now.set()
+        self._queue.join()
+
+    def close(self):
+        """Stop the background thread after writing all pending rows."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._stopped.set()
+            self._flush_now.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        pending = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                pending.append(self._queue.get(timeout=min(timeout, 0.05)))
+                while len(pending) < self.batch_size:
+                    pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            stopping = self._stopped.is_set()
+            due = (len(pending) >= self.batch_size or time.monotonic() >= deadline or
+                   self._flush_now.is_set() or stopping)
+            if pending and due:
+                # No waiting between retries once shutting down
+                self._write_batch(pending, 1 if stopping else self.max_retries)
+                for _ in pending:
+                    self._queue.task_done()
+                pending = []
+            if due:
+                deadline = time.monotonic() + self.flush_interval
+                if self._queue.empty():
+                    self._flush_now.clear()
+            if stopping and not pending and self._queue.empty():
+                return
+
+    def _write_batch(self, rows, attempts):
+        for attempt in range(1, attempts + 1):
+            try:
+                self._write_rows(rows)
+                return
+            except Exception as e:
+                logger.error(f"Error writing {len(rows)} game results (attempt {attempt} of {attempts}): {e}")
+            if attempt < attempts:
+                time.sleep(self.flush_interval)
+        # Isolate the rows that cannot be written, so the rest of the batch still lands
+        for row in rows:
+            try:
+                self._write_rows([row])
+            except Exception as e:
+                self._dead_letter(row, e)
+
+    def _dead_letter(self, row, error):
+        self.rows_dead_lettered += 1
+        result_rows_dead_lettered_total.inc()
+        try:
+            directory = os.path.dirname(self.dead_letter_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'error': str(error), 'row': row}, default=str) + '\n')
+        except OSError as e:
+            logger.error(f"Could not dead-letter game result {row}: {e}")
+
+    def _write_rows(self, rows):
+        db = self.session_factory()
+        try:
+            use_copy = self.use_copy
+            if use_copy is None:
+                use_copy = db.get_bind().dialect.name == 'postgresql'
+            if use_copy:
+                self._copy_rows(db, rows)
+                db.commit()
+            else:
+                record_game_results(db, rows)
+            self.rows_written += len(rows)
+            self.batches_written += 1
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _copy_rows(self, db, rows):
+        """Stream rows through PostgreSQL COPY (psycopg2)."""
+        buffer = io.StringIO()
+        out = csv.writer(buffer)
+        for row in rows:
+            out.writerow(['' if row.get(column) is None else row.get(column) for column in COPY_COLUMNS])
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY game_results ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        finally:
+            cursor.close()
@@ -0,0 +1,207 @@
+import argparse
+import json
+import time
+import numpy as np
+from combination_list import (
+    combinations, SYMBOLS, HOUSE_EDGE, BONUS_GAME_EVENT, BONUS_PRIZES,
+    JACKPOT_SYMBOL, JACKPOT_REQUIRED_COUNT, JACKPOT_CONTRIBUTION, JACKPOT_RESET_VALUE
+)
+from payline_evaluator import (PAYLINES, PAYLINE_NAMES, compile_combinations, line_outcome_digits,
+                               trigger_code)
+
+def reel_probability_matrix(reels):
+    """
+    Normalize reel weights into per-reel symbol probabilities.
+
+    :param reels: A dictionary containing the configuration for each reel
+    :return: A float array of shape (reels, len(SYMBOLS))
+    """
+    matrix = np.zeros((len(reels), len(SYMBOLS)))
+    for r, reel in enumerate(reels.values()):
+        for symbol, weight in reel.items():
+            matrix[r, SYMBOLS.index(symbol)] = weight
+        total = matrix[r].sum()
+        if total <= 0:
+            raise ValueError(f"Reel {r + 1} has no positive weights")
+        matrix[r] /= total
+    return matrix
+
+def line_outcome_probabilities(matrix):
+    """
+    Probability of each of the 59,049 payline outcomes.
+
+    Every payline takes exactly one cell from each reel and the three visible
+    cells of a reel are drawn independently, so all paylines share this distribution.
+
+    :param matrix: Per-reel symbol probabilities from reel_probability_matrix
+    :return: A float array of length 59,049
+    """
+    digits = line_outcome_digits()
+    return np.prod(matrix[np.arange(matrix.shape[0]), digits], axis=1)
+
+def event_probability(table, matrix, event):
+    """
+    Exact probability that at least one payline of a spin triggers `event`.
+
+    Paylines share cells, so this cannot be read off the per-line distribution.
+    It is computed exactly when the event is raised by a single combination
+    whose fixed symbols fully decide the match (no earlier combination can
+    pre-empt it), by enumerating match/no-match over the cells that pattern reads.
+
+    :param table: A PaylineTable from compile_combinations
+    :param matrix: Per-reel symbol probabilities from reel_probability_matrix
+    :param event: Trigger name
+    :raises ValueError: If no combination, or more than one, raises the event
+    :return: Probability in [0, 1]
+    """
+    trigger_code(table, event)
+    sources = [c for c, trigger in enumerate(table.combo_triggers) if trigger == event]
+    if len(sources) > 1:
+        raise ValueError(f"Event '{event}' is raised by several combinations; no exact form available")
+
+    pattern = combinations[sources[0]]['symbols']
+    fixed = [(position, SYMBOLS.index(symbol)) for position, symbol in enumerate(pattern) if symbol != '*']
+    digits = line_outcome_digits()
+    pattern_mask = np.ones(len(digits), dtype=bool)
+    for position, code in fixed:
+        pattern_mask &= digits[:, position] == code
+    if not np.array_equal(pattern_mask, table.combo_index == sources[0]):
+        raise ValueError(f"Event '{event}' can be pre-empted by an earlier combination; no exact form available")
+
+    # Distinct grid cells read by the pattern across all paylines
+    cells = sorted({line[position] for line in PAYLINES for position, _ in fixed})
+    cell_probability = np.array([matrix[reel, dict(fixed)[reel]] for reel, _ in cells])
+    states = (np.arange(2 ** len(cells))[:, None] >> np.arange(len(cells))) & 1
+    weights = np.prod(np.where(states == 1, cell_probability, 1 - cell_probability), axis=1)
+
+    triggered = np.zeros(len(states), dtype=bool)
+    for line in PAYLINES:
+        columns = [cells.index(line[position]) for position, _ in fixed]
+        triggered |= states[:, columns].all(axis=1)
+    return float(weights[triggered].sum())
+
+def symbol_count_distribution(matrix, symbol):
+    """
+    Distribution of how many times `symbol` appears on the whole grid.
+
+    :param matrix: Per-reel symbol probabilities from reel_probability_matrix
+    :param symbol: Symbol name
+    :return: A float array where entry k is the probability of exactly k symbols
+    """
+    distribution = np.array([1.0])
+    p_cell = matrix[:, SYMBOLS.index(symbol)]
+    for p in p_cell:
+        for _ in range(3):  # 3 visible cells per reel
+            distribution = np.convolve(distribution, [1 - p, p])
+    return distribution
+
+def calculate_rtp(reels, symbol_payouts, bet_amount=1.0, jackpot_value=JACKPOT_RESET_VALUE,
+                  house_edge=HOUSE_EDGE):
+    """
+    Compute the exact expected return of a reel configuration.
+
+    Mirrors play_slot_machine: line points are paid at points * bet with the
+    house edge applied, the bonus game pays a fixed prize when BONUS_GAME_EVENT
+    is triggered, and the progressive jackpot pays when enough JACKPOT_SYMBOL
+    symbols land anywhere on the grid.
+
+    :param reels: A dictionary containing the configuration for each reel
+    :param symbol_payouts: Dictionary mapping a symbol to its payout
+    :param bet_amount: Bet per spin; bonus and jackpot prizes do not scale with it
+    :param jackpot_value: Jackpot pool assumed when a jackpot hits
+    :param house_edge: House edge applied to line wins
+    :return: A dictionary with the RTP breakdown
+    """
+    table = compile_combinations(combinations, symbol_payouts)
+    matrix = reel_probability_matrix(reels)
+    probabilities = line_outcome_probabilities(matrix)
+
+    won = table.combo_index >= 0
+    line_hit_frequency = float(probabilities[won].sum())
+    line_points = float(probabilities @ table.points)
+    line_return = line_points * (1 - house_edge)
+
+    combo_probability = np.bincount(table.combo_index[won], weights=probabilities[won],
+                                    minlength=len(combinations))
+    combination_stats = [
+        {
+            "symbols": combo['symbols'],
+            "probability": float(combo_probability[c]),
+            "points": combo['points'],
+            "rtp_contribution": float(combo_probability[c] * combo['points'] * (1 - house_edge) * len(PAYLINES)),
+        }
+        for c, combo in enumerate(combinations)
+    ]
+
+    trigger_probability = {
+        trigger: float(probabilities[table.trigger == t].sum())
+        for t, trigger in enumerate(table.triggers)
+    }
+
+    prize_total = sum(weight for _, weight in BONUS_PRIZES)
+    bonus_expected_prize = sum(prize * weight for prize, weight in BONUS_PRIZES) / prize_total
+    bonus_probability = event_probability(table, matrix, BONUS_GAME_EVENT)
+    bonus_return = bonus_probability * bonus_expected_prize / bet_amount
+
+    jackpot_counts = symbol_count_distribution(matrix, JACKPOT_SYMBOL)
+    jackpot_probability = float(jackpot_counts[JACKPOT_REQUIRED_COUNT:].sum())
+    jackpot_return = jackpot_probability * jackpot_value / bet_amount
+    jackpot_contribution = (1 - jackpot_probability) * JACKPOT_CONTRIBUTION
+
+    return {
+        "rtp": len(PAYLINES) * line_return + bonus_return + jackpot_return,
+        "line_rtp": len(PAYLINES) * line_return,
+        "bonus_rtp": bonus_return,
+        "jackpot_rtp": jackpot_return,
+        "jackpot_contribution": jackpot_contribution,
+        "expected_points_per_spin": len(PAYLINES) * line_points,
+        "expected_winning_lines": len(PAYLINES) * line_hit_frequency,
+        "paylines": [
+            {"name": name, "hit_frequency": line_hit_frequency, "rtp": line_return}
+            for name in PAYLINE_NAMES
+        ],
+        "combinations": combination_stats,
+        "line_trigger_probability": trigger_probability,
+        "bonus_probability": bonus_probability,
+        "jackpot_probability": jackpot_probability,
+    }
+
+def print_report(report):
+    print(f"RTP: {report['rtp'] * 100:.4f}%")
+    print(f"  Line wins: {report['line_rtp'] * 100:.4f}%")
+    print(f"  Bonus game: {report['bonus_rtp'] * 100:.4f}%")
+    print(f"  Jackpot: {report['jackpot_rtp'] * 100:.4f}%")
+    print(f"Jackpot pool contribution: {report['jackpot_contribution'] * 100:.4f}% of bets")
+    print(f"Expected points per spin: {report['expected_points_per_spin']:.4f}")
+    print(f"Expected winning lines per spin: {report['expected_winning_lines']:.4f}")
+    print(f"Bonus probability per spin: {report['bonus_probability']:.6g}")
+    print(f"Jackpot probability per spin: {report['jackpot_probability']:.6g}")
+    print("\nPaylines:")
+    for line in report['paylines']:
+        print(f"  {line['name']:<18} hit frequency {line['hit_frequency']:.6f}  RTP {line['rtp'] * 100:.4f}%")
+    print("\nCombinations (per payline):")
+    for combo in report['combinations']:
+        print(f"  {' '.join(combo['symbols']):<36} p={combo['probability']:.6g}  "
+              f"RTP {combo['rtp_contribution'] * 100:.4f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the exact RTP of a reel configuration.")
+    parser.add_argument("--config", help="Read reels and payouts from a JSON file such as slot_config.json "
+                                         "instead of the database")
+    parser.add_argument("--bet", type=float, default=1.0, help="Bet amount per spin")
+    parser.add_argument("--jackpot", type=float, default=JACKPOT_RESET_VALUE, help="Assumed jackpot pool")
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+        reels, symbol_payouts = config['reels'], config['symbol_payouts']
+    else:
+        from config_manager import get_reel_probabilities, get_symbol_payouts
+        reels, symbol_payouts = get_reel_probabilities(), get_symbol_payouts()
+
+    start = time.perf_counter()
+    report = calculate_rtp(reels, symbol_payouts, bet_amount=args.bet, jackpot_value=args.jackpot)
+    elapsed = time.perf_counter() - start
+    print_report(report)
+    print(f"\nComputed in {elapsed * 1000:.1f} ms")
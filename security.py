@@ -1,36 +1,77 @@
-import bcrypt
-from passlib.context import CryptContext
 import hashlib
+import hmac
 import os
 
-# Set up password context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Stored hashes look like pbkdf2_sha256$<iterations>$<salt hex>$<key hex>, so
+# the cost travels with each hash and can be raised without breaking old ones
+PBKDF2_ALGORITHM = "pbkdf2_sha256"
+# Every login pays this cost on the hashing pool; raising it upgrades hashes on their next login
+PBKDF2_ITERATIONS = int(os.getenv("PBKDF2_ITERATIONS", "100000"))
+SALT_BYTES = 32
 
-def hash_password(password: str) -> str:
+# Verified in place of an unknown player's hash, so a missing username costs as
+# much as a wrong password; the random key never matches
+DUMMY_PASSWORD_HASH = f"{PBKDF2_ALGORITHM}${PBKDF2_ITERATIONS}${os.urandom(SALT_BYTES).hex()}${os.urandom(32).hex()}"
+
+# Hashes from before the cost was stored: 64 hex salt + 64 hex key, 100k iterations
+LEGACY_PBKDF2_ITERATIONS = 100000
+
+def hash_password(password: str, iterations: int = PBKDF2_ITERATIONS) -> str:
     """
     Hash a password for storing.
     """
-    return pwd_context.hash(password)
+    salt = os.urandom(SALT_BYTES)
+    key = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f"{PBKDF2_ALGORITHM}${iterations}${salt.hex()}${key.hex()}"
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def get_password_hash(password: str) -> str:
     """
-    Verify a stored password against one provided by user
+    Generate a new hashed password
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return hash_password(password)
 
-def get_password_hash(password: str) -> str:
+def parse_password_hash(stored_password: str):
     """
-    Generate a new hashed password
+    Identify a stored hash.
+
+    :return: (scheme, iterations), scheme being 'pbkdf2_sha256', 'legacy_pbkdf2' or 'bcrypt'
+    :raises ValueError: If the format is not recognized
     """
-    salt = os.urandom(32)
-    key = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
-    return salt.hex() + key.hex()
+    if stored_password.startswith(PBKDF2_ALGORITHM + "$"):
+        return PBKDF2_ALGORITHM, int(stored_password.split("$")[1])
+    if stored_password.startswith(("$2a$", "$2b$", "$2y$")):
+        return "bcrypt", None
+    if len(stored_password) == 128:
+        return "legacy_pbkdf2", LEGACY_PBKDF2_ITERATIONS
+    raise ValueError("Unrecognized password hash format")
 
 def verify_password(plain_password: str, stored_password: str) -> bool:
     """
     Verify a stored password against one provided by user
     """
-    salt = bytes.fromhex(stored_password[:64])
-    stored_key = stored_password[64:]
-    new_key = hashlib.pbkdf2_hmac('sha256', plain_password.encode('utf-8'), salt, 100000).hex()
-    return new_key == stored_key
+    try:
+        scheme, iterations = parse_password_hash(stored_password or "")
+    except ValueError:
+        return False
+    password = plain_password.encode('utf-8')
+    if scheme == "bcrypt":
+        # Hashes written by the old passlib/bcrypt helper
+        import bcrypt
+        return bcrypt.checkpw(password, stored_password.encode('utf-8'))
+    if scheme == PBKDF2_ALGORITHM:
+        _, _, salt_hex, stored_key = stored_password.split("$")
+    else:
+        salt_hex, stored_key = stored_password[:64], stored_password[64:]
+    new_key = hashlib.pbkdf2_hmac('sha256', password, bytes.fromhex(salt_hex), iterations).hex()
+    return hmac.compare_digest(new_key, stored_key)
+
+def needs_rehash(stored_password: str, iterations: int = PBKDF2_ITERATIONS) -> bool:
+    """
+    True if a hash should be replaced on the next successful login: it uses
+    an older scheme or fewer iterations than currently configured.
+    """
+    try:
+        scheme, stored_iterations = parse_password_hash(stored_password or "")
+    except ValueError:
+        return True
+    return scheme != PBKDF2_ALGORITHM or stored_iterations < iterations
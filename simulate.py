@@ -0,0 +1,198 @@
+import argparse
+import json
+import math
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from combination_list import (
+    combinations, SYMBOLS, HOUSE_EDGE, BONUS_GAME_EVENT, BONUS_PRIZES,
+    JACKPOT_SYMBOL, JACKPOT_REQUIRED_COUNT, JACKPOT_CONTRIBUTION, JACKPOT_RESET_VALUE
+)
+from advanced_rng import SlotMachineRNG, WeightedSampler, build_reel_tables, spawn_streams, STREAM_MODES
+from payline_evaluator import compile_combinations, evaluate_spins, trigger_code
+
+CHUNK_SIZE = 200_000
+
+def empty_totals():
+    """Streaming aggregates for a run, in a form that merges by addition."""
+    return {
+        "spins": 0,
+        "total_bet": 0.0,
+        "total_winnings": 0.0,
+        "sum_squares": 0.0,  # Sum of squared per-spin return multiples (winnings / bet)
+        "max_win": 0.0,
+        "winning_spins": 0,
+        "line_winnings": 0.0,
+        "bonus_games": 0,
+        "bonus_winnings": 0.0,
+        "jackpots": 0,
+        "jackpot_winnings": 0.0,
+    }
+
+def merge_totals(totals, other):
+    for key, value in other.items():
+        totals[key] = max(totals[key], value) if key == "max_win" else totals[key] + value
+    return totals
+
+def simulate_chunk(rng, table, reels, n, bet_amount, jackpot_value, reel_tables=None, bonus_sampler=None):
+    """
+    Play `n` spins through spin -> check_win -> bonus -> jackpot.
+
+    :param reel_tables, bonus_sampler: Samplers built once per run; built here if omitted
+
+    :return: (per-spin winnings array, aggregates dictionary, jackpot pool after the chunk)
+    """
+    spins = rng.generate_spins(reels, n, reel_tables)
+    points, _, _, line_triggers = evaluate_spins(table, spins)
+    line_winnings = points * bet_amount * (1 - HOUSE_EDGE)
+
+    bonus_winnings = np.zeros(n)
+    bonus_spins = np.flatnonzero((line_triggers == trigger_code(table, BONUS_GAME_EVENT)).any(axis=1))
+    if len(bonus_spins):
+        bonus_sampler = bonus_sampler or WeightedSampler.from_pairs(BONUS_PRIZES)
+        bonus_winnings[bonus_spins] = bonus_sampler.sample_batch(rng, len(bonus_spins))
+
+    jackpot_hits = (spins == SYMBOLS.index(JACKPOT_SYMBOL)).sum(axis=(1, 2)) >= JACKPOT_REQUIRED_COUNT
+    jackpot_winnings = np.zeros(n)
+    # The pool only grows on spins that do not hit, so it is a running sum
+    # that restarts from the reset value after every hit
+    increments = np.where(jackpot_hits, 0.0, bet_amount * JACKPOT_CONTRIBUTION)
+    pool = np.cumsum(increments)
+    paid_before = 0.0
+    for i in np.flatnonzero(jackpot_hits):
+        jackpot_winnings[i] = jackpot_value + pool[i] - paid_before
+        jackpot_value, paid_before = JACKPOT_RESET_VALUE, pool[i]
+    jackpot_value += pool[-1] - paid_before
+
+    winnings = line_winnings + bonus_winnings + jackpot_winnings
+    multiples = winnings / bet_amount
+    totals = {
+        "spins": n,
+        "total_bet": n * bet_amount,
+        "total_winnings": float(winnings.sum()),
+        "sum_squares": float(multiples @ multiples),
+        "max_win": float(winnings.max()),
+        "winning_spins": int(np.count_nonzero(winnings)),
+        "line_winnings": float(line_winnings.sum()),
+        "bonus_games": len(bonus_spins),
+        "bonus_winnings": float(bonus_winnings.sum()),
+        "jackpots": int(jackpot_hits.sum()),
+        "jackpot_winnings": float(jackpot_winnings.sum()),
+    }
+    return winnings, totals, jackpot_value
+
+def run_worker(reels, symbol_payouts, spins, bet_amount, rng, chunk_size=CHUNK_SIZE):
+    """
+    Simulate `spins` spins on an independent RNG stream with its own jackpot pool.
+
+    :param rng: This worker's stream from spawn_streams, or an integer seed for a 'pcg64' stream
+    :return: Aggregates dictionary
+    """
+    if not isinstance(rng, SlotMachineRNG):
+        rng = SlotMachineRNG('pcg64', seed=rng)
+    table = compile_combinations(combinations, symbol_payouts)
+    reel_tables = build_reel_tables(reels)
+    bonus_sampler = WeightedSampler.from_pairs(BONUS_PRIZES)
+    totals = empty_totals()
+    jackpot_value = JACKPOT_RESET_VALUE
+    remaining = spins
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        _, chunk_totals, jackpot_value = simulate_chunk(rng, table, reels, n, bet_amount, jackpot_value,
+                                                            reel_tables, bonus_sampler)
+        merge_totals(totals, chunk_totals)
+        remaining -= n
+    return totals
+
+def summarize(totals):
+    """Derive RTP, volatility and a 95% confidence interval from merged aggregates."""
+    n = totals["spins"]
+    bet = totals["total_bet"] / n
+    mean = totals["total_winnings"] / totals["total_bet"]
+    variance = max(totals["sum_squares"] / n - mean ** 2, 0.0)
+    volatility = math.sqrt(variance)
+    margin = 1.96 * volatility / math.sqrt(n)
+    return {
+        "spins": n,
+        "rtp": mean,
+        "rtp_ci95": (mean - margin, mean + margin),
+        "volatility": volatility,
+        "hit_frequency": totals["winning_spins"] / n,
+        "max_win": totals["max_win"],
+        "max_win_multiple": totals["max_win"] / bet,
+        "line_rtp": totals["line_winnings"] / totals["total_bet"],
+        "bonus_rtp": totals["bonus_winnings"] / totals["total_bet"],
+        "jackpot_rtp": totals["jackpot_winnings"] / totals["total_bet"],
+        "bonus_games": totals["bonus_games"],
+        "jackpots": totals["jackpots"],
+    }
+
+def simulate(reels, symbol_payouts, spins, bet_amount=1.0, workers=None, seed=None, chunk_size=CHUNK_SIZE,
+             rng_mode='pcg64'):
+    """
+    Run a Monte Carlo simulation across a process pool.
+
+    Each worker draws from its own stream spawned from one parent seed
+    (see spawn_streams), so streams are independent, workers share no RNG
+    state and a run is reproducible given `seed` and `workers`.
+
+    :param rng_mode: Bit generator of the worker streams, one of STREAM_MODES
+    :return: Summary dictionary from summarize
+    """
+    workers = workers or os.cpu_count() or 1
+    streams = spawn_streams(seed, workers, rng_mode)
+    shares = [spins // workers + (1 if i < spins % workers else 0) for i in range(workers)]
+
+    totals = empty_totals()
+    if workers == 1:
+        merge_totals(totals, run_worker(reels, symbol_payouts, shares[0], bet_amount, streams[0], chunk_size))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_worker, reels, symbol_payouts, share, bet_amount, stream, chunk_size)
+                       for share, stream in zip(shares, streams) if share > 0]
+            for future in futures:
+                merge_totals(totals, future.result())
+    return summarize(totals)
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of the slot machine without DB or wallet.")
+    parser.add_argument("--spins", type=positive_int, default=10_000_000, help="Total number of spins")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--bet", type=float, default=1.0, help="Bet amount per spin")
+    parser.add_argument("--seed", type=int, default=None, help="Parent seed for reproducible runs")
+    parser.add_argument("--chunk", type=positive_int, default=CHUNK_SIZE, help="Spins per vectorized batch")
+    parser.add_argument("--rng", choices=list(STREAM_MODES), default='pcg64', help="Bit generator of the worker streams")
+    parser.add_argument("--config", help="Read reels and payouts from a JSON file such as slot_config.json "
+                                         "instead of the database")
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+        reels, symbol_payouts = config['reels'], config['symbol_payouts']
+    else:
+        from config_manager import get_reel_probabilities, get_symbol_payouts
+        reels, symbol_payouts = get_reel_probabilities(), get_symbol_payouts()
+
+    start = time.perf_counter()
+    summary = simulate(reels, symbol_payouts, args.spins, args.bet, args.workers, args.seed, args.chunk, args.rng)
+    elapsed = time.perf_counter() - start
+
+    low, high = summary["rtp_ci95"]
+    print(f"Spins: {summary['spins']:,}")
+    print(f"RTP: {summary['rtp'] * 100:.4f}% (95% CI {low * 100:.4f}% - {high * 100:.4f}%)")
+    print(f"  Line wins: {summary['line_rtp'] * 100:.4f}%")
+    print(f"  Bonus game: {summary['bonus_rtp'] * 100:.4f}% ({summary['bonus_games']:,} games)")
+    print(f"  Jackpot: {summary['jackpot_rtp'] * 100:.4f}% ({summary['jackpots']:,} hits)")
+    print(f"Volatility (std of win/bet): {summary['volatility']:.4f}")
+    print(f"Hit frequency: {summary['hit_frequency']:.6f}")
+    print(f"Max win: ${summary['max_win']:.2f} ({summary['max_win_multiple']:.1f}x bet)")
+    print(f"Elapsed: {elapsed:.2f}s ({summary['spins'] / elapsed:,.0f} spins/s)")
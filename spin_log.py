@@ -0,0 +1,122 @@
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+LOG_DIR = 'logs'
+LOG_NAME = 'spins'
+
+class SpinLog:
+    """
+    Append-only spin log in JSON Lines format.
+
+    Each entry is one line appended to `<directory>/<name>.jsonl`, so the cost
+    of logging a spin does not depend on how much has been logged before and
+    a crash can at worst truncate the last line. The active file is rotated
+    to a timestamped segment once it exceeds `max_bytes` or has been open for
+    `max_age_seconds`; rotated segments are gzip-compressed if `compress` is set.
+    """
+
+    def __init__(self, directory=LOG_DIR, name=LOG_NAME, max_bytes=64 * 1024 * 1024,
+                 max_age_seconds=24 * 60 * 60, compress=True):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.compress = compress
+        self.path = os.path.join(directory, f"{name}.jsonl")
+        self._lock = threading.Lock()
+        self._file = None
+        self._opened_at = None
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+
+    def write(self, entry):
+        """Append one entry (a JSON-serializable dictionary)."""
+        line = json.dumps(entry, separators=(',', ':'), default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._open()
+            elif self._should_rotate():
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+
+    def _should_rotate(self):
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return bool(self.max_age_seconds) and time.time() - self._opened_at >= self.max_age_seconds
+
+    def _rotate(self):
+        self._file.close()
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        segment = os.path.join(self.directory, f"{self.name}-{stamp}.jsonl")
+        os.replace(self.path, segment)
+        if self.compress:
+            threading.Thread(target=_compress_segment, args=(segment,), daemon=True).start()
+        self._open()
+
+    def rotate(self):
+        """Force a rotation of the active file."""
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._rotate()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def _compress_segment(segment):
+    try:
+        with open(segment, 'rb') as src, gzip.open(segment + '.gz.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(segment + '.gz.tmp', segment + '.gz')
+        os.remove(segment)
+    except OSError as e:
+        logger.error(f"Error compressing spin log segment {segment}: {e}")
+
+def log_segments(directory=LOG_DIR, name=LOG_NAME):
+    """Spin log files oldest first: rotated segments, then the active file."""
+    segments = {}
+    for path in glob.glob(os.path.join(directory, f"{name}-*.jsonl*")):
+        if path.endswith('.tmp'):
+            continue
+        # A segment may briefly exist both plain and compressed; prefer the plain file
+        key = path[:-3] if path.endswith('.gz') else path
+        if key not in segments or not path.endswith('.gz'):
+            segments[key] = path
+    ordered = [segments[key] for key in sorted(segments)]
+    active = os.path.join(directory, f"{name}.jsonl")
+    if os.path.exists(active):
+        ordered.append(active)
+    return ordered
+
+def iter_spin_log(directory=LOG_DIR, name=LOG_NAME):
+    """
+    Stream every logged entry, oldest first, one line at a time.
+
+    Truncated or corrupt lines (e.g. from a crash mid-write) are skipped.
+    """
+    for path in log_segments(directory, name):
+        if not os.path.exists(path) and os.path.exists(path + '.gz'):
+            path += '.gz'  # Compressed since the directory was listed
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt spin log line in {path}")
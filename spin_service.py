@@ -0,0 +1,245 @@
+import math
+import time
+from collections import namedtuple
+from sqlalchemy.orm import Session
+from db_models import Player, Jackpot, GameResult
+from data_access import record_game_results
+from database import SessionLocal
+from combination_list import HOUSE_EDGE, BONUS_GAME_EVENT, JACKPOT_CONTRIBUTION, JACKPOT_RESET_VALUE
+from outcome import SpinOutcome
+from jackpot_manager import check_jackpot_win, add_to_jackpot, claim_jackpot
+from metrics import (stage_timer, spin_stage_seconds, spins_total, spin_errors_total, bonus_games_total,
+                     jackpot_hits_total)
+from profiler import PROFILER
+import logging
+
+logger = logging.getLogger(__name__)
+
+SpinResult = namedtuple('SpinResult', [
+    'outcome', 'points', 'winnings', 'regular_winnings', 'bonus_win', 'jackpot_win',
+    'triggered_events', 'winning_paylines', 'balance', 'current_jackpot', 'result_id'
+])
+
+# A drawn and evaluated spin, before any money has moved
+SpinEvaluation = namedtuple('SpinEvaluation', [
+    'outcome', 'points', 'regular_winnings', 'bonus_win', 'jackpot_hit', 'triggered_events', 'winning_paylines',
+    'rng_offset',  # Stream position the spin started at, None without a replayable RNG
+])
+
+def settle_spin(db: Session, player_id: int, session_id: int, spin_number: int, bet_amount: float,
+                outcome, points: int, regular_winnings: float, bonus_win: float, jackpot_hit: bool,
+                jackpot_buffer=None, result_writer=None, wallet_cache=None, rng_offset=None, config_id=None):
+    """
+    Move the money for one evaluated spin in a single transaction.
+
+    The player row is locked for the duration, so the debit, jackpot
+    contribution or claim, credit and result insert either all happen or
+    none do. Commits once. The jackpot row is only touched by an atomic
+    increment, or locked when the pool is claimed; with a
+    JackpotContributionBuffer, losing spins do not touch it at all.
+
+    With a GameResultWriter the result row leaves the money transaction and
+    is handed to the writer after commit, using the writer's durability; it
+    is not atomic with the money (see result_writer.py).
+    With a WalletCache, the committed balance and row version are stored in
+    it, so the next balance read needs no query. rng_offset and config_id are
+    stored with the result so replay.py can regenerate the spin.
+
+    Every exception raised means nothing was committed. Work done after the
+    commit (buffered contribution, handing the row to the writer) is logged
+    when it fails; a row the writer does not take is inserted directly.
+
+    :raises ValueError: If the bet is not a positive number, the player does
+                        not exist or cannot cover the bet
+    :return: (balance, jackpot_win, current_jackpot, result_id); result_id is
+             None when the row goes through a result writer
+    """
+    if not (math.isfinite(bet_amount) and bet_amount > 0):
+        raise ValueError("Bet amount must be positive.")
+    with stage_timer('wallet'):
+        player = db.query(Player).filter(Player.id == player_id).with_for_update().one_or_none()
+        if player is None:
+            raise ValueError(f"Player {player_id} not found")
+        if player.balance < bet_amount:
+            raise ValueError("Insufficient funds to place bet.")
+
+    outcome_code = outcome.packed if isinstance(outcome, SpinOutcome) else SpinOutcome.from_symbols(outcome).packed
+    contribution = bet_amount * JACKPOT_CONTRIBUTION
+    drained = 0.0
+    jackpot_win = 0.0
+    try:
+        with stage_timer('jackpot'):
+            if jackpot_hit:
+                # Buffered contributions belong to this pool, so the winner gets them
+                drained = jackpot_buffer.drain() if jackpot_buffer is not None else 0.0
+                jackpot_win = claim_jackpot(db, JACKPOT_RESET_VALUE, extra=drained)
+                current_jackpot = JACKPOT_RESET_VALUE
+            elif jackpot_buffer is not None:
+                current_jackpot = jackpot_buffer.current_value() + contribution
+            else:
+                current_jackpot = add_to_jackpot(db, contribution)
+                if current_jackpot is None:
+                    current_jackpot = JACKPOT_RESET_VALUE + contribution
+                    db.add(Jackpot(value=current_jackpot))
+
+        winnings = regular_winnings + bonus_win + jackpot_win
+        player.balance = player.balance - bet_amount + winnings
+        player.total_spins = (player.total_spins or 0) + 1
+        player.total_winnings = (player.total_winnings or 0.0) + winnings
+
+        row = dict(
+            session_id=session_id,
+            spin_number=spin_number,
+            bet_amount=bet_amount,
+            outcome_code=outcome_code,
+            winnings=winnings,
+            points_won=points,
+            regular_winnings=regular_winnings,
+            jackpot_win=jackpot_win,
+            bonus_win=bonus_win,
+            balance_after=player.balance,
+            current_jackpot=current_jackpot,
+            rng_offset=rng_offset,
+            config_id=config_id,
+        )
+        result = GameResult(**row) if result_writer is None else None
+        if result is not None:
+            db.add(result)
+        with stage_timer('persistence'):
+            db.flush()
+            balance, version, result_id = player.balance, player.version, result.id if result is not None else None
+            db.commit()
+    except Exception:
+        if drained:
+            jackpot_buffer.restore(drained)
+        raise
+
+    # The money has moved: from here on nothing may report the spin as failed
+    if jackpot_buffer is not None:
+        if jackpot_hit:
+            jackpot_buffer.reset_value(JACKPOT_RESET_VALUE)
+        else:
+            _after_commit("add the jackpot contribution", jackpot_buffer.add, contribution)
+    if result_writer is not None and not _after_commit("queue the result row", result_writer.write, row):
+        _after_commit("record the result row", record_game_results, db, [row])
+    if wallet_cache is not None:
+        wallet_cache.store(player_id, balance, version)
+    if jackpot_hit:
+        jackpot_hits_total.inc()
+    return balance, jackpot_win, current_jackpot, result_id
+
+def _after_commit(action, fn, *args):
+    """:return: Whether fn(*args) succeeded; a failure is logged, never raised"""
+    try:
+        fn(*args)
+        return True
+    except Exception as e:
+        logger.error(f"Spin settled, but could not {action}: {e}")
+        return False
+
+class SpinService:
+    """
+    Runs one spin end to end: RNG and evaluation happen outside the
+    database, then all money movement is settled in one transaction.
+    """
+
+    def __init__(self, spin_reels, check_win, play_bonus_game, session_factory=SessionLocal, jackpot_buffer=None,
+                 result_writer=None, wallet_cache=None, rng=None, config_id=None):
+        """
+        :param spin_reels, check_win, play_bonus_game: Functions returned by reelAlgo.selected_model
+        :param session_factory: Callable returning a new SQLAlchemy session
+        :param jackpot_buffer: Optional JackpotContributionBuffer batching pool contributions
+        :param result_writer: Optional GameResultWriter persisting result rows in bulk
+        :param wallet_cache: Optional WalletCache kept up to date with settled balances
+        :param rng: The seekable SlotMachineRNG the model draws from (selected_model(rng=...));
+                    its position is recorded with every spin
+        :param config_id: config_snapshots id of the model's configuration
+        """
+        self.spin_reels = spin_reels
+        self.check_win = check_win
+        self.play_bonus_game = play_bonus_game
+        self.session_factory = session_factory
+        self.jackpot_buffer = jackpot_buffer
+        self.result_writer = result_writer
+        self.wallet_cache = wallet_cache
+        self.rng = rng
+        self.config_id = config_id
+
+    def evaluate(self, bet_amount):
+        """
+        Draw and evaluate one spin without touching the database.
+
+        :return: A SpinEvaluation
+        """
+        rng_offset = self.rng.position if self.rng is not None else None
+        with stage_timer('rng'):
+            outcome = self.spin_reels()
+        with stage_timer('evaluation'):
+            points, _, triggered_events, winning_paylines = self.check_win(outcome)
+            jackpot_hit = check_jackpot_win(outcome)
+
+        # Apply house edge
+        regular_winnings = points * bet_amount * (1 - HOUSE_EDGE)
+        bonus_win = 0
+        if BONUS_GAME_EVENT in triggered_events:
+            with stage_timer('bonus'):
+                bonus_win = self.play_bonus_game()
+            bonus_games_total.inc()
+        return SpinEvaluation(outcome, points, regular_winnings, bonus_win, jackpot_hit,
+                              triggered_events, winning_paylines, rng_offset)
+
+    def evaluate_at(self, bet_amount, seed, position):
+        """
+        Evaluate the spin that starts at `position` of the stream keyed by `seed`.
+
+        Requires `rng`; afterwards rng.position is where the next spin starts.
+        """
+        self.rng.seek(position, seed)
+        return self.evaluate(bet_amount)
+
+    def spin(self, player_id, session_id, spin_number, bet_amount):
+        """
+        Play and settle one spin.
+
+        :raises ValueError: If the player does not exist or cannot cover the bet
+        :return: A SpinResult
+        """
+        # Sampled by the profiler when it is running for this spin
+        with PROFILER.spin_scope():
+            start = time.perf_counter()
+            outcome, points, regular_winnings, bonus_win, jackpot_hit, triggered_events, winning_paylines, \
+                rng_offset = self.evaluate(bet_amount)
+
+            db = self.session_factory()
+            try:
+                balance, jackpot_win, current_jackpot, result_id = settle_spin(
+                    db, player_id, session_id, spin_number, bet_amount,
+                    outcome, points, regular_winnings, bonus_win, jackpot_hit,
+                    self.jackpot_buffer, self.result_writer, self.wallet_cache, rng_offset, self.config_id
+                )
+            except Exception as e:
+                db.rollback()
+                if rng_offset is not None:
+                    # settle_spin only raises before its commit (later failures are logged there),
+                    # so nothing was recorded and the next spin redraws from the same position
+                    self.rng.seek(rng_offset)
+                spin_errors_total.inc(label_value=type(e).__name__)
+                raise
+            finally:
+                db.close()
+            spin_stage_seconds.observe(time.perf_counter() - start, 'total')
+            spins_total.inc()
+
+        return SpinResult(
+            outcome=outcome,
+            points=points,
+            winnings=regular_winnings + bonus_win + jackpot_win,
+            regular_winnings=regular_winnings,
+            bonus_win=bonus_win,
+            jackpot_win=jackpot_win,
+            triggered_events=triggered_events,
+            winning_paylines=winning_paylines,
+            balance=balance,
+            current_jackpot=current_jackpot,
+            result_id=result_id,
+        )
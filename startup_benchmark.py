@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+HISTORY_FILE = os.path.join('benchmarks', 'startup.jsonl')
+
+# Modules whose import cost is tracked
+MODULES = ['reelAlgo', 'simulate', 'rtp_calculator', 'game_server', 'diagnostics_tool']
+
+# Child programs timed from process start to the first evaluated spin
+FIRST_SPIN_PROGRAMS = {
+    # Model built from slot_config.json: no database involved
+    'offline': """
+import json
+import reelAlgo
+from config_manager import build_config_snapshot
+with open('slot_config.json') as f:
+    config = json.load(f)
+spin_reels, check_win, _ = reelAlgo.selected_model(build_config_snapshot(config['reels'], config['symbol_payouts']))
+check_win(spin_reels())
+""",
+    # Model built from the configuration in DATABASE_URL
+    'db': """
+import reelAlgo
+spin_reels, check_win, _ = reelAlgo.selected_model()
+check_win(spin_reels())
+""",
+}
+
+def import_breakdown(module, top=10):
+    """
+    Import `module` in a fresh interpreter under `python -X importtime`.
+
+    :return: Dictionary with the total import time and the `top` slowest
+             top-level imports, by cumulative and by self time (milliseconds)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+
+    # Entries are listed children first, indented two spaces per level; the
+    # module's own imports are the level-one entries just before its line
+    index = next(i for i, entry in enumerate(entries) if entry[0] == module)
+    start = index
+    while start > 0 and entries[start - 1][0].startswith(' '):
+        start -= 1
+    subtree = entries[start:index]
+    total = entries[index][2]
+    direct = [entry for entry in subtree if entry[0].startswith('  ') and not entry[0].startswith('    ')]
+    by_cumulative = sorted(direct, key=lambda e: -e[2])[:top]
+    by_self = sorted(subtree, key=lambda e: -e[1])[:top]
+    entries = subtree + [entries[index]]
+    return {
+        "module": module,
+        "total_ms": total / 1000,
+        "modules_imported": len(entries),
+        "top_cumulative": [(name.strip(), cumulative / 1000) for name, _, cumulative in by_cumulative],
+        "top_self": [(name.strip(), self_time / 1000) for name, self_time, _ in by_self],
+    }
+
+def time_to_first_spin(mode='offline', runs=5):
+    """
+    Wall-clock time from launching a fresh interpreter to its first evaluated spin.
+
+    :return: Dictionary with the median, minimum and maximum over `runs` (milliseconds)
+    """
+    program = FIRST_SPIN_PROGRAMS[mode]
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', program], capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            raise RuntimeError(f"First spin ({mode}) failed:\n{result.stderr.strip().splitlines()[-1]}")
+        timings.append(elapsed * 1000)
+    baseline = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        baseline.append((time.perf_counter() - start) * 1000)
+    return {
+        "mode": mode,
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+        "interpreter_ms": statistics.median(baseline),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(modules=MODULES, modes=('offline',), runs=5):
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "imports": [import_breakdown(module) for module in modules],
+        "first_spin": [time_to_first_spin(mode, runs) for mode in modes],
+    }
+
+def print_report(report):
+    print(f"Startup benchmark ({report['revision'] or 'unknown revision'}, Python {report['python']})")
+    for entry in report['imports']:
+        print(f"\nimport {entry['module']}: {entry['total_ms']:.1f} ms, {entry['modules_imported']} modules")
+        for name, ms in entry['top_cumulative']:
+            print(f"  {name:<40} {ms:8.1f} ms")
+    print()
+    for entry in report['first_spin']:
+        print(f"First spin ({entry['mode']}): {entry['median_ms']:.1f} ms median "
+              f"[{entry['min_ms']:.1f}-{entry['max_ms']:.1f}], bare interpreter {entry['interpreter_ms']:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first spin.")
+    parser.add_argument("--modules", nargs="+", default=MODULES, help="Modules to import-profile")
+    parser.add_argument("--modes", nargs="+", choices=list(FIRST_SPIN_PROGRAMS), default=['offline'],
+                        help="First-spin scenarios ('db' needs DATABASE_URL)")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per first-spin scenario")
+    parser.add_argument("--history", default=HISTORY_FILE, help="JSON Lines file the result is appended to")
+    parser.add_argument("--no-history", action="store_true", help="Do not record the result")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.modules, args.modes, args.runs)
+    print_report(report)
+    if not args.no_history:
+        os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(report) + '\n')
+        print(f"\nAppended to {args.history}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import math
+import threading
+import numpy as np
+from database import SessionLocal
+from db_models import GameResult
+from reporting import count_results, fetch_bucketed_series
+import logging
+
+logger = logging.getLogger(__name__)
+
+# GameResult columns fetched for the dashboard, in tuple order after the id
+STAT_COLUMNS = [
+    'bet_amount', 'winnings', 'balance_after', 'points_won',
+    'regular_winnings', 'jackpot_win', 'bonus_win', 'current_jackpot'
+]
+
+# Per-spin series kept by the engine: the raw columns plus the running ones
+SERIES = STAT_COLUMNS + ['cumulative_avg_wins', 'rtp_over_time', 'win_flags', 'bonus_flags']
+
+# Stored per point alongside SERIES: the spin number on the x axis
+POINT_SERIES = ['spins'] + SERIES
+
+class StatsEngine:
+    """
+    Incrementally maintained dashboard statistics.
+
+    Only rows with an id above the high-water mark are fetched, as plain
+    tuples rather than ORM objects, and appended to preallocated NumPy
+    series. Ids are assigned before commit, so with concurrent writers (or
+    a GameResultWriter) a lower id can become visible after a higher one was
+    read: every poll also lists the ids of the last `rescan_window` ids
+    below the mark and fetches any not yet seen. Running totals carry the cumulative series forward, so each
+    poll costs O(new rows) instead of O(history). Polling happens on a
+    background thread; readers pick up a new snapshot only when the
+    version changes.
+
+    When the history at startup exceeds `backfill_threshold` spins it is not
+    fetched row by row: the series are aggregated in SQL into about
+    `backfill_points` buckets (see reporting.fetch_bucketed_series) and only
+    spins after that are kept one point each; rows committed late below the
+    backfilled range are not picked up.
+    """
+
+    def __init__(self, session_factory=SessionLocal, poll_interval=1.0, fetch_size=50000, initial_capacity=4096,
+                 backfill_threshold=200000, backfill_points=20000, rescan_window=10000):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.fetch_size = fetch_size
+        self.backfill_threshold = backfill_threshold
+        self.backfill_points = backfill_points
+        self.rescan_window = rescan_window
+        self.high_water_mark = 0
+        # Ids within rescan_window of the mark that have been folded in; nothing at or below the floor is rescanned
+        self._recent_ids = set()
+        self._rescan_floor = 0
+        self.total_spins = 0
+        self.points = 0
+        self.total_bets = 0.0
+        self.total_winnings = 0.0
+        self.version = 0
+        self._series = {name: np.empty(initial_capacity) for name in POINT_SERIES}
+        self._snapshot = self._build_snapshot()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _ensure_capacity(self, needed):
+        capacity = len(self._series['spins'])
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, values in self._series.items():
+            grown = np.empty(capacity)
+            grown[:self.points] = values[:self.points]
+            self._series[name] = grown
+
+    def _backfill(self, db):
+        """Load a long history as SQL-side buckets; returns False if it is short enough to fetch per row."""
+        count, max_id = count_results(db)
+        if count <= self.backfill_threshold:
+            return False
+        bucket_size = math.ceil(count / self.backfill_points)
+        data = fetch_bucketed_series(db, bucket_size, max_id=max_id)
+        n = len(data['spins'])
+        self._ensure_capacity(n)
+        for name in POINT_SERIES:
+            self._series[name][:n] = data[name]
+        self.points = n
+        self.total_spins = data['total_spins']
+        self.total_bets = data['total_bets']
+        self.total_winnings = data['total_winnings']
+        self.high_water_mark = self._rescan_floor = data['last_id']
+        logger.info(f"Backfilled {count} spins as {n} buckets of {bucket_size}")
+        return True
+
+    def _fetch(self, db):
+        columns = [GameResult.id] + [getattr(GameResult, name) for name in STAT_COLUMNS]
+        return (
+            db.query(*columns)
+            .filter(GameResult.id > self.high_water_mark)
+            .order_by(GameResult.id)
+            .limit(self.fetch_size)
+            .all()
+        )
+
+    def _fetch_missed(self, db):
+        """Rows below the high-water mark that committed after later rows had been read."""
+        floor = max(self._rescan_floor, self.high_water_mark - self.rescan_window)
+        if self.high_water_mark <= floor:
+            return []
+        ids = db.query(GameResult.id).filter(GameResult.id > floor, GameResult.id <= self.high_water_mark)
+        missed = sorted({row.id for row in ids} - self._recent_ids)
+        if not missed:
+            return []
+        columns = [GameResult.id] + [getattr(GameResult, name) for name in STAT_COLUMNS]
+        return db.query(*columns).filter(GameResult.id.in_(missed)).order_by(GameResult.id).all()
+
+    def _forget_old_ids(self):
+        floor = self.high_water_mark - self.rescan_window
+        self._recent_ids = {row_id for row_id in self._recent_ids if row_id > floor}
+
+    def _append(self, rows):
+        # None becomes NaN with a float dtype; the dashboard has always treated missing values as 0.
+        # Plain tuples convert far faster than Row objects.
+        block = np.nan_to_num(np.array([tuple(row) for row in rows], dtype=np.float64))
+        count = len(block)
+        start, end = self.points, self.points + count
+        self._ensure_capacity(end)
+
+        for i, name in enumerate(STAT_COLUMNS, start=1):
+            self._series[name][start:end] = block[:, i]
+
+        bets, winnings = block[:, 1], block[:, 2]
+        cumulative_winnings = self.total_winnings + np.cumsum(winnings)
+        cumulative_bets = self.total_bets + np.cumsum(bets)
+        spin_numbers = np.arange(self.total_spins + 1, self.total_spins + count + 1, dtype=np.float64)
+        self._series['spins'][start:end] = spin_numbers
+        self._series['cumulative_avg_wins'][start:end] = cumulative_winnings / spin_numbers
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self._series['rtp_over_time'][start:end] = np.where(
+                cumulative_bets > 0, cumulative_winnings / cumulative_bets * 100, 0)
+        self._series['win_flags'][start:end] = winnings > 0
+        self._series['bonus_flags'][start:end] = block[:, 7] > 0
+
+        self.points = end
+        self.total_spins += count
+        self.total_winnings = float(cumulative_winnings[-1])
+        self.total_bets = float(cumulative_bets[-1])
+        # Late rows come in below the mark, and are appended as the latest spins
+        self._recent_ids.update(int(row_id) for row_id in block[:, 0])
+        self.high_water_mark = max(self.high_water_mark, int(block[-1, 0]))
+
+    def _build_snapshot(self):
+        n = self.total_spins
+        snapshot = {
+            "version": self.version,
+            "total_spins": n,
+            "total_winnings": self.total_winnings,
+            "average_win": self.total_winnings / n if n > 0 else 0,
+            "rtp": (self.total_winnings / self.total_bets) * 100 if self.total_bets > 0 else 0,
+        }
+        # Views stay valid: later polls only write past the current points or into a new, grown array
+        for name in POINT_SERIES:
+            snapshot[name] = self._series[name][:self.points]
+        return snapshot
+
+    def poll(self):
+        """
+        Fetch and fold in any new rows.
+
+        :return: True if new data arrived
+        """
+        with self._lock:
+            db = self.session_factory()
+            try:
+                changed = self.high_water_mark == 0 and self._backfill(db)
+                missed = self._fetch_missed(db)
+                if missed:
+                    logger.debug(f"Picked up {len(missed)} game results committed out of id order")
+                    self._append(missed)
+                    changed = True
+                while True:
+                    rows = self._fetch(db)
+                    if not rows:
+                        break
+                    self._append(rows)
+                    changed = True
+                    if len(rows) < self.fetch_size:
+                        break
+            finally:
+                db.close()
+            if changed:
+                self._forget_old_ids()
+                self.version += 1
+                self._snapshot = self._build_snapshot()
+            return changed
+
+    def snapshot(self):
+        """The latest statistics; the arrays must be treated as read-only."""
+        return self._snapshot
+
+    def start(self):
+        """Poll on a background thread until stop() is called."""
+        def run():
+            while not self._stopped.is_set():
+                try:
+                    self.poll()
+                except Exception as e:
+                    logger.error(f"Error polling game results: {e}")
+                self._stopped.wait(self.poll_interval)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=run, name="stats-engine", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,48 @@
+import asyncio
+from concurrent.futures import Future
+import pytest
+from auth_service import AuthService
+from data_access import create_player
+from security import DUMMY_PASSWORD_HASH, PBKDF2_ITERATIONS, get_password_hash, parse_password_hash
+
+class InlineAuthService(AuthService):
+    """Runs hashing jobs in the calling thread and records them."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.jobs = []
+
+    def submit(self, fn, *args, block=True):
+        self.jobs.append((fn.__name__, args))
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+@pytest.fixture
+def auth(engine):
+    return InlineAuthService()
+
+@pytest.fixture
+def alice(db):
+    return create_player(db, "alice", "alice@example.com", None, password_hash=get_password_hash("secret"))
+
+def test_login_issues_a_token(auth, alice):
+    token = auth.authenticate("alice", "secret")
+
+    assert auth.validate_token(token.token) == alice.id
+
+def test_unknown_username_costs_a_verification(auth, alice):
+    assert auth.authenticate("mallory", "secret") is None
+    assert auth.authenticate("alice", "wrong") is None
+
+    # Both failures ran one full hash verification
+    assert [(name, args[1] == DUMMY_PASSWORD_HASH) for name, args in auth.jobs] == \
+        [('verify_password', True), ('verify_password', False)]
+
+def test_unknown_username_costs_a_verification_async(auth, alice):
+    assert asyncio.run(auth.authenticate_async("mallory", "secret")) is None
+
+    assert [(name, args[1]) for name, args in auth.jobs] == [('verify_password', DUMMY_PASSWORD_HASH)]
+
+def test_dummy_hash_uses_the_configured_cost():
+    assert parse_password_hash(DUMMY_PASSWORD_HASH) == ("pbkdf2_sha256", PBKDF2_ITERATIONS)
@@ -0,0 +1,41 @@
+import threading
+import pytest
+from sqlalchemy import create_engine
+import database
+from database import InstrumentedQueuePool, get_pool_stats, instrument_engine
+
+@pytest.fixture
+def pool_stats(monkeypatch):
+    stats = {**dict.fromkeys(database._pool_stats, 0), "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+    monkeypatch.setattr(database, "_pool_stats", stats)
+    return stats
+
+@pytest.fixture
+def single_connection_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=5)
+    instrument_engine(engine)
+    yield engine
+    engine.dispose()
+
+def test_immediate_checkouts_are_not_waits(pool_stats, single_connection_engine):
+    for _ in range(20):
+        with single_connection_engine.connect():
+            pass
+
+    stats = get_pool_stats()
+    assert stats["checkouts"] == 20
+    assert stats["waits"] == 0
+
+def test_blocked_checkout_is_a_wait(pool_stats, single_connection_engine):
+    held = single_connection_engine.connect()
+    releaser = threading.Timer(0.05, held.close)
+    releaser.start()
+    with single_connection_engine.connect():
+        pass
+    releaser.join()
+
+    stats = get_pool_stats()
+    assert stats["waits"] == 1
+    assert stats["max_wait_seconds"] >= 0.04
+    assert stats["size"] >= 1 and stats["overflow"] >= 0
@@ -0,0 +1,134 @@
+import json
+import numpy as np
+import pytest
+from advanced_rng import SlotMachineRNG
+from combination_list import SYMBOLS
+from config_manager import DEFAULT_CONFIG, build_config_snapshot
+from data_access import get_or_create_config_snapshot, record_game_result, record_game_results
+from db_models import GameResult, Jackpot
+from exporter import open_export, export_history, decode_outcome
+from outcome import SpinOutcome
+from reelAlgo import selected_model
+from result_writer import GameResultWriter
+from replay import verify_session, next_rng_offset, replay_result, seed_commitment
+from spin_service import SpinService
+from stats_engine import StatsEngine
+
+SPINS = 12
+OUTCOME = SpinOutcome([[code % len(SYMBOLS) for code in range(reel, reel + 3)] for reel in range(5)])
+
+@pytest.fixture
+def played(db, player, game_session):
+    """SPINS settled spins of game_session, drawn from its seeded stream."""
+    db.add(Jackpot(value=1000.0))
+    db.commit()
+    snapshot = build_config_snapshot(DEFAULT_CONFIG['reels'], DEFAULT_CONFIG['symbol_payouts'])
+    rng = SlotMachineRNG.from_seed(bytes.fromhex(game_session.rng_seed))
+    service = SpinService(*selected_model(snapshot, rng=rng), rng=rng,
+                          config_id=get_or_create_config_snapshot(db, snapshot))
+    player.balance = 1000.0
+    db.commit()
+    results = [service.spin(player.id, game_session.id, spin_number, 1.0) for spin_number in range(1, SPINS + 1)]
+    return results, rng.position
+
+def stored_result(db, spin_number):
+    return db.query(GameResult).filter(GameResult.spin_number == spin_number).one()
+
+def test_export_round_trip_decodes_packed_and_legacy_outcomes(db, game_session, tmp_path):
+    outcomes = [SpinOutcome([[(reel + row + shift) % len(SYMBOLS) for row in range(3)] for reel in range(5)])
+                for shift in range(3)]
+    record_game_result(db, game_session.id, 1, 1.0, outcomes[0], 0.0)
+    record_game_result(db, game_session.id, 2, 2.0, str(outcomes[1]), 5.0)  # Legacy string column
+    record_game_result(db, game_session.id, 3, 3.0, outcomes[2], 0.0)
+
+    assert export_history(db, tmp_path)['game_results'] == 3
+    columns = open_export('game_results', tmp_path)
+
+    assert [decode_outcome(value) for value in columns['outcome_code']] == [o.to_symbols() for o in outcomes]
+    assert columns['spin_number'].tolist() == [1, 2, 3]
+    assert columns['bet_amount'].tolist() == [1.0, 2.0, 3.0]
+    assert np.isnat(columns['timestamp']).sum() == 0
+
+def test_export_is_incremental_and_keeps_missing_outcomes(db, game_session, tmp_path):
+    record_game_result(db, game_session.id, 1, 1.0, OUTCOME, 0.0)
+    export_history(db, tmp_path)
+    record_game_results(db, [dict(session_id=game_session.id, spin_number=2, bet_amount=1.0, winnings=0.0)])
+
+    assert export_history(db, tmp_path)['game_results'] == 1
+    columns = open_export('game_results', tmp_path)
+    assert len(columns['id']) == 2
+    assert decode_outcome(columns['outcome_code'][0]) == OUTCOME.to_symbols()
+    assert decode_outcome(columns['outcome_code'][1]) is None
+
+def test_game_session_commits_to_its_seed(game_session):
+    assert game_session.seed_commitment == seed_commitment(game_session.rng_seed)
+
+def test_verify_session_reproduces_every_settled_spin(db, game_session, played):
+    results, position = played
+
+    checked, skipped, mismatches = verify_session(db, game_session.id)
+
+    assert (checked, skipped, mismatches) == (SPINS, 0, [])
+    assert next_rng_offset(db, game_session.id) == position
+    row, evaluation = replay_result(db, results[3].result_id)
+    assert evaluation.outcome == results[3].outcome
+    assert row.spin_number == 4
+
+def test_verify_session_flags_a_tampered_outcome(db, game_session, played):
+    row = stored_result(db, 5)
+    original = row.outcome_code
+    row.outcome_code = original ^ 1
+    db.commit()
+
+    _, _, mismatches = verify_session(db, game_session.id)
+
+    assert [(m.spin_number, m.field, m.stored, m.replayed) for m in mismatches] == \
+        [(5, 'outcome_code', row.outcome_code, original)]
+
+def test_verify_session_flags_a_removed_spin(db, game_session, played):
+    db.delete(stored_result(db, 7))
+    db.commit()
+
+    checked, _, mismatches = verify_session(db, game_session.id)
+
+    assert checked == SPINS - 1
+    assert [(m.spin_number, m.field) for m in mismatches] == [(8, 'rng_offset')]
+
+def test_verify_session_skips_spins_without_replay_data(db, game_session, played):
+    record_game_result(db, game_session.id, SPINS + 1, 1.0, OUTCOME, 0.0)
+
+    checked, skipped, mismatches = verify_session(db, game_session.id)
+
+    assert (checked, skipped, mismatches) == (SPINS, 1, [])
+
+def test_result_writer_dead_letters_rows_it_cannot_write(db, game_session, tmp_path):
+    dead_letters = tmp_path / "dead.jsonl"
+    writer = GameResultWriter(batch_size=10, flush_interval_ms=10, max_retries=2, dead_letter_path=str(dead_letters))
+    good = [dict(session_id=game_session.id, spin_number=n, bet_amount=1.0, winnings=0.0) for n in (1, 2)]
+    poison = dict(session_id=game_session.id, spin_number=3, bet_amount=object(), winnings=0.0)  # Cannot be bound
+    for row in (good[0], poison, good[1]):
+        writer.write(row)
+    writer.flush()
+    writer.write(dict(good[0], spin_number=4))
+    writer.close()
+
+    assert [n for n, in db.query(GameResult.spin_number).order_by(GameResult.spin_number)] == [1, 2, 4]
+    assert writer.rows_dead_lettered == 1
+    lines = dead_letters.read_text().splitlines()
+    assert len(lines) == 1 and json.loads(lines[0])['row']['spin_number'] == 3
+
+def test_stats_engine_picks_up_rows_committed_out_of_id_order(db, game_session):
+    def rows(*ids):
+        return [dict(id=row_id, session_id=game_session.id, spin_number=row_id, bet_amount=1.0, winnings=2.0)
+                for row_id in ids]
+
+    engine = StatsEngine(rescan_window=100)
+    record_game_results(db, rows(1, 2, 4))
+    assert engine.poll()
+    # Id 3 was taken before id 4 but committed after it was read
+    record_game_results(db, rows(3))
+
+    assert engine.poll()
+    assert not engine.poll()
+    snapshot = engine.snapshot()
+    assert (snapshot['total_spins'], snapshot['total_winnings']) == (4, 8.0)
@@ -0,0 +1,220 @@
+import pytest
+from sqlalchemy import event
+from advanced_rng import SlotMachineRNG
+from combination_list import JACKPOT_CONTRIBUTION, JACKPOT_RESET_VALUE
+from config_manager import DEFAULT_CONFIG, build_config_snapshot
+from data_access import apply_balance_change, compare_and_swap_balance, get_wallet_state
+from database import SessionLocal
+from db_models import GameResult, Jackpot, Player
+from jackpot_manager import JackpotContributionBuffer, claim_jackpot
+from outcome import SpinOutcome
+from reelAlgo import selected_model
+from spin_service import SpinService, settle_spin
+from wallet_manager import WalletCache, WalletConflict
+
+OUTCOME = SpinOutcome.from_packed(0)
+
+def settle(db, player, game_session, bet_amount=10.0, points=0, regular_winnings=0.0, jackpot_hit=False, **kwargs):
+    return settle_spin(db, player.id, game_session.id, 1, bet_amount, OUTCOME, points, regular_winnings, 0.0,
+                       jackpot_hit, **kwargs)
+
+def stored_state(player_id):
+    """Balance, jackpot pool and result count as committed, read on a fresh session."""
+    db = SessionLocal()
+    try:
+        return (db.query(Player.balance).filter(Player.id == player_id).scalar(),
+                db.query(Jackpot.value).order_by(Jackpot.id).scalar(),
+                db.query(GameResult).count())
+    finally:
+        db.close()
+
+@pytest.fixture
+def jackpot(db):
+    db.add(Jackpot(value=5000.0))
+    db.commit()
+
+def fail_on_flush(db):
+    def fail(session, flush_context, instances):
+        raise RuntimeError("database went away")
+    event.listen(db, "before_flush", fail)
+
+def test_settle_spin_commits_balance_jackpot_and_result_together(db, player, game_session, jackpot):
+    balance, jackpot_win, current_jackpot, result_id = settle(db, player, game_session, regular_winnings=4.0,
+                                                              rng_offset=30, config_id=None)
+
+    assert (balance, jackpot_win) == (94.0, 0.0)
+    assert current_jackpot == pytest.approx(5000.0 + 10.0 * JACKPOT_CONTRIBUTION)
+    assert stored_state(player.id) == (94.0, current_jackpot, 1)
+    result = db.query(GameResult).filter(GameResult.id == result_id).one()
+    assert (result.outcome_code, result.balance_after, result.rng_offset) == (OUTCOME.packed, 94.0, 30)
+
+def test_settle_spin_rejects_a_bet_over_the_balance(db, player, game_session, jackpot):
+    with pytest.raises(ValueError):
+        settle(db, player, game_session, bet_amount=100.01)
+    db.rollback()
+
+    assert stored_state(player.id) == (100.0, 5000.0, 0)
+
+@pytest.mark.parametrize("bet_amount", [float('nan'), float('inf'), float('-inf'), 0.0, -5.0])
+def test_settle_spin_rejects_bets_that_are_not_positive_numbers(db, player, game_session, jackpot, bet_amount):
+    with pytest.raises(ValueError):
+        settle(db, player, game_session, bet_amount=bet_amount)
+    db.rollback()
+
+    assert stored_state(player.id) == (100.0, 5000.0, 0)
+
+class FailingWriter:
+    def write(self, row):
+        raise RuntimeError("GameResultWriter is closed")
+
+class FailingBuffer(JackpotContributionBuffer):
+    def add(self, amount):
+        raise RuntimeError("database went away")
+
+def test_failures_after_the_commit_do_not_fail_the_spin(db, player, game_session, jackpot):
+    buffer = FailingBuffer(flush_bets=1000, flush_interval_ms=60000)
+    balance, _, _, result_id = settle(db, player, game_session, regular_winnings=4.0, jackpot_buffer=buffer,
+                                      result_writer=FailingWriter(), rng_offset=12)
+
+    # The writer did not take the row, so it was recorded directly
+    assert result_id is None
+    assert stored_state(player.id) == (94.0, 5000.0, 1)
+    assert db.query(GameResult.balance_after, GameResult.rng_offset).one() == (94.0, 12)
+
+def test_failed_settlement_rolls_back_every_change(db, player, game_session, jackpot):
+    fail_on_flush(db)
+    with pytest.raises(RuntimeError):
+        settle(db, player, game_session, regular_winnings=25.0)
+    db.rollback()
+
+    # The debit, credit and jackpot increment ran before the failure; none of them may stick
+    assert stored_state(player.id) == (100.0, 5000.0, 0)
+
+def test_failed_jackpot_claim_restores_drained_contributions(db, player, game_session, jackpot):
+    buffer = JackpotContributionBuffer(flush_bets=1000, flush_interval_ms=60000)
+    buffer.add(3.0)
+    fail_on_flush(db)
+    with pytest.raises(RuntimeError):
+        settle(db, player, game_session, jackpot_hit=True, jackpot_buffer=buffer)
+    db.rollback()
+
+    assert stored_state(player.id) == (100.0, 5000.0, 0)
+    assert buffer.drain() == 3.0
+
+def test_jackpot_hit_pays_the_pool_and_resets_it(db, player, game_session, jackpot):
+    balance, jackpot_win, current_jackpot, _ = settle(db, player, game_session, jackpot_hit=True)
+
+    assert (balance, jackpot_win, current_jackpot) == (5090.0, 5000.0, JACKPOT_RESET_VALUE)
+    assert stored_state(player.id) == (5090.0, JACKPOT_RESET_VALUE, 1)
+
+def test_claim_jackpot_returns_pool_plus_extra_and_resets(db, jackpot):
+    assert claim_jackpot(db, reset_value=250.0, extra=7.5) == 5007.5
+    db.commit()
+
+    assert db.query(Jackpot.value).scalar() == 250.0
+    assert claim_jackpot(db, reset_value=250.0) == 250.0
+
+def test_claim_jackpot_without_a_pool_creates_one(db):
+    assert claim_jackpot(db, reset_value=JACKPOT_RESET_VALUE, extra=2.0) == JACKPOT_RESET_VALUE + 2.0
+    db.commit()
+
+    assert db.query(Jackpot.value).all() == [(JACKPOT_RESET_VALUE,)]
+
+def test_settle_spin_updates_the_wallet_cache(db, player, game_session, jackpot):
+    cache = WalletCache(SessionLocal)
+    assert cache.balance(player.id) == 100.0
+
+    settle(db, player, game_session, wallet_cache=cache)
+
+    assert cache.balance(player.id) == 90.0
+    assert cache.apply(player.id, 5.0) == 95.0
+
+def test_wallet_cache_retries_against_the_fresh_balance_after_a_conflict(db, player):
+    cache = WalletCache(SessionLocal)
+    assert cache.balance(player.id) == 100.0
+    # Another process credits the player behind the cache's back
+    version = get_wallet_state(db, player.id).version
+    assert compare_and_swap_balance(db, player.id, version, 150.0) == version + 1
+
+    assert cache.apply(player.id, -10.0) == 140.0
+    assert tuple(get_wallet_state(db, player.id)) == (140.0, version + 2)
+
+def test_wallet_cache_gives_up_when_every_attempt_conflicts(db, player):
+    def rival_session():
+        # Every time the cache touches the database, another writer has just moved the balance
+        balance, version = get_wallet_state(db, player.id)
+        compare_and_swap_balance(db, player.id, version, balance + 1.0)
+        return SessionLocal()
+
+    cache = WalletCache(rival_session, max_retries=3)
+    with pytest.raises(WalletConflict):
+        cache.apply(player.id, -10.0)
+
+    # Only the rival's writes landed
+    assert get_wallet_state(db, player.id).balance == 100.0 + 6.0
+
+def test_wallet_cache_rejects_an_overdraft(db, player):
+    cache = WalletCache(SessionLocal)
+    before = tuple(get_wallet_state(db, player.id))
+    with pytest.raises(ValueError):
+        cache.apply(player.id, -100.01)
+
+    assert tuple(get_wallet_state(db, player.id)) == before
+
+@pytest.mark.parametrize("amount", [float('nan'), float('inf'), 0.0])
+def test_apply_balance_change_rejects_amounts_that_are_not_finite_or_zero(db, player, amount):
+    with pytest.raises(ValueError):
+        apply_balance_change(db, player.id, amount, "deposit")
+
+    assert get_wallet_state(db, player.id).balance == 100.0
+
+def test_wallet_cache_rejects_a_non_finite_amount(db, player):
+    with pytest.raises(ValueError):
+        WalletCache(SessionLocal).apply(player.id, float('nan'))
+
+    assert get_wallet_state(db, player.id).balance == 100.0
+
+def spin_service(rng, **kwargs):
+    snapshot = build_config_snapshot(DEFAULT_CONFIG['reels'], DEFAULT_CONFIG['symbol_payouts'])
+    return SpinService(*selected_model(snapshot, rng=rng), rng=rng, **kwargs)
+
+def test_failure_after_the_commit_keeps_the_stream_moving(db, player, game_session, jackpot):
+    rng = SlotMachineRNG.from_seed(bytes.fromhex(game_session.rng_seed))
+    service = spin_service(rng, result_writer=FailingWriter())
+
+    service.spin(player.id, game_session.id, 1, 1.0)
+    service.spin(player.id, game_session.id, 2, 1.0)
+
+    offsets = [offset for offset, in db.query(GameResult.rng_offset).order_by(GameResult.spin_number)]
+    assert offsets[0] == 0 and offsets[1] > 0
+    assert rng.position > offsets[1]
+
+def test_failed_settlement_rewinds_the_stream(db, player, game_session, jackpot):
+    rng = SlotMachineRNG.from_seed(bytes.fromhex(game_session.rng_seed))
+    service = spin_service(rng)
+
+    with pytest.raises(ValueError):
+        service.spin(player.id, game_session.id, 1, 100.01)
+
+    assert rng.position == 0
+    service.spin(player.id, game_session.id, 1, 1.0)
+    assert db.query(GameResult.rng_offset).scalar() == 0
+
+def test_failed_buffer_flush_keeps_the_contribution(db, jackpot):
+    def broken_session():
+        raise RuntimeError("database went away")
+
+    buffer = JackpotContributionBuffer(flush_bets=1, session_factory=broken_session)
+    buffer.reset_value(5000.0)
+
+    assert buffer.add(2.0) == 5002.0
+    assert buffer.flush(db) == 5002.0
+    assert db.query(Jackpot.value).scalar() == 5002.0
+
+def test_buffer_without_auto_flush_never_touches_the_database(db, jackpot):
+    buffer = JackpotContributionBuffer(flush_bets=1, flush_interval_ms=0, auto_flush=False)
+    buffer.reset_value(5000.0)
+    buffer.add(2.0)
+
+    assert db.query(Jackpot.value).scalar() == 5000.0
+    assert buffer.flush(db) == 5002.0
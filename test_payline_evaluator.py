@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from combination_list import combinations, SYMBOLS, BONUS_GAME_EVENT
+from config_manager import DEFAULT_CONFIG
+from payline_evaluator import (PAYLINES, PAYLINE_NAMES, compile_combinations, line_outcome_digits, evaluate_spin,
+                               evaluate_spins, trigger_code)
+from rtp_calculator import calculate_rtp
+
+SYMBOL_PAYOUTS = DEFAULT_CONFIG['symbol_payouts']
+
+def reference_line_match(line):
+    """The original per-spin scan: index of the first combination matching a line of symbols."""
+    for c, combo in enumerate(combinations):
+        if all(wanted == '*' or wanted == symbol for symbol, wanted in zip(line, combo['symbols'])):
+            return c
+    return -1
+
+def reference_check_win(result):
+    """The original check_win over nested lists of symbol names."""
+    total_points, max_payout, triggered_events, winning_paylines = 0, 0, [], []
+    for name, payline in zip(PAYLINE_NAMES, PAYLINES):
+        c = reference_line_match([result[reel][row] for reel, row in payline])
+        if c < 0:
+            continue
+        combo = combinations[c]
+        total_points += combo['points']
+        max_payout = max(max_payout, SYMBOL_PAYOUTS.get(combo['symbols'][0], 0))
+        winning_paylines.append(name)
+        if 'trigger' in combo:
+            triggered_events.append(combo['trigger'])
+    return total_points, max_payout, triggered_events, winning_paylines
+
+@pytest.fixture(scope="module")
+def table():
+    return compile_combinations(combinations, SYMBOL_PAYOUTS)
+
+def test_every_line_outcome_matches_reference_scan(table):
+    expected = [reference_line_match([SYMBOLS[code] for code in digits]) for digits in line_outcome_digits()]
+    assert table.combo_index.tolist() == expected
+
+def test_spins_match_reference_check_win(table):
+    spins = np.random.default_rng(0).integers(0, len(SYMBOLS), size=(2000, 5, 3), dtype=np.uint8)
+    total_points, max_payout, _, _ = evaluate_spins(table, spins)
+    for i, codes in enumerate(spins):
+        symbols = [[SYMBOLS[code] for code in reel] for reel in codes]
+        expected = reference_check_win(symbols)
+        assert evaluate_spin(table, codes) == expected
+        assert (total_points[i], max_payout[i]) == expected[:2]
+
+def test_bonus_game_event_is_raised_by_a_combination(table):
+    assert table.triggers[trigger_code(table, BONUS_GAME_EVENT)] == BONUS_GAME_EVENT
+    assert calculate_rtp(DEFAULT_CONFIG['reels'], SYMBOL_PAYOUTS)['bonus_rtp'] > 0
+
+def test_unknown_trigger_is_rejected(table):
+    with pytest.raises(ValueError, match="No combination triggers event 'BONUS'"):
+        trigger_code(table, 'BONUS')
@@ -1,34 +1,113 @@
+import math
+import threading
+from collections import namedtuple
 from database import SessionLocal
-from data_access import update_player_balance_in_db, get_player, update_token_conversion_rate, get_token_conversion_rate, update_player_balance
+from metrics import wallet_conflicts_total
+from data_access import update_token_conversion_rate, get_token_conversion_rate, get_wallet_state, compare_and_swap_balance
+
+WalletEntry = namedtuple('WalletEntry', ['balance', 'version'])
+
+class WalletConflict(RuntimeError):
+    """Raised when a balance update keeps losing to concurrent writers."""
+
+class WalletCache:
+    """
+    Write-through cache of player balances.
+
+    Reads are served from memory once a player is loaded. Every write is a
+    compare-and-swap on `players.version`, so two sessions working from the
+    same cached balance cannot both spend it: the loser's entry is dropped,
+    reloaded and the update retried against the fresh balance. Writes made
+    elsewhere (settle_spin, the game server) are picked up on the next
+    conflict, or straight away when passed to `store` or `invalidate`.
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_retries=3):
+        self.session_factory = session_factory
+        self.max_retries = max_retries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _load(self, player_id):
+        db = self.session_factory()
+        try:
+            state = get_wallet_state(db, player_id)
+        finally:
+            db.close()
+        if state is None:
+            raise ValueError(f"Player {player_id} not found")
+        entry = WalletEntry(state.balance, state.version)
+        with self._lock:
+            self._entries[player_id] = entry
+        return entry
+
+    def _entry(self, player_id):
+        entry = self._entries.get(player_id)
+        return entry if entry is not None else self._load(player_id)
+
+    def balance(self, player_id):
+        """The player's balance; only the first read for a player hits the database."""
+        return self._entry(player_id).balance
+
+    def apply(self, player_id, amount):
+        """
+        Credit (positive amount) or debit (negative amount) a player.
+
+        :raises ValueError: If the amount is not finite or a debit exceeds the balance
+        :raises WalletConflict: If every attempt hits a version conflict
+        :return: The new balance
+        """
+        if not math.isfinite(amount):
+            raise ValueError("Amount must be a finite number.")
+        if amount == 0:
+            return self.balance(player_id)
+        for _ in range(self.max_retries):
+            entry = self._entry(player_id)
+            new_balance = entry.balance + amount
+            if new_balance < 0:
+                raise ValueError("Insufficient funds.")
+            db = self.session_factory()
+            try:
+                version = compare_and_swap_balance(db, player_id, entry.version, new_balance)
+            finally:
+                db.close()
+            if version is not None:
+                self.store(player_id, new_balance, version)
+                return new_balance
+            wallet_conflicts_total.inc()
+            self.invalidate(player_id)
+        raise WalletConflict(f"Balance of player {player_id} changed concurrently {self.max_retries} times")
+
+    def store(self, player_id, balance, version):
+        """Record a balance written elsewhere, unless a newer version is already cached."""
+        with self._lock:
+            entry = self._entries.get(player_id)
+            if entry is None or entry.version < version:
+                self._entries[player_id] = WalletEntry(balance, version)
+
+    def invalidate(self, player_id=None):
+        """Drop one player's entry, or every entry."""
+        with self._lock:
+            if player_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(player_id, None)
+
+wallet_cache = WalletCache()
 
 def place_bet(player, amount):
-    db = SessionLocal()
     try:
-        if player.balance >= amount:
-            player.balance -= amount
-            update_player_balance_in_db(db, player)
-        else:
-            print("Insufficient funds to place bet.")
-    finally:
-        db.close()
+        player.balance = wallet_cache.apply(player.id, -amount)
+    except ValueError:
+        print("Insufficient funds to place bet.")
     return player
 
 def add_winnings(player, amount):
-    db = SessionLocal()
-    try:
-        player.balance += amount
-        update_player_balance_in_db(db, player)
-    finally:
-        db.close()
+    player.balance = wallet_cache.apply(player.id, amount)
     return player
 
 def get_player_balance(player):
-    db = SessionLocal()
-    try:
-        updated_player = get_player(db, player.username)
-        return updated_player.balance
-    finally:
-        db.close()
+    return wallet_cache.balance(player.id)
 
 def set_token_conversion_rate(player, rate):
     db = SessionLocal()
@@ -45,14 +124,12 @@ def get_token_conversion_rate(player):
         db.close()
 
 def deposit_to_player(player, amount):
-    player.balance += amount
-    update_player_balance(SessionLocal(), player.id, player.balance)
+    player.balance = wallet_cache.apply(player.id, amount)
     return player
 
 def withdraw_to_bank(player, amount):
-    if player.balance >= amount:
-        player.balance -= amount
-        update_player_balance(SessionLocal(), player.id, player.balance)
-    else:
+    try:
+        player.balance = wallet_cache.apply(player.id, -amount)
+    except ValueError:
         print("Insufficient funds in game balance.")
-    return player
\ No newline at end of file
+    return player